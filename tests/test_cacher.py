@@ -0,0 +1,81 @@
+import time
+
+from youmirror.cacher import MetadataCache, ObjectCache
+
+
+def test_fields_expire_on_their_own_ttl(tmp_path, monkeypatch):
+    path = tmp_path / "youmirror.cache"
+    cache = MetadataCache(path, {"name": 100, "streams": 10, "children": 0})
+    cache.put("abc", "name", "A video")
+    cache.put("abc", "streams", {"streams": []})
+    cache.put("abc", "children", ["x"])  # ttl 0 means never cached
+    cache.close()
+
+    cache = MetadataCache(path, {"name": 100, "streams": 10, "children": 0})
+    assert cache.get("abc", "name") == "A video"  # Survives a new process
+    assert cache.get("abc", "children") is None
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 50)
+    assert cache.get("abc", "name") == "A video"
+    assert cache.get("abc", "streams") is None  # Too old
+
+
+def test_cached_fetches_once_and_invalidates(tmp_path):
+    cache = MetadataCache(tmp_path / "youmirror.cache", {"name": 100, "url": 100})
+    calls = []
+    fetch = lambda: calls.append(1) or "A video"  # noqa: E731
+    assert cache.cached("abc", "name", fetch) == "A video"
+    assert cache.cached("abc", "name", fetch) == "A video"
+    assert len(calls) == 1
+
+    cache.put("abc", "url", "https://youtube.com/watch?v=abc")
+    assert cache.invalidate("abc", ["name"]) == 1
+    assert cache.get("abc", "name") is None
+    assert cache.get("abc", "url")  # Other fields stay
+    assert cache.invalidate() == 1
+    assert cache.get("abc", "url") is None
+    cache.close()
+
+
+class FakeVideo:
+    def __init__(self, html_size: int) -> None:
+        self._title = None
+        self._author = None
+        self._watch_html = "x" * html_size
+        self._vid_info = {"videoDetails": {"title": "A video", "author": "Someone"}}
+        self.video_id = "abcdefghijk"
+
+
+def test_object_cache_evicts_least_recently_used():
+    cache = ObjectCache(max_entries=2)
+    cache["a"], cache["b"] = FakeVideo(10), FakeVideo(10)
+    assert cache.get("a")  # Now b is the oldest
+    cache["c"] = FakeVideo(10)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 1)
+
+
+def test_object_cache_shrinks_before_evicting():
+    cache = ObjectCache(max_entries=10, max_bytes=2500)
+    old = FakeVideo(2000)
+    cache["old"] = old
+    cache["new"] = FakeVideo(2000)  # Over the budget, so the old one shrinks
+    assert "old" in cache
+    assert old._watch_html is None and old._vid_info is None
+    assert old._title == "A video"  # Pinned before the player response was dropped
+    assert cache.stats()["shrinks"] == 1
+    assert cache.bytes <= 2500
+
+
+def test_object_cache_leaves_checked_out_objects_whole():
+    cache = ObjectCache(max_entries=10, max_bytes=2500)
+    used, idle = FakeVideo(1000), FakeVideo(1000)
+    cache.checkout("used")  # A download is still working on it
+    cache["used"], cache["idle"] = used, idle
+    cache["new"] = FakeVideo(1000)  # Over the budget
+    assert used._watch_html is not None  # Skipped
+    assert idle._watch_html is None  # Shrunk instead
+    cache.shrink("used")  # Sync is done with it
+    assert used._watch_html is None and "used" not in cache.checkouts
@@ -0,0 +1,64 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import youmirror.checker as checker
+import youmirror.requester as requester
+from youmirror.requester import ConnectionPool
+
+statuses = {"up": 200, "gone": 404, "locked": 401, "busy": 429}
+
+
+class OEmbedHandler(BaseHTTPRequestHandler):
+    """
+    Answers oEmbed requests with a status picked by the video id
+    """
+
+    protocol_version = "HTTP/1.1"
+    throttled = 0  # 429s handed out so far
+
+    def do_GET(self):
+        url = parse_qs(urlparse(self.path).query)["url"][0]
+        status = statuses[url.rsplit("=", 1)[1]]
+        if status == 429 and OEmbedHandler.throttled < 1:
+            OEmbedHandler.throttled += 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+        else:
+            self.send_response(200 if status == 429 else status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), OEmbedHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setattr(
+        checker, "oembed_url", f"http://127.0.0.1:{httpd.server_port}/oembed?url={{}}"
+    )
+    monkeypatch.setattr(requester, "pool", ConnectionPool())
+    yield
+    requester.pool.close()
+    httpd.shutdown()
+
+
+def test_checker_classifies_and_retries(server, monkeypatch):
+    monkeypatch.setattr(
+        checker, "confirm", lambda url: {"available": False, "reason": "private"}
+    )
+    monkeypatch.setattr(checker.time, "sleep", lambda s: None)  # Skip the backoff
+    urls = [f"https://youtube.com/watch?v={i}" for i in statuses]
+
+    results = dict(checker.Checker(jobs=4, rate=1000).run(urls))
+
+    reasons = {url.rsplit("=", 1)[1]: r["reason"] for url, r in results.items()}
+    assert reasons == {"up": None, "gone": "removed", "locked": "private", "busy": None}
+    assert results[urls[3]]["available"]  # Got through after being throttled once
+    assert all("last_checked" in r for r in results.values())
@@ -0,0 +1,47 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from youmirror.coalescer import SingleFlight
+
+
+def test_callers_share_one_fetch():
+    flights = SingleFlight()
+    release = threading.Event()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        release.wait(5)
+        return "streams"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flights.do, "abc", fetch) for _ in range(4)]
+        while flights.stats()["shared"] < 3:  # Everyone else is waiting on it
+            time.sleep(0.01)
+        release.set()
+        assert [f.result() for f in futures] == ["streams"] * 4
+    assert len(fetches) == 1
+    assert flights.stats() == {"calls": 1, "shared": 3}
+    assert flights.do("abc", lambda: "again") == "again"  # Nothing is kept
+
+
+def test_callers_share_the_error():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise IOError("throttled")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(flights.do, "abc", fetch) for _ in range(2)]
+        while flights.stats()["shared"] < 1:
+            time.sleep(0.01)
+        release.set()
+        for future in futures:
+            with pytest.raises(IOError, match="throttled"):
+                future.result()
+    assert not flights.flights
@@ -1,6 +1,17 @@
 """
 Gonna use this just to verify nothing breaks in the core (Or it does break on invalid input!)
 """
+
+import time
+from collections import ChainMap
+
+from pytube import YouTube
+
+import youmirror.configurer as configurer
+import youmirror.core as core
+import youmirror.databaser as databaser
+import youmirror.tuber as tuber
+
 # TODO core does not work right now
 # import youmirror.core as core
 # import youmirror.configurer as configurer
@@ -51,3 +62,58 @@ Gonna use this just to verify nothing breaks in the core (Or it does break on in
 #     '''
 #     Path(databaser.db_file).unlink()
 #     Path(configurer.config_file).unlink()
+
+
+def test_children_resolve_in_order_with_stable_collisions(monkeypatch, tmp_path):
+    ids = ["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc"]
+    urls = [f"https://www.youtube.com/watch?v={i}" for i in ids]
+
+    def get_metadata(yt):
+        time.sleep(0.01 * (3 - ids.index(yt.video_id)))  # First child loads last
+        return {"name": "Same Name", "id": yt.video_id, "available": True}
+
+    monkeypatch.setattr(tuber, "new_pytube", YouTube)  # No network needed
+    monkeypatch.setattr(tuber, "get_metadata", get_metadata)
+    ym = core.YouMirror(root=str(tmp_path))
+    options = dict(configurer.defaults)
+    resolved = ym.resolve_children(urls, options)
+    assert [url for url, yt, metadata in resolved] == urls
+
+    parent = {"parent_type": "playlist", "path": "playlists/list"}
+    paths_to_add = dict()
+    for url, yt, metadata in resolved:
+        keys = ym.generate_keys(yt, parent, options, ChainMap(paths_to_add), metadata)
+        paths_to_add[keys["path"]] = {"parent": url}
+    assert list(paths_to_add) == [
+        "playlists/list/Same_Name",
+        "playlists/list/Same_Name_bbbbbbbbbbb",
+        "playlists/list/Same_Name_ccccccccccc",
+    ]
+
+
+def test_remove_and_sync_stay_offline(monkeypatch, tmp_path):
+    def online(url):
+        raise AssertionError(f"Went online for {url}")
+
+    monkeypatch.setattr(tuber, "new_pytube", online)
+    ym = core.YouMirror(root=str(tmp_path))
+    ym.new()
+    channel = "http://www.youtube.com/@Foo"  # Vanity url, like pytube gives us
+    ym.load_config()
+    ym.config = configurer.set_yt("channel", channel, ym.config, {"name": "Foo"})
+    configurer.save_config(ym.config_path, ym.config)
+    table = databaser.open_table(ym.db_path, "channel")
+    table[channel] = {
+        "name": "Foo",
+        "id": "/c/Foo",  # What tuber.get_id gives for the channel
+        "path": "channels/Foo",
+        "children": [],
+    }
+    databaser.close_table(table)
+
+    found = ym.find_url("https://www.youtube.com/c/Foo/videos")
+    assert found[:2] == ("channel", channel)
+    ym.sync("https://www.youtube.com/c/Foo", retry=True)
+    ym.remove("https://www.youtube.com/c/Foo", no_rm=True, force=True)
+    ym.load_config()
+    assert not configurer.yt_exists("channel", channel, ym.config)
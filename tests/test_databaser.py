@@ -0,0 +1,181 @@
+import sqlite3
+
+from sqlitedict import SqliteDict
+
+from youmirror import databaser
+
+channel = "https://www.youtube.com/c/Foo"
+videos = [f"https://www.youtube.com/watch?v={i:011d}" for i in range(3)]
+
+
+def test_rows_come_back_as_the_entries_that_went_in(tmp_path):
+    table = databaser.open_table(tmp_path / "youmirror.db", "files")
+    table["a.mp4"] = {
+        "parent": videos[0],
+        "type": "video",
+        "downloaded": False,
+        "filesize": 123,
+        "bitrate": None,  # NULL, so it's left out
+        "postprocess": [("remux", ("v", "a", "a.mp4", "scratch"))],  # extra
+    }
+    assert table["a.mp4"] == {
+        "parent": videos[0],
+        "type": "video",
+        "downloaded": False,
+        "filesize": 123,
+        "postprocess": [("remux", ("v", "a", "a.mp4", "scratch"))],
+    }
+    assert "a.mp4" in table and "b.mp4" not in table
+    assert table.find(parent=videos[0]).keys() == {"a.mp4"}
+    databaser.close_table(table)
+
+
+def test_pending_files_for_a_channel_is_one_query(tmp_path):
+    path = tmp_path / "youmirror.db"
+    singles = databaser.open_table(path, "single")
+    files = databaser.open_table(path, "files")
+    singles.update({url: {"parent": channel, "files": {}} for url in videos[:2]})
+    singles[videos[2]] = {"parent": "https://www.youtube.com/playlist?list=PLx"}
+    assert "files" not in singles[videos[0]]  # Those live in the files table
+    files.update(
+        {
+            "0.mp4": {"parent": videos[0], "downloaded": False},
+            "0.jpg": {"parent": videos[0], "downloaded": True},
+            "1.mp4": {"parent": videos[1], "downloaded": False},
+            "2.mp4": {"parent": videos[2], "downloaded": False},
+        }
+    )
+    assert databaser.pending_files(files, channel, "channel").keys() == {
+        "0.mp4",
+        "1.mp4",
+    }
+    assert databaser.pending_files(files, videos[2], "single").keys() == {"2.mp4"}
+    plan = files.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT files.* FROM singles CROSS JOIN files "
+        "ON files.parent = singles.url WHERE singles.parent = ? AND downloaded = 0",
+        (channel,),
+    ).fetchall()
+    assert any("singles_parent" in row[-1] for row in plan)
+    assert any("files_parent" in row[-1] for row in plan)
+    for table in (singles, files):
+        databaser.close_table(table)
+
+
+def test_sqlitedict_mirrors_are_migrated(tmp_path):
+    path = str(tmp_path / "youmirror.db")
+    old = {
+        "channel": {channel: {"name": "Foo", "id": "/c/Foo", "children": set(videos)}},
+        "single": {
+            videos[0]: {"name": "Zero", "parent": channel, "files": {"0.mp4": {}}}
+        },
+        "files": {"0.mp4": {"parent": videos[0], "downloaded": False, "attempts": 2}},
+        "paths": {"channels/Foo": {"parent": channel}},
+        "cooldown": {"0.mp4": 1e12},
+    }
+    for name, rows in old.items():
+        with SqliteDict(path, tablename=name, autocommit=True) as table:
+            table.update(rows)
+
+    table = databaser.open_table(path, "channel")
+    assert set(table[channel]["children"]) == set(videos)  # Packed on the way in
+    singles = databaser.Table(table.connection, "single")
+    assert singles[videos[0]] == {"name": "Zero", "parent": channel}
+    files = databaser.Table(table.connection, "files")
+    assert files["0.mp4"] == {"parent": videos[0], "downloaded": False, "attempts": 2}
+    assert databaser.Table(table.connection, "paths")["channels/Foo"] == {
+        "parent": channel
+    }
+    databaser.close_table(table)
+
+    connection = sqlite3.connect(path)
+    names = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+    assert not {"channel", "single", "cooldown"} & names  # The old tables are gone
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == (
+        databaser.schema_version
+    )
+    connection.close()
+
+
+def test_batcher_commits_in_groups_and_readers_are_not_blocked(tmp_path):
+    path = tmp_path / "youmirror.db"
+    table = databaser.open_table(path, "files")
+    reader = databaser.open_table(path, "files")  # Like `show` during a sync
+    assert table.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    batch = databaser.Batcher(table, size=3, seconds=60)
+
+    batch["0.jpg"] = {"parent": videos[0], "downloaded": True}
+    batch["1.jpg"] = {"parent": videos[1], "downloaded": True}
+    assert len(reader) == 0 and batch.flush(due=True) == 0  # Not due yet
+    batch["2.jpg"] = {"parent": videos[2], "downloaded": True}
+    assert len(reader) == 3 and batch.commits == 1  # Full, so it committed
+
+    batch.seconds = 0
+    batch["3.jpg"] = {"parent": videos[0], "downloaded": False}
+    assert len(reader) == 4 and batch.stats() == {"commits": 2, "saved": 4}
+    for t in (table, reader):
+        databaser.close_table(t)
+
+
+def test_session_shares_one_connection_and_rolls_back(tmp_path):
+    with databaser.Session(tmp_path / "youmirror.db") as db:
+        assert db.connection is None  # Nothing to connect for yet
+        assert db["files"].connection is db["single"].connection
+        assert db["files"].lock is db["single"].lock
+        db["single"][videos[0]] = {"name": "Zero", "parent": channel}
+        try:
+            with db.transaction():
+                db["files"]["0.mp4"] = {"parent": videos[0], "downloaded": False}
+                with db.transaction():  # Part of the outer one
+                    del db["single"][videos[0]]
+                raise RuntimeError("interrupted")
+        except RuntimeError:
+            pass
+        assert videos[0] in db["single"] and "0.mp4" not in db["files"]
+        with db.transaction():
+            db["files"]["0.mp4"] = {"parent": videos[0], "downloaded": False}
+    with databaser.Session(tmp_path / "youmirror.db") as db:
+        assert "0.mp4" in db["files"]
+
+
+def test_get_many_reads_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(databaser, "chunk_size", 2)
+    with databaser.Session(tmp_path / "youmirror.db") as db:
+        db["single"].update(
+            {url: {"name": url[-1], "parent": channel} for url in videos}
+        )
+        db["files"].update(
+            {f"{i}.mp4": {"parent": url} for i, url in enumerate(videos)}
+        )
+        statements = list()
+        db.connection.set_trace_callback(statements.append)
+        found = databaser.get_many([*videos, "missing"], db["single"])
+        assert found.keys() == set(videos)  # Missing ones are left out
+        assert len(statements) == 2  # Four keys, two a query
+        assert db["files"].find_in("parent", videos[:2]).keys() == {"0.mp4", "1.mp4"}
+
+        statements.clear()
+        entry = databaser.get_entry(videos[0], db["single"])
+        assert entry == {"name": "0", "parent": channel} and len(statements) == 1
+        entry["name"] = "changed"  # It's the caller's own copy
+        assert databaser.get_entry(videos[0], db["single"])["name"] == "0"
+
+
+def test_pending_files_leaves_out_files_cooling_down(tmp_path):
+    with databaser.Session(tmp_path / "youmirror.db") as db:
+        db["single"][videos[0]] = {"parent": channel}
+        db["files"].update(
+            {
+                "new.mp4": {"parent": videos[0], "downloaded": False},
+                "due.mp4": {"parent": videos[0], "downloaded": False, "retry_after": 5},
+                "later.mp4": {
+                    "parent": videos[0],
+                    "downloaded": False,
+                    "retry_after": 50,
+                },
+            }
+        )
+        for url, yt_string in ((channel, "channel"), (videos[0], "single")):
+            pending = databaser.pending_files(db["files"], url, yt_string, due=10)
+            assert pending.keys() == {"new.mp4", "due.mp4"}
+            assert databaser.cooling_files(db["files"], url, yt_string, 10) == 1
+            assert len(databaser.pending_files(db["files"], url, yt_string)) == 3
@@ -0,0 +1,49 @@
+import pytest
+
+from youmirror import benchmarker, databaser, encoder
+
+children = [f"https://www.youtube.com/watch?v={i:011d}" for i in range(100)]
+values = [
+    None,
+    True,
+    -(2**70),
+    1.5,
+    "héllo",
+    b"\x00\x80",
+    {"streams": [[22, "video", "mp4", "720p", None, True, True, 123456]] * 3},
+    {"postprocess": [("remux", ("v", "a", "a.mp4", "scratch"))]},
+    set(children),
+    children,
+    ["a\0b", "https://www.youtube.com/c/Foo"],  # Has to go item by item
+    frozenset({(1, 2)}),
+]
+
+
+@pytest.mark.parametrize("value", values)
+def test_compact_round_trips(value):
+    data = encoder.codecs["compact"].encode(value)
+    assert data[0] == encoder.CompactCodec.magic
+    decoded = encoder.decode(data)
+    assert decoded == value and type(decoded) is type(value)
+
+
+def test_compact_is_smaller_and_pickle_still_reads(tmp_path, monkeypatch):
+    compact, pickled = encoder.codecs["compact"], encoder.codecs["pickle"]
+    assert len(compact.encode(children)) * 3 < len(pickled.encode(children))
+    assert encoder.encode(object)[0] == 0x80  # Compact can't, so it's pickled
+
+    path = tmp_path / "youmirror.db"
+    streams = values[6]
+    with databaser.Session(path) as db:  # Written by both codecs
+        db["single"]["pickled"] = {"name": "Foo", "streams": streams}
+        monkeypatch.setattr(encoder, "codec", compact)
+        db["single"]["compact"] = {"name": "Bar", "streams": streams}
+        assert db["single"]["pickled"]["streams"] == streams
+        assert db["single"]["compact"]["streams"] == streams
+
+
+def test_benchmark_measures_every_codec():
+    results = benchmarker.benchmark(files=400)
+    assert results.keys() == {"sqlitedict", *encoder.codecs}
+    for result in results.values():
+        assert result["size"] > 0 and result["plan"] >= 0
@@ -0,0 +1,131 @@
+import io
+import threading
+
+import pytest
+from pytube import exceptions
+from yt_dlp.utils import DownloadError
+
+from youmirror import extractor, tuber
+from youmirror.indexer import StreamIndex
+
+channel_url = "https://www.youtube.com/c/Foo"
+video_urls = [f"https://www.youtube.com/watch?v={i:011d}" for i in range(3)]
+
+
+@pytest.fixture
+def fake():
+    fake = extractor.FakeExtractor(
+        {
+            "/c/Foo": {"name": "Foo", "url": channel_url, "children": video_urls},
+            "00000000000": {"name": "First", "available": True},
+            "00000000001": {"name": "Second", "available": False},
+        }
+    )
+    previous = extractor.use(fake)
+    yield fake
+    extractor.use(previous)
+
+
+def test_tuber_asks_the_extractor(fake):
+    channel = tuber.new_pytube(channel_url)
+    assert tuber.yt_to_type_string(channel) == "channel"
+    assert tuber.get_metadata(channel) == {
+        "name": "Foo",
+        "id": "/c/Foo",
+        "children": video_urls,
+        "available": True,
+    }
+    assert tuber.get_new_children(channel, set(video_urls[1:]), 2) == video_urls[:1]
+    assert tuber.is_available(tuber.new_pytube(video_urls[0]))
+    assert not tuber.is_available(tuber.new_pytube(video_urls[1]))
+    assert tuber.new_pytube(video_urls[2]) is None  # Not something it knows
+    assert fake.loads == 4
+
+
+def test_configure_picks_the_backend():
+    previous = extractor.use(extractor.PytubeExtractor())
+    try:
+        assert isinstance(
+            extractor.configure({"extractor": "yt-dlp"}), extractor.YtDlpExtractor
+        )
+        same = extractor.backend
+        assert extractor.configure({"extractor": "yt-dlp"}) is same  # Kept
+        assert extractor.configure({"extractor": "nope"}) is same
+    finally:
+        extractor.use(previous)
+
+
+def test_yt_dlp_formats_look_like_pytube_streams():
+    video = extractor.YtDlpExtractor().load(video_urls[0], "single")
+    video._info = {
+        "title": "First",
+        "duration": 60,
+        "formats": [
+            {"format_id": "sb0", "protocol": "mhtml", "vcodec": "none", "acodec": "none"},
+            {"format_id": "140", "protocol": "https", "url": "a", "ext": "m4a",
+             "vcodec": "none", "acodec": "mp4a.40.2", "abr": 129.5, "filesize": 10},
+            {"format_id": "136", "protocol": "https", "url": "v", "ext": "mp4",
+             "vcodec": "avc1", "acodec": "none", "height": 720, "filesize": 100},
+            {"format_id": "18", "protocol": "https", "url": "p", "ext": "mp4",
+             "vcodec": "avc1", "acodec": "mp4a.40.2", "height": 360, "abr": 96},
+            {"format_id": "95", "protocol": "m3u8_native", "url": "m", "ext": "mp4",
+             "vcodec": "avc1", "acodec": "mp4a.40.2", "height": 720},
+        ],
+    }  # fmt: skip
+    streams = video.streams
+    assert [s.itag for s in streams] == [140, 136, 18]
+    index = StreamIndex.from_streams(streams)
+    assert index.get_audio() == 140
+    assert index.get_video(["720p"]) == 136
+    assert index.get_progressive() == 18
+    assert streams.get_by_itag(136).resolution == "720p"
+    assert streams.get_by_itag(140).abr == "130kbps"
+    assert video.title == "First" and video.length == 60
+
+    seen = []
+    video.register_on_progress_callback(lambda s, chunk, left: seen.append(left))
+    written = io.BytesIO()
+    streams.get_by_itag(140).on_progress(b"abc", written, 7)
+    assert written.getvalue() == b"abc" and seen == [7]
+
+
+def test_yt_dlp_errors_raise_like_pytube():
+    class Failing:
+        def extract_info(self, url, download=True, process=True):
+            raise DownloadError("ERROR: [youtube] 00000000000: Private video")
+
+    backend = extractor.YtDlpExtractor()
+    backend.local.ydl = Failing()  # This thread's
+    with pytest.raises(exceptions.VideoPrivate):
+        backend.check_availability(backend.load(video_urls[0], "single"))
+
+
+def test_vtt_to_srt():
+    vtt = (
+        "WEBVTT\nKind: captions\n\n"
+        "00:00.500 --> 00:02.000 align:start\nHello\n\n"
+        "00:01:02.000 --> 00:01:03.250\nThere\nfriend\n"
+    )
+    assert extractor.vtt_to_srt(vtt) == (
+        "1\n00:00:00,500 --> 00:00:02,000\nHello\n\n"
+        "2\n00:01:02,000 --> 00:01:03,250\nThere\nfriend\n"
+    )
+
+
+def test_incomplete_backends_fail_when_made():
+    class Incomplete(extractor.Extractor):
+        def load(self, url, yt_string):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_yt_dlp_gives_each_thread_its_own_youtube_dl():
+    backend = extractor.YtDlpExtractor()
+    seen = list()
+    thread = threading.Thread(target=lambda: seen.append(backend.youtube_dl))
+    thread.start()
+    thread.join()
+    assert backend.youtube_dl is backend.youtube_dl  # Reused within a thread
+    assert seen[0] is not backend.youtube_dl
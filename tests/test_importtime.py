@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from youmirror.core import YouMirror
+
+heavy = {"pytube", "yt_dlp", "sqlitedict", "tomlkit"}  # Only imported when needed
+core_budget = int(os.environ.get("YOUMIRROR_IMPORT_BUDGET", 0))  # Microseconds, opt in
+
+
+def import_times(*args: str) -> dict[str, int]:
+    """
+    Runs the cli under -X importtime and returns module: cumulative microseconds
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "from youmirror.cli import main; main()",
+        ]
+        + list(args),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = dict()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def check_budget(times: dict[str, int]) -> None:
+    """
+    Times youmirror.core if a budget was given, ~150000 is plenty on a quiet machine
+    """
+    if core_budget:  # Too noisy on a loaded CI machine to check by default
+        assert times["youmirror.core"] < core_budget
+
+
+@pytest.fixture(scope="module")
+def mirror(tmp_path_factory):
+    root = tmp_path_factory.mktemp("mirror")
+    YouMirror(root=str(root)).new()
+    return root
+
+
+def test_help_imports_nothing_heavy():
+    times = import_times("--help")
+    assert not heavy & times.keys()
+    check_budget(times)
+
+
+def test_show_only_reads_the_config(mirror):
+    times = import_times("show", "-m", str(mirror))
+    assert not (heavy - {"tomlkit"}) & times.keys()
+    check_budget(times)
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+from youmirror.indexer import StreamIndex
+
+
+def stream(itag, kind, subtype, resolution=None, abr=None, progressive=False):
+    return SimpleNamespace(
+        itag=itag,
+        type=kind,
+        subtype=subtype,
+        resolution=resolution,
+        abr=abr,
+        is_progressive=progressive,
+        includes_audio_track=progressive or kind == "audio",
+        _filesize=itag * 1000,
+    )
+
+
+streams = [
+    stream(18, "video", "mp4", "360p", "96kbps", progressive=True),
+    stream(22, "video", "mp4", "720p", "192kbps", progressive=True),
+    stream(137, "video", "mp4", "1080p"),
+    stream(248, "video", "webm", "1080p"),
+    stream(140, "audio", "mp4", abr="128kbps"),
+    stream(139, "audio", "mp4", abr="48kbps"),
+    stream(251, "audio", "webm", abr="160kbps"),
+]
+
+
+def test_stream_index_lookups_survive_round_trip():
+    index = StreamIndex.from_streams(streams)
+    loaded = StreamIndex.from_dict(index.to_dict())
+
+    for i in (index, loaded):
+        assert i.get_video(["1440p", "1080p", "720p"]) == 137
+        assert i.get_video(["1440p"]) is None
+        assert i.get_progressive() == 22
+        assert i.get_audio() == 140
+        assert i.get_audio("webm") == 251
+        assert i.get(137)["filesize"] == 137000
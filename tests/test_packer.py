@@ -0,0 +1,39 @@
+from youmirror import databaser, encoder, packer
+
+children = [f"https://www.youtube.com/watch?v={i:011d}" for i in range(1000)][::-1]
+
+
+def test_children_pack_into_sorted_ids():
+    ids = packer.pack(children)
+    assert isinstance(ids, packer.VideoIds) and len(ids) == len(children)
+    assert len(ids.data) == 11 * len(children)  # Just the ids
+    assert list(ids) == sorted(children)
+    assert (
+        children[500] in ids
+        and "https://www.youtube.com/watch?v=00000001000" not in ids
+    )
+    assert "https://youtube.com/watch?v=00000000001" not in ids  # Not spelled the same
+
+    new = ["https://www.youtube.com/watch?v=AAAAAAAAAAA", children[0]]
+    bigger = ids.union(new)
+    assert len(bigger) == len(children) + 1 and new[0] in bigger
+    assert ids.union([children[1]]) is ids  # Nothing new
+    odd = ids.union(["https://youtu.be/x"])  # Doesn't pack, so it's a set
+    assert isinstance(odd, set) and len(odd) == len(children) + 1
+
+
+def test_children_are_saved_packed(tmp_path):
+    channel = "https://www.youtube.com/c/Foo"
+    with databaser.Session(tmp_path / "youmirror.db") as db:
+        db["channel"][channel] = {"name": "Foo", "children": children}
+        stored = db.connection.execute("SELECT children FROM channels").fetchone()[0]
+        assert stored == packer.pack(children).data
+        assert db["channel"][channel]["children"] == packer.pack(children)
+
+        # Rows saved before children were packed still read
+        old = encoder.codecs["pickle"].encode(children)
+        db.connection.execute("UPDATE channels SET children = ?", (old,))
+        assert db["channel"][channel]["children"] == packer.pack(children)
+
+        db["channel"]["odd"] = {"name": "Odd", "children": ["https://youtu.be/x"]}
+        assert db["channel"]["odd"]["children"] == {"https://youtu.be/x"}
@@ -0,0 +1,86 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from youmirror.requester import ConnectionPool
+
+
+class SizeHandler(BaseHTTPRequestHandler):
+    """
+    Answers HEAD with a size over keep-alive connections, refuses HEAD on /nohead
+    """
+
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    connections = set()
+
+    def do_HEAD(self):
+        SizeHandler.connections.add(self.client_address)
+        if self.path == "/nohead":
+            self.send_response(405)
+            self.send_header("Content-Length", "0")
+        else:
+            self.send_response(200)
+            self.send_header("Content-Length", "12345")
+        self.end_headers()
+
+    def do_GET(self):
+        self.send_response(206)
+        self.send_header("Content-Range", "bytes 0-0/777")
+        self.send_header("Content-Length", "1")
+        self.end_headers()
+        self.wfile.write(b"x")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_content_length_reuses_connections(monkeypatch):
+    import youmirror.requester as requester
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), SizeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_port}"
+    monkeypatch.setattr(requester, "pool", ConnectionPool())
+    try:
+        sizes = [requester.content_length(f"{base}/thumb{i}.jpg") for i in range(20)]
+        assert sizes == [12345] * 20
+        assert len(SizeHandler.connections) == 1  # One connection for all of them
+        assert requester.content_length(f"{base}/nohead") == 777
+    finally:
+        requester.pool.close()
+        httpd.shutdown()
+
+
+class StallHandler(BaseHTTPRequestHandler):
+    """
+    Stalls the first request past the client's timeout, answers the rest
+    """
+
+    protocol_version = "HTTP/1.1"
+    stalled = threading.Event()
+
+    def do_HEAD(self):
+        if not StallHandler.stalled.is_set():
+            StallHandler.stalled.set()
+            time.sleep(0.5)
+        self.send_response(200)
+        self.send_header("Content-Length", "42")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_timed_out_connections_are_dropped():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StallHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    pool = ConnectionPool(timeout=0.2)
+    try:
+        status, headers, _ = pool.request(
+            "HEAD", f"http://127.0.0.1:{httpd.server_port}/"
+        )
+        assert (status, headers["content-length"]) == (200, "42")  # On a new one
+        assert sum(map(len, pool.idle.values())) == 1  # Only the one that worked
+    finally:
+        pool.close()
+        httpd.shutdown()
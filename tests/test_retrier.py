@@ -0,0 +1,46 @@
+from email.message import Message
+from urllib.error import HTTPError, URLError
+
+from pytube import exceptions
+
+from youmirror import retrier
+
+
+def http_error(code: int, retry_after: str = None) -> HTTPError:
+    headers = Message()
+    if retry_after:
+        headers["Retry-After"] = retry_after
+    return HTTPError("https://example.com", code, "error", headers, None)
+
+
+def test_classify():
+    assert retrier.classify(exceptions.VideoPrivate("abc")) == "unavailable"
+    assert retrier.classify(retrier.Unavailable("no captions")) == "unavailable"
+    assert retrier.classify(exceptions.RegexMatchError("f", "p")) == "extractor"
+    assert retrier.classify(http_error(429)) == "throttled"
+    assert retrier.classify(http_error(404)) == "unavailable"
+    assert retrier.classify(http_error(503)) == "transient"
+    assert retrier.classify(URLError("timed out")) == "transient"
+
+
+def test_backoff_doubles_up_to_the_cap():
+    file = {"downloaded": False, "failure": "transient"}
+    waits = [retrier.record(file, now=0)["retry_after"] for _ in range(12)]
+    assert waits[:3] == [300, 600, 1200]
+    assert waits[-1] == retrier.day
+    assert retrier.clear(file) == {"downloaded": False}
+
+
+def test_retry_after_header_wins():
+    file = {"downloaded": False}
+    file.update(retrier.failure(http_error(429, "7200")))
+    assert retrier.record(file, now=0)["retry_after"] == 7200
+    assert "retry_hint" not in file
+
+
+def test_retry_after_reads_seconds_and_dates():
+    assert retrier.retry_after("120") == 120
+    assert retrier.retry_after("Thu, 01 Jan 1970 00:02:00 GMT", now=60) == 60
+    assert retrier.retry_after("Thu, 01 Jan 1970 00:00:00 GMT", now=60) == 0  # Past
+    assert retrier.retry_after("soon") == retrier.retry_after(None) == 0
+    assert retrier.retry_hint(http_error(429, "Thu, 01 Jan 2015 00:00:00 GMT")) == 0
@@ -0,0 +1,112 @@
+import threading
+import time
+from pathlib import Path
+
+import youmirror.databaser as databaser
+import youmirror.downloader as downloader
+from youmirror.scheduler import Scheduler
+
+
+def test_scheduler_caps_hosts_and_records_from_one_thread(monkeypatch):
+    active = {"now": 0, "most": 0}
+    lock = threading.Lock()
+    writers = set()
+    recorded = dict()
+
+    def fake_download(yt, file_type, filepath, options):
+        with lock:
+            active["now"] += 1
+            active["most"] = max(active["most"], active["now"])
+        time.sleep(0.01)
+        with lock:
+            active["now"] -= 1
+        return {"downloaded": True}
+
+    def record(filepath, file):
+        writers.add(threading.current_thread().name)
+        recorded[filepath] = file
+
+    monkeypatch.setattr(downloader, "get_host", lambda yt, t, o: "one.host")
+    monkeypatch.setattr(downloader, "download_single", fake_download)
+
+    with Scheduler(Path("."), lambda url: url, record, jobs=8, per_host=2) as s:
+        for i in range(10):
+            s.submit(f"singles/{i}.mp4", {"type": "video", "parent": str(i)}, {})
+
+    assert len(recorded) == 10
+    assert all(file["downloaded"] for file in recorded.values())
+    assert active["most"] <= 2
+    assert writers == {"youmirror-writer"}
+
+
+def test_scheduler_records_after_post_processing(monkeypatch, tmp_path):
+    recorded = dict()
+
+    def fake_download(yt, file_type, filepath, options):
+        length = 0 if "good" in filepath else 10  # Nothing to trim to for the good one
+        steps = [("trim", (str(tmp_path / "missing.mp4"), length))]
+        return {"downloaded": True, "postprocess": steps}
+
+    monkeypatch.setattr(downloader, "get_host", lambda yt, t, o: "one.host")
+    monkeypatch.setattr(downloader, "download_single", fake_download)
+
+    record = recorded.__setitem__
+    with Scheduler(Path("."), lambda url: url, record, jobs=2) as s:
+        s.submit("singles/good.mp4", {"type": "audio", "parent": "good"}, {})
+        s.submit("singles/bad.mp4", {"type": "audio", "parent": "bad"}, {})
+
+    assert recorded["singles/good.mp4"]["downloaded"]
+    assert "postprocess" not in recorded["singles/good.mp4"]
+    assert not recorded["singles/bad.mp4"]["downloaded"]  # No file for ffmpeg to trim
+    assert s.failed == ["singles/bad.mp4"]
+
+
+def test_scheduler_saves_in_group_commits(monkeypatch, tmp_path):
+    monkeypatch.setattr(downloader, "get_host", lambda yt, t, o: "one.host")
+    monkeypatch.setattr(
+        downloader, "download_single", lambda yt, t, f, o: {"downloaded": True}
+    )
+    table = databaser.open_table(tmp_path / "youmirror.db", "files")
+    batch = databaser.Batcher(table, size=4, seconds=60)
+
+    with Scheduler(
+        Path("."), lambda url: url, batch.__setitem__, jobs=4, flush=batch.flush
+    ) as s:
+        for i in range(10):
+            s.submit(f"singles/{i}.jpg", {"type": "thumbnail", "parent": str(i)}, {})
+
+    assert batch.stats() == {"commits": 3, "saved": 10}  # 4, 4 and the 2 left over
+    assert len(table.find(downloaded=True)) == 10
+    databaser.close_table(table)
+
+
+def test_scheduler_cancels_queued_downloads_on_error(monkeypatch, tmp_path):
+    monkeypatch.setattr(downloader, "get_host", lambda yt, t, o: "one.host")
+    started = threading.Event()
+
+    def slow_download(yt, file_type, filepath, options):
+        started.set()
+        time.sleep(0.05)
+        return {"downloaded": True}
+
+    monkeypatch.setattr(downloader, "download_single", slow_download)
+    table = databaser.open_table(tmp_path / "youmirror.db", "files")
+    batch = databaser.Batcher(table, size=100, seconds=60)
+
+    try:
+        with Scheduler(
+            Path("."), lambda url: url, batch.__setitem__, jobs=1, flush=batch.flush
+        ) as s:
+            for i in range(20):
+                s.submit(
+                    f"singles/{i}.jpg", {"type": "thumbnail", "parent": str(i)}, {}
+                )
+            started.wait()
+            raise KeyboardInterrupt  # Ctrl-C mid sync
+    except KeyboardInterrupt:
+        pass
+
+    saved = len(table.find(downloaded=True))
+    assert 1 <= saved < 20  # The one running finished, the queued ones were cancelled
+    assert batch.stats()["saved"] == saved  # And the last group still got committed
+    databaser.close_table(table)
@@ -0,0 +1,28 @@
+import time
+from datetime import datetime
+
+from youmirror.throttler import TokenBucket, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("20M") == 20 * 1024**2
+    assert parse_rate("1.5k") == 1536
+    assert parse_rate("500KB/s") == 500 * 1024
+    assert parse_rate(0) == 0
+    assert parse_rate("") == 0
+
+
+def test_schedule_picks_rate_by_time_of_day():
+    bucket = TokenBucket("20M", "22:00-06:00=0, 12:00-13:00=1M")
+    assert bucket.current_rate(datetime(2024, 1, 1, 23, 30)) == 0
+    assert bucket.current_rate(datetime(2024, 1, 1, 3, 0)) == 0
+    assert bucket.current_rate(datetime(2024, 1, 1, 12, 30)) == 1024**2
+    assert bucket.current_rate(datetime(2024, 1, 1, 9, 0)) == 20 * 1024**2
+
+
+def test_bucket_holds_the_rate():
+    bucket = TokenBucket(100000)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.consume(10000)
+    assert time.monotonic() - start >= 0.45  # 50KB at 100KB/s
@@ -0,0 +1,49 @@
+import json
+from types import SimpleNamespace
+
+from youmirror.tracker import Histogram, Metrics, summary_file
+
+
+def test_histogram_buckets():
+    histogram = Histogram((1, 10))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+    data = histogram.to_dict()
+    assert data["buckets"] == {"<=1": 2, "<=10": 1, ">10": 1}
+    assert (data["count"], data["min"], data["max"]) == (4, 0.5, 50)
+
+
+def test_session_counts_bytes_and_writes_summary(tmp_path):
+    metrics = Metrics()
+    video = SimpleNamespace(type="video", resolution="720p", abr=None)
+    audio = SimpleNamespace(type="audio", resolution=None, abr="128kbps")
+    with metrics.session(tmp_path):
+        with metrics.session(tmp_path):  # Nested sessions add to the outer one
+            metrics.queued(300)
+            metrics.on_progress(video, b"x" * 200, 0)
+            metrics.on_progress(audio, b"x" * 100, 0)
+            metrics.on_complete(video, "video.mp4")
+            metrics.finished("video/720p", 1.5, True)
+        assert not (tmp_path / summary_file).exists()
+        metrics.first_byte("cdn.host", 0.2)
+
+    summary = json.loads((tmp_path / summary_file).read_text())
+    assert summary["bytes"] == 300
+    assert summary["files"] == 1
+    assert summary["by_type"]["video/720p"]["bytes"] == 200
+    assert summary["by_type"]["video/720p"]["throughput"]["count"] == 1
+    assert summary["by_type"]["audio/128kbps"]["bytes"] == 100
+    assert summary["by_host"]["cdn.host"]["ttfb"]["count"] == 1
+
+
+def test_failed_transfers_are_forgotten():
+    metrics = Metrics()
+    video = SimpleNamespace(type="video", resolution="720p", abr=None)
+    try:
+        with metrics.transfer(video):
+            metrics.on_progress(video, b"x" * 200, 100)
+            raise IOError("Connection dropped")
+    except IOError:
+        pass
+    assert metrics.transfers == {}  # A new stream with its id starts fresh
+    assert metrics.bytes == 200  # What came down still counts
@@ -0,0 +1,45 @@
+from youmirror import tuber
+
+
+class FakeChannel:
+    def __init__(self, pages: list[list[str]]) -> None:
+        self.pages = pages
+        self.loaded = 0  # Pages fetched so far
+
+    def url_generator(self):
+        for page in self.pages:
+            self.loaded += 1
+            yield from page
+
+
+def test_new_children_stop_at_known_videos():
+    urls = [f"https://www.youtube.com/watch?v={i:011d}" for i in range(12)]
+    channel = FakeChannel([urls[0:4], urls[4:8], urls[8:12]])  # Newest first
+    known = set(urls[2:])  # Two new uploads
+
+    assert tuber.get_new_children(channel, known, stop_after=3) == urls[:2]
+    assert channel.loaded == 2  # Never asked for the last page
+
+
+def test_new_children_keep_going_past_short_runs():
+    urls = [f"https://www.youtube.com/watch?v={i:011d}" for i in range(6)]
+    channel = FakeChannel([urls])
+    known = {urls[1], urls[3], urls[4], urls[5]}
+
+    assert tuber.get_new_children(channel, known, stop_after=2) == [urls[0], urls[2]]
+
+
+def test_canonical_urls_match_pytube():
+    assert (
+        tuber.canonical_url("https://www.youtube.com/watch?v=6NQHtVrP3gE&t=10s")
+        == "https://youtube.com/watch?v=6NQHtVrP3gE"
+    )
+    assert (
+        tuber.canonical_url("https://youtube.com/playlist?list=PLabc123&index=2")
+        == "https://www.youtube.com/playlist?list=PLabc123"
+    )
+    assert (
+        tuber.canonical_url("https://www.youtube.com/c/Foo/videos")
+        == "https://www.youtube.com/c/Foo"
+    )
+    assert tuber.canonical_url("https://www.youtube.com/playlist?list") is None
@@ -0,0 +1,225 @@
+"""
+This module benchmarks the database on a made up mirror
+----
+    python -m youmirror.benchmarker --files 100000
+builds the same synthetic mirror once per codec in a scratch directory, and once
+as the sqlitedict tables mirrors used to have, then reports
+    size:   how big youmirror.db ends up
+    encode: seconds spent packing the BLOB and extra values
+    decode: seconds spent unpacking them again
+    plan:   seconds to work out every channel's pending files, which is what
+            sync does before it downloads anything
+----
+Every video gets a video, audio, caption and thumbnail file, a stream index
+like the one indexer saves, and a path. Channels get the watch urls of their
+videos as children. Half the files are already downloaded.
+"""
+
+import argparse
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+import youmirror.databaser as databaser  # What's being measured
+import youmirror.encoder as encoder  # And how it packs values
+
+file_types = ("video", "audio", "caption", "thumbnail")  # Every video has these
+per_channel = 500  # Videos in each channel
+
+
+def synthetic_mirror(files: int) -> dict[str, dict]:
+    """
+    Returns {table name: {key: entry}} for a mirror with about that many files
+    """
+    mirror = {name: dict() for name in databaser.valid_tables}
+    videos = max(1, files // len(file_types))
+    for number in range(videos):
+        channel_number = number // per_channel
+        channel = f"https://www.youtube.com/@channel{channel_number}"
+        if channel not in mirror["channel"]:
+            path = f"channels/Channel_{channel_number}"
+            mirror["channel"][channel] = {
+                "id": f"/@channel{channel_number}",
+                "name": f"Channel {channel_number}",
+                "path": path,
+                "children": list(),
+                "last_full_update": 1.7e9,
+            }
+            mirror["paths"][path] = {"parent": channel}
+        url = f"https://www.youtube.com/watch?v={number:011d}"
+        mirror["channel"][channel]["children"].append(url)
+        path = f"channels/Channel_{channel_number}/Video_{number}"
+        mirror["single"][url] = {
+            "id": f"{number:011d}",
+            "name": f"Video {number}",
+            "path": path,
+            "parent": channel,
+            "parent_name": f"Channel {channel_number}",
+            "parent_type": "channel",
+            "streams": {
+                "streams": [
+                    [itag, "video", "mp4", resolution, None, False, False, 10**7]
+                    for itag, resolution in ((137, "1080p"), (136, "720p"))
+                ]
+                + [[140, "audio", "mp4", None, "128kbps", False, False, 10**6]]
+            },
+        }
+        mirror["paths"][path] = {"parent": url}
+        for file_type in file_types:
+            filepath = f"{path}/Video_{number}.{file_type}"
+            mirror["files"][filepath] = {
+                "parent": url,
+                "type": file_type,
+                "downloaded": number % 2 == 0,
+                "resolution": "720p" if file_type == "video" else None,
+                "language": "en" if file_type == "caption" else None,
+                "filesize": 10**6,
+            }
+    return mirror
+
+
+def db_size(path: Path) -> int:
+    """
+    Returns how big the database is with everything checkpointed into it
+    """
+    with databaser.Session(path) as db:
+        db["files"]  # Connects
+        db.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return path.stat().st_size
+
+
+def packed_values(mirror: dict) -> list:
+    """
+    Returns every value encoder packs into a BLOB column or `extra`
+    """
+    values = list()
+    for name, entries in mirror.items():
+        columns = databaser.tables[name][2]
+        for entry in entries.values():
+            values.extend(
+                entry[column]
+                for column, kind in columns.items()
+                if kind == "BLOB"
+                and column not in databaser.packed_columns  # Always packed ids
+                and entry.get(column) is not None
+            )
+            if extra := {k: v for k, v in entry.items() if k not in columns}:
+                values.append(extra)
+    return values
+
+
+def run_codec(name: str, mirror: dict, root: Path) -> dict:
+    """
+    Measures one codec on the mirror
+    """
+    previous = encoder.codec
+    encoder.codec = encoder.codecs[name]
+    try:
+        values = packed_values(mirror)
+        started = time.perf_counter()
+        packed = [encoder.encode(value) for value in values]
+        encode = time.perf_counter() - started
+        started = time.perf_counter()
+        for data in packed:
+            encoder.decode(data)
+        decode = time.perf_counter() - started
+
+        path = root / f"{name}.db"
+        with databaser.Session(path) as db:
+            with db.transaction():
+                for table, entries in mirror.items():
+                    db[table].update(entries)
+        started = time.perf_counter()
+        with databaser.Session(path) as db:
+            for channel in mirror["channel"]:
+                databaser.pending_files(db["files"], channel, "channel")
+        plan = time.perf_counter() - started
+        return {"size": db_size(path), "encode": encode, "decode": decode, "plan": plan}
+    finally:
+        encoder.codec = previous
+
+
+def run_sqlitedict(mirror: dict, root: Path) -> dict:
+    """
+    Measures the tables mirrors had before the schema, a pickled dict per row
+    Planning walked every single and then looked up each of its files
+    """
+    from sqlitedict import SqliteDict  # Only needed here
+
+    path = str(root / "sqlitedict.db")
+    singles_files = dict()  # The files each single used to keep in its entry
+    for filepath, file in mirror["files"].items():
+        singles_files.setdefault(file["parent"], dict())[filepath] = file
+    rows = {
+        name: {
+            key: {**entry, "files": singles_files.get(key, {})}
+            if name == "single"
+            else entry
+            for key, entry in entries.items()
+        }
+        for name, entries in mirror.items()
+    }
+    started = time.perf_counter()
+    packed = [
+        pickle.dumps(entry) for entries in rows.values() for entry in entries.values()
+    ]
+    encode = time.perf_counter() - started
+    started = time.perf_counter()
+    for data in packed:
+        pickle.loads(data)
+    decode = time.perf_counter() - started
+    for name, entries in rows.items():
+        with SqliteDict(path, tablename=name) as table:
+            table.update(entries)
+            table.commit()
+
+    started = time.perf_counter()
+    with (
+        SqliteDict(path, tablename="channel", flag="r") as channels,
+        SqliteDict(path, tablename="single", flag="r") as singles,
+        SqliteDict(path, tablename="files", flag="r") as files,
+    ):
+        for channel in mirror["channel"]:
+            for child in channels[channel]["children"]:
+                for filepath in singles[child]["files"]:
+                    files[filepath]["downloaded"]
+    plan = time.perf_counter() - started
+    return {
+        "size": Path(path).stat().st_size,
+        "encode": encode,
+        "decode": decode,
+        "plan": plan,
+    }
+
+
+def benchmark(files: int) -> dict[str, dict]:
+    """
+    Returns the measurements for each codec and for sqlitedict
+    """
+    mirror = synthetic_mirror(files)
+    results = dict()
+    with tempfile.TemporaryDirectory() as scratch:
+        root = Path(scratch)
+        results["sqlitedict"] = run_sqlitedict(mirror, root)
+        for name in encoder.codecs:
+            results[name] = run_codec(name, mirror, root)
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("----")[0].strip())
+    parser.add_argument("--files", type=int, default=100000, help="Files to make up")
+    args = parser.parse_args(argv)
+    results = benchmark(args.files)
+    print(f"{args.files} files")
+    print(f"{'':<12}{'size':>10}{'encode':>10}{'decode':>10}{'plan':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:<12}{result['size'] / 2**20:>8.1f}MB"
+            f"{result['encode']:>9.2f}s{result['decode']:>9.2f}s{result['plan']:>9.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+This module keeps what youtube told us about videos, playlists and channels on disk
+----
+pytube objects only live as long as the process, so every sync, update and remove
+used to fetch watch pages again for things we already knew, like a video's title.
+The cache lives next to youmirror.db and is keyed by the id tuber.get_id returns.
+Every field is saved with the time it was fetched and has its own time to live:
+names barely ever change, lists of children change whenever something is uploaded,
+and the stream index only describes what youtube is serving right now.
+----
+cache = {
+    id: {
+        field: [value, saved at],       (name, url, available, children, streams)
+    }
+}
+A ttl of 0 turns caching off for that field. `youmirror invalidate` clears it
+----
+The ObjectCache below is the in-process cache of pytube objects. Each one holds on
+to its watch page, player response and parsed streams, which adds up to hundreds
+of MB over a big mirror, so it is a least recently used cache bounded by both
+count and (estimated) bytes. Before an object is evicted it is first shrunk down
+to its compact metadata (id, title, stream index), since pytube loads anything
+we dropped again if it is ever needed.
+"""
+
+from __future__ import annotations  # SqliteDict is only imported for type checking
+
+import atexit
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+from youmirror.importer import lazy  # The object cache doesn't need sqlite
+
+sqlitedict = lazy("sqlitedict")
+if TYPE_CHECKING:
+    from sqlitedict import SqliteDict
+
+cache_file = "youmirror.cache"  # Lives next to youmirror.db
+ttl_options = {  # Field: option that holds its ttl in seconds
+    "name": "cache_name_ttl",
+    "url": "cache_name_ttl",
+    "available": "cache_available_ttl",
+    "children": "cache_children_ttl",
+    "streams": "cache_streams_ttl",
+}
+commit_every = 100  # Writes between commits, the rest go out on close
+heavy_attributes = {  # What pytube objects hold that shrinking drops
+    "_watch_html",
+    "_embed_html",
+    "_js",
+    "_vid_info",
+    "_fmt_streams",
+    "_initial_data",
+    "_player_config_args",
+    "_metadata",
+    "_html",
+    "_ytcfg",
+    "_sidebar_info",
+    "_about_html",
+    "_community_html",
+    "_featured_channels_html",
+    "_playlists_html",
+    "_info",  # yt-dlp's, see extractor
+}
+
+
+class MetadataCache:
+    """
+    Fields with a time to live, saved per id in a sqlite file
+    Without a path nothing is kept, so everything is fetched like before
+    """
+
+    def __init__(self, path: Path = None, ttls: dict = None) -> None:
+        self.path: Path = path  # Where the cache file is
+        self.ttls: dict[str, float] = ttls or dict()  # Field: seconds
+        self.table: SqliteDict = None
+        if path:
+            self.table = sqlitedict.SqliteDict(
+                str(path), tablename="cache", autocommit=False
+            )
+        self.lock = threading.Lock()  # Entries are read, changed and written back
+        self.pending: int = 0  # Writes since the last commit
+
+    def get(self, key: str, field: str):
+        """
+        Returns the field if we have it and it hasn't expired, otherwise None
+        """
+        ttl = self.ttls.get(field, 0)
+        if self.table is None or not key or not ttl:
+            return None
+        with self.lock:
+            entry = self.table.get(key, {})
+        if field not in entry:
+            return None
+        value, saved = entry[field]
+        if time.time() - saved > ttl:  # Too old to trust
+            return None
+        return value
+
+    def put(self, key: str, field: str, value) -> None:
+        """
+        Saves the field with the current time
+        """
+        if self.table is None or not key or not self.ttls.get(field, 0):
+            return
+        with self.lock:
+            entry = self.table.get(key, {})
+            entry[field] = [value, time.time()]
+            self.table[key] = entry
+            self.pending += 1
+            if self.pending >= commit_every:
+                self.table.commit()
+                self.pending = 0
+
+    def cached(self, key: str, field: str, fetch: Callable):
+        """
+        Returns the field from the cache, or fetches it and saves it for next time
+        """
+        if (value := self.get(key, field)) is not None:
+            return value
+        value = fetch()
+        if value is not None:  # Don't remember failures
+            self.put(key, field, value)
+        return value
+
+    def invalidate(self, key: str = None, fields: list[str] = None) -> int:
+        """
+        Forgets the fields (all of them if none are given) for the id, or for every
+        id if none is given. Returns how many entries were changed
+        """
+        if self.table is None:
+            return 0
+        with self.lock:
+            keys = [key] if key else list(self.table.keys())
+            changed = 0
+            for k in keys:
+                if k not in self.table:
+                    continue
+                if fields:
+                    entry = self.table[k]
+                    if not any(field in entry for field in fields):
+                        continue
+                    for field in fields:
+                        entry.pop(field, None)
+                    self.table[k] = entry
+                else:
+                    del self.table[k]
+                changed += 1
+            self.table.commit()
+            self.pending = 0
+        return changed
+
+    def commit(self) -> None:
+        """
+        Writes anything pending to disk
+        """
+        if self.table is not None:
+            with self.lock:
+                self.table.commit()
+                self.pending = 0
+
+    def close(self) -> None:
+        """
+        Commits and closes the cache file
+        """
+        if self.table is not None:
+            self.commit()
+            self.table.close()
+            self.table = None
+
+
+cache = MetadataCache()  # Does nothing until configure opens a mirror's cache
+
+
+def configure(root: Path, options: dict) -> MetadataCache:
+    """
+    Opens the cache for the mirror at root with the ttls from the options
+    """
+    global cache
+    ttls = {
+        field: float(options.get(option, 0)) for field, option in ttl_options.items()
+    }
+    path = Path(root) / cache_file
+    if cache.path == path:  # Already open, the ttls might have changed though
+        cache.ttls = ttls
+        return cache
+    try:
+        cache.close()
+        cache = MetadataCache(path, ttls)
+        atexit.register(cache.close)  # Whatever hasn't been committed yet
+    except Exception as e:
+        logging.exception(f"Could not open the metadata cache due to {e}")
+        cache = MetadataCache()
+    return cache
+
+
+def deep_size(value) -> int:
+    """
+    Returns roughly how many bytes a value holds, counting strings by length
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(deep_size(k) + deep_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(deep_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def shrink(obj) -> None:
+    """
+    Drops everything heavy from a pytube object, keeping its title and stream index
+    """
+    attributes = vars(obj)
+    if details := (attributes.get("_vid_info") or {}).get("videoDetails"):
+        obj._title = obj._title or details.get("title")  # Pin it before dropping
+        obj._author = obj._author or details.get("author")
+    for name in heavy_attributes & attributes.keys():
+        setattr(obj, name, None)
+
+
+class Entry:
+    """
+    A cached object and what we know about its size
+    """
+
+    def __init__(self, obj) -> None:
+        self.obj = obj
+        self.size: int = 0  # Estimated bytes
+        self.sizes: dict[str, tuple[int, int]] = dict()  # Attribute: (id, size)
+
+    def weigh(self) -> int:
+        """
+        Measures the object again, pytube fills attributes in as they're used
+        Containers are only walked when the attribute points at a new one
+        """
+        size = 0
+        for name, value in vars(self.obj).items():
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+            elif isinstance(value, (dict, list, tuple)):
+                if (known := self.sizes.get(name)) and known[0] == id(value):
+                    size += known[1]
+                else:
+                    self.sizes[name] = (id(value), deep_size(value))
+                    size += self.sizes[name][1]
+        self.size = size
+        return size
+
+
+class ObjectCache:
+    """
+    Least recently used cache of pytube objects, bounded by count and bytes
+    Works like the dict it replaced (in, [], get), and counts hits and misses
+    Objects a download has checked out are never shrunk under pressure, only
+    by shrink(url) once sync is done with them
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 268435456) -> None:
+        self.max_entries: int = max_entries  # Most objects kept
+        self.max_bytes: int = max_bytes  # Most estimated bytes kept
+        self.entries: OrderedDict[str, Entry] = OrderedDict()  # Oldest first
+        self.checkouts: dict[str, int] = dict()  # Url: downloads still using it
+        self.bytes: int = 0  # Estimated total
+        self.lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.shrinks: int = 0
+        self.evictions: int = 0
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, url: str):
+        if (obj := self.get(url)) is None:
+            raise KeyError(url)
+        return obj
+
+    def __setitem__(self, url: str, obj) -> None:
+        with self.lock:
+            if old := self.entries.pop(url, None):
+                self.bytes -= old.size
+            entry = Entry(obj)
+            self.bytes += entry.weigh()
+            self.entries[url] = entry
+            self._trim()
+
+    def get(self, url: str, default=None):
+        """
+        Returns the object and marks it as recently used
+        """
+        with self.lock:
+            if (entry := self.entries.get(url)) is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(url)
+            self.bytes += entry.weigh() - entry.size  # It may have loaded more
+            self._trim()
+            return entry.obj
+
+    def peek(self, url: str, default=None):
+        """
+        Returns the object without counting it as a use
+        """
+        with self.lock:
+            entry = self.entries.get(url)
+            return entry.obj if entry else default
+
+    def checkout(self, url: str) -> None:
+        """
+        Marks the object as in use by a download, before or after it's cached
+        """
+        with self.lock:
+            self.checkouts[url] = self.checkouts.get(url, 0) + 1
+
+    def shrink(self, url: str) -> None:
+        """
+        Shrinks the object down to its metadata once its streams aren't needed
+        This also hands back every checkout of it
+        """
+        with self.lock:
+            self.checkouts.pop(url, None)
+            if entry := self.entries.get(url):
+                self._shrink(entry)
+
+    def resize(self, max_entries: int, max_bytes: int) -> None:
+        """
+        Changes the bounds and trims to fit
+        """
+        with self.lock:
+            self.max_entries, self.max_bytes = max_entries, max_bytes
+            self._trim()
+
+    def stats(self) -> dict:
+        """
+        Returns the hit, miss and memory numbers
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "shrinks": self.shrinks,
+                "evictions": self.evictions,
+            }
+
+    def _shrink(self, entry: Entry) -> None:
+        """
+        Shrinks one entry, the lock must be held
+        """
+        before = entry.size
+        shrink(entry.obj)
+        self.bytes += entry.weigh() - before
+        self.shrinks += 1
+
+    def _trim(self) -> None:
+        """
+        Gets back under the bounds, the lock must be held
+        Over the byte budget the oldest objects are shrunk first and only evicted
+        if that wasn't enough. Over the count they're evicted
+        Checked out objects are skipped, shrinking them would only make their
+        download fetch the watch page again
+        """
+        while len(self.entries) > self.max_entries:
+            self._evict()
+        if self.bytes <= self.max_bytes:
+            return
+        for url, entry in list(self.entries.items())[:-1]:  # Keep the newest whole
+            if url in self.checkouts:
+                continue
+            if entry.size > 0 and any(
+                vars(entry.obj).get(name) is not None for name in heavy_attributes
+            ):
+                self._shrink(entry)
+            if self.bytes <= self.max_bytes:
+                return
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            self._evict()
+
+    def _evict(self) -> None:
+        """
+        Drops the least recently used entry nobody has checked out, or the least
+        recently used one if they all are, the lock must be held
+        """
+        url = next((url for url in self.entries if url not in self.checkouts), None)
+        if url is None:
+            url, entry = self.entries.popitem(last=False)
+        else:
+            entry = self.entries.pop(url)
+        self.bytes -= entry.size
+        self.evictions += 1
@@ -0,0 +1,135 @@
+"""
+This module checks whether mirrored videos are still up on youtube
+----
+Loading a watch page per video is around a megabyte, which is way too much for
+tens of thousands of videos. Youtube's oEmbed endpoint answers the same question
+in a few hundred bytes: 200 means the video is up, 404 means it's gone, 401/403
+means it's private or just can't be embedded. Only that last case loads the
+watch page through the extractor to tell the two apart.
+----
+Requests go through the shared keep-alive pool (see requester) from a pool of
+threads, at most `rate` a second. If youtube says slow down (429) the worker
+backs off and tries again, honoring Retry-After
+"""
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator
+from urllib.parse import quote
+
+from pytube import exceptions
+
+import youmirror.extractor as extractor  # Only asked when oEmbed can't tell
+import youmirror.requester as requester  # Keep-alive connections
+import youmirror.retrier as retrier  # Reads Retry-After
+from youmirror.throttler import TokenBucket  # Requests per second limit
+
+oembed_url = "https://www.youtube.com/oembed?format=json&url={}"
+max_attempts = 4  # Tries per video when youtube throttles us
+reasons = {  # pytube exception: why the video can't be watched
+    exceptions.VideoPrivate: "private",
+    exceptions.MembersOnly: "members_only",
+    exceptions.VideoRegionBlocked: "region_blocked",
+    exceptions.AgeRestrictedError: "age_restricted",
+    exceptions.RecordingUnavailable: "recording_unavailable",
+    exceptions.LiveStreamError: "live_stream",
+}
+
+
+def reason(e: Exception) -> str:
+    """
+    Returns why the extractor says a video can't be watched
+    """
+    return next((r for t, r in reasons.items() if isinstance(e, t)), "unavailable")
+
+
+def confirm(url: str) -> dict:
+    """
+    Asks the extractor, for the videos oEmbed can't tell us about
+    """
+    try:
+        extractor.backend.check_availability(extractor.backend.load(url, "single"))
+        return {"available": True, "reason": None}  # Just can't be embedded
+    except exceptions.VideoUnavailable as e:
+        return {"available": False, "reason": reason(e)}
+
+
+class Throttled(Exception):
+    """
+    Raised when youtube asks us to slow down
+    """
+
+    def __init__(self, retry_after: float = 0) -> None:
+        super().__init__(f"Throttled, retry after {retry_after}s")
+        self.retry_after: float = retry_after
+
+
+def check_video(url: str) -> dict:
+    """
+    Returns whether the video is available and if not, why
+    available is None if we couldn't find out
+    """
+    status, headers, _ = requester.pool.request("GET", oembed_url.format(quote(url)))
+    if status == 200:
+        return {"available": True, "reason": None}
+    if status in (404, 410):
+        return {"available": False, "reason": "removed"}
+    if status in (401, 403):
+        return confirm(url)
+    if status == 429:
+        raise Throttled(retrier.retry_after(headers.get("retry-after")))
+    return {"available": None, "reason": f"status {status}"}
+
+
+class Checker:
+    """
+    Checks a lot of videos at once without hammering youtube
+    """
+
+    def __init__(self, jobs: int = 16, rate: float = 20) -> None:
+        self.jobs: int = max(1, int(jobs))  # Worker threads
+        self.bucket = TokenBucket(rate)  # One token per request
+
+    def check(self, url: str) -> dict:
+        """
+        Checks one video, backing off if we get throttled
+        """
+        wait = 5  # Seconds, doubled every time we're throttled
+        for attempt in range(max_attempts):
+            self.bucket.consume(1)
+            try:
+                result = check_video(url)
+            except Throttled as e:
+                if attempt + 1 == max_attempts:
+                    return {"available": None, "reason": "throttled"}
+                time.sleep(max(wait, e.retry_after))
+                wait *= 2
+                continue
+            except Exception as e:
+                logging.debug(f"Could not check {url} due to {e}")
+                return {"available": None, "reason": f"{type(e).__name__}: {e}"}
+            result["last_checked"] = time.time()
+            return result
+
+    def run(self, urls: Iterable[str]) -> Iterator[tuple[str, dict]]:
+        """
+        Yields (url, result) as the checks finish, so one thread can record them
+        """
+        with ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="youmirror-check"
+        ) as pool:
+            futures = {pool.submit(self.check, url): url for url in urls}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+
+def write_report(path, report: list[dict]) -> None:
+    """
+    Saves the videos that went away as json
+    """
+    try:
+        path.write_text(json.dumps(report, indent=2))
+    except Exception as e:
+        logging.exception(f"Could not write the report due to {e}")
@@ -20,12 +20,26 @@ def sync(
     update: bool = typer.Option(
         False, "--update", help="Update the database before syncing"
     ),
+    retry: bool = typer.Option(
+        False, "--retry", help="Retry failed downloads without waiting for cooldown"
+    ),
+    jobs: Optional[int] = typer.Option(
+        None, *("-j", "--jobs"), help="How many files to download at once"
+    ),
+    limit_rate: Optional[str] = typer.Option(
+        None, "--limit-rate", help="Bandwidth limit like 500K or 20M (bytes/sec)"
+    ),
     # dry_run : Optional[bool] = typer.Option(default=False, show_choices=False, help="Calculates changes with no execution"),
 ):
     """
     Downloads videos to match the mirror
     """
-    kwargs = {"update": update}
+    kwargs = {
+        "update": update,
+        "retry": retry,
+        "jobs": jobs,
+        "max_bandwidth": limit_rate,
+    }
     ym = YouMirror(root=mirror)
     ym.sync(url=url, **kwargs)
     return
@@ -69,6 +83,12 @@ def add(
     no_dl: Optional[bool] = typer.Option(
         False, "--no-dl", help="Adds the url to the mirror without downloading"
     ),
+    jobs: Optional[int] = typer.Option(
+        None, *("-j", "--jobs"), help="How many files to download at once"
+    ),
+    limit_rate: Optional[str] = typer.Option(
+        None, "--limit-rate", help="Bandwidth limit like 500K or 20M (bytes/sec)"
+    ),
 ):
     """
     Adds the url to the mirror and downloads videos
@@ -85,6 +105,8 @@ def add(
         "force": force,
         "dry_run": "",
         "no_dl": no_dl,
+        "jobs": jobs,
+        "max_bandwidth": limit_rate,
     }
     ym = YouMirror(root=mirror)
     ym.add(url, **kwargs)
@@ -109,13 +131,24 @@ def remove(
     ym.remove(url, **kwargs)
 
 
-# @app.command()
-# def check():
-#     '''
-#     Checks the database to see if any mirrored files are no longer supported by Youtube.
-#     Generally updates metadata
-#     '''
-#     return
+@app.command()
+def check(
+    mirror: Optional[str] = typer.Option(
+        "./", *("-m", "--mirror"), help="Root directory for the mirror"
+    ),
+    jobs: Optional[int] = typer.Option(
+        None, *("-j", "--jobs"), help="How many videos to check at once"
+    ),
+    rate: Optional[float] = typer.Option(
+        None, "--rate", help="Most requests a second to make"
+    ),
+):
+    """
+    Checks the database to see if any mirrored videos are no longer on Youtube
+    """
+    kwargs = {"check_jobs": jobs, "check_rate": rate}
+    ym = YouMirror(root=mirror)
+    ym.check(**kwargs)
 
 
 @app.command()
@@ -127,15 +160,43 @@ def update(
     sync: Optional[bool] = typer.Option(
         False, "--sync", help="Sync the database after updating"
     ),
+    full: Optional[bool] = typer.Option(
+        False, "--full", help="Walk every video instead of stopping at known ones"
+    ),
+    jobs: Optional[int] = typer.Option(
+        None, *("-j", "--jobs"), help="How many files to download at once"
+    ),
+    limit_rate: Optional[str] = typer.Option(
+        None, "--limit-rate", help="Bandwidth limit like 500K or 20M (bytes/sec)"
+    ),
 ):
     """
     Updates the mirror when new videos are available
     """
-    kwargs = {"sync": sync}
+    kwargs = {"sync": sync, "full": full, "jobs": jobs, "max_bandwidth": limit_rate}
     ym = YouMirror(root=mirror)
     ym.update(url=url, **kwargs)
 
 
+@app.command()
+def invalidate(
+    url: str = typer.Argument(None, help="Only clear what's cached for this url"),
+    mirror: Optional[str] = typer.Option(
+        "./", *("-m", "--mirror"), help="Root directory for the mirror"
+    ),
+    field: Optional[list[str]] = typer.Option(
+        None,
+        "--field",
+        help="Only clear this field (name, url, available, children, streams)",
+    ),
+):
+    """
+    Clears the metadata cache so it gets fetched from youtube again
+    """
+    ym = YouMirror(root=mirror)
+    ym.invalidate(url=url, fields=field)
+
+
 @app.command()
 def show(
     mirror: str = typer.Option(
@@ -0,0 +1,63 @@
+"""
+This module makes sure the same thing is only fetched once at a time
+----
+The same video is often in several of the mirror's playlists, so with downloads
+running concurrently a few workers regularly ask for the same video, its streams,
+a stream's size or its thumbnail at the same moment. Each of those is a round trip
+to youtube. A flight is keyed by what is being fetched, like ("streams", video id):
+the first caller runs the fetch and everyone else who asks for the same key while
+it's in the air waits for it and gets the same result, or the same exception.
+Once it lands the key is forgotten, so nothing is cached here
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Hashable
+
+
+class SingleFlight:
+    """
+    At most one call in flight per key, shared by everyone who asks for it meanwhile
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.flights: dict[Hashable, Future] = dict()  # Key: the call in the air
+        self.calls: int = 0  # Fetches that actually ran
+        self.shared: int = 0  # Callers that got someone else's result
+
+    def do(self, key: Hashable, fetch: Callable):
+        """
+        Returns what fetch returns, running it only if no one else already is
+        """
+        with self.lock:
+            if (flight := self.flights.get(key)) is not None:
+                self.shared += 1
+                leader = False
+            else:
+                flight = self.flights[key] = Future()
+                self.calls += 1
+                leader = True
+        if not leader:
+            return flight.result()  # Raises whatever the fetch raised
+        try:
+            result = fetch()
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.flights[key]
+
+    def stats(self) -> dict:
+        """
+        Returns how many fetches ran and how many were saved
+        """
+        with self.lock:
+            return {"calls": self.calls, "shared": self.shared}
+
+
+flights = SingleFlight()  # Shared by every worker in the process
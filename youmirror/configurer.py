@@ -10,11 +10,13 @@ ids     - YouTube specific ids (keys)
 
 """
 
-import tomlkit
 import logging
 from datetime import datetime
 from pathlib import Path
 from copy import deepcopy
+from youmirror.importer import lazy  # Commands that don't read the config skip it
+
+tomlkit = lazy("tomlkit")
 
 defaults = {  # These are the default global configs if not specified
     "dry_run": False,  # Dry run means don't download automatically
@@ -25,6 +27,27 @@ defaults = {  # These are the default global configs if not specified
     "dl_audio": False,  # Whether to download audio
     "dl_thumbnail": False,  # Whether to download the thumbnail
     "captions": ["en", "a.en"],  # Which caption types to check for
+    "jobs": 4,  # How many files to download at once
+    "jobs_per_host": 2,  # How many of those can come from the same host
+    "segments": 1,  # Connections to split one big stream across (1 turns it off)
+    "segment_size": 104857600,  # Only split streams bigger than this (100MiB)
+    "mux": "files",  # How ffmpeg gets video and audio, "files" or "pipe"
+    "max_bandwidth": 0,  # Download rate limit like "20M", 0 is unlimited
+    "bandwidth_schedule": "",  # Time of day limits like "00:00-07:00=0, 07:00-24:00=20M"
+    "cache_name_ttl": 2592000,  # Seconds to trust a cached name or url (30 days)
+    "cache_available_ttl": 86400,  # Or whether a video is available (1 day)
+    "cache_children_ttl": 3600,  # Or a channel/playlist's videos (1 hour)
+    "cache_streams_ttl": 21600,  # Or a video's stream index (6 hours)
+    "cache_max_objects": 1000,  # pytube objects kept in memory at once
+    "cache_max_bytes": 268435456,  # And roughly how much memory they can use (256MiB)
+    "update_stop_after": 30,  # Stop walking a channel after this many known videos
+    "full_update_days": 7,  # Walk the whole channel every so often anyway (0 never)
+    "check_jobs": 16,  # How many videos `youmirror check` looks at at once
+    "check_rate": 20,  # And how many requests a second it makes at most
+    "extractor": "pytube",  # What reads youtube, "pytube" or "yt-dlp"
+    "db_batch_files": 50,  # Finished files saved to the database per commit
+    "db_batch_seconds": 5,  # Or after this many seconds, whichever comes first
+    "db_codec": "pickle",  # How new database values are packed, or "compact"
 }
 
 config_file = "youmirror.toml"  # This is the name for the config file to be used
@@ -1,3 +1,5 @@
+from __future__ import annotations  # pytube is only imported for type checking
+
 # Builtins
 from pathlib import (
     Path,
@@ -6,20 +8,38 @@ from datetime import datetime  # For marking dates
 import shutil  # For removing whole directories
 from copy import deepcopy  # For deep copying dictionaries
 import os  # For calculating directory sizes
+import time  # For retry timestamps
 import logging  # Logging
-from typing import Union  # For typing
+from concurrent.futures import ThreadPoolExecutor  # For checking files concurrently
+from collections import ChainMap  # For checking two path tables at once
+from contextlib import contextmanager  # For the database session
+import functools  # For wrapping commands in the database session
+from typing import TYPE_CHECKING, Union  # For typing
 
 # Youmirror stuff
-import youmirror.downloader as downloader  # Does the downloading
+from youmirror.importer import lazy  # Heavy modules wait until they're used
 import youmirror.configurer as configurer  # Manages the config file
 import youmirror.databaser as databaser  # Manages the database
 import youmirror.printer as printer  # Manages printing to the console
 import youmirror.filer as filer  # Manages the filetree
-import youmirror.tuber as tuber  # Manages pytube objects
+import youmirror.throttler as throttler  # Limits download bandwidth
+import youmirror.tracker as tracker  # Download progress and the sync summary
+import youmirror.cacher as cacher  # Metadata from earlier runs
+import youmirror.encoder as encoder  # Packs database values
+import youmirror.packer as packer  # Packs children into video ids
+from youmirror.coalescer import flights  # Shares fetches between workers
+
+downloader = lazy("youmirror.downloader")  # Does the downloading
+tuber = lazy("youmirror.tuber")  # Manages pytube objects
+retrier = lazy("youmirror.retrier")  # Decides when failed downloads are retried
+extractor = lazy("youmirror.extractor")  # Picks what reads youtube
+checker = lazy("youmirror.checker")  # Availability scans
+scheduler = lazy("youmirror.scheduler")  # Runs downloads concurrently
 
 # Pytube
-from pytube.helpers import safe_filename  # For making good paths & filenames
-from pytube import YouTube, Channel, Playlist  # Used for lots of stuff
+helpers = lazy("pytube.helpers")  # For making good paths & filenames
+if TYPE_CHECKING:
+    from pytube import YouTube, Channel, Playlist  # Used for lots of stuff
 
 """
 This is the core module
@@ -40,6 +60,20 @@ def get_files(entry: dict) -> dict:
         return None
 
 
+def databased(func):
+    """
+    Runs a YouMirror method with the database session open
+    Commands called from inside it share the same session
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.database():
+            return func(self, *args, **kwargs)
+
+    return wrapper
+
+
 # logging.basicConfig(level=logging.DEBUG)
 
 
@@ -63,9 +97,25 @@ class YouMirror:
             self.config_file
         )  # Full path for config file
         self.config: dict = dict()  # configs from file
-        self.cache: dict[str : Union[Playlist, Channel, YouTube]] = (
-            dict()
-        )  # This is used so we don't have to reinitialize pytube objects we've already made, because initializing them is slow
+        self.cache: cacher.ObjectCache = cacher.ObjectCache()  # This is used so we don't have to reinitialize pytube objects we've already made, because initializing them is slow
+        # It's bounded (see load_options) so a big mirror doesn't eat all the memory
+        self.db: databaser.Session = None  # One connection while a command runs
+
+    @contextmanager
+    def database(self):
+        """
+        Opens the database session, or hands back the one that's already open
+        The outermost command closes it, so add's sync and update's sync share it
+        """
+        if self.db is not None:
+            yield self.db
+            return
+        self.db = databaser.Session(self.db_path)
+        try:
+            yield self.db
+        finally:
+            self.db.close()
+            self.db = None
 
     def new(self) -> None:
         """
@@ -100,6 +150,8 @@ class YouMirror:
         else:
             print(f"Database '{db_path}' already exists")
 
+    @tracker.tracked
+    @databased
     def add(self, url: str, **kwargs) -> None:
         """
         Adds the url to the mirror and downloads the video(s)
@@ -171,9 +223,7 @@ class YouMirror:
         logging.info(f"Adding {url} to the mirror")
         self.config = configurer.set_yt(yt_string, url, self.config, specs)
 
-        paths_table = databaser.open_table(
-            self.db_path, "paths"
-        )  # Need this to resolve collisions (only checking paths)
+        paths_table = self.db["paths"]  # Need this to resolve collisions
 
         # Local dicts before committing to db
         url_to_add = dict()  # Wildcard url, could be channel, playlist or single
@@ -185,6 +235,8 @@ class YouMirror:
         keys = self.generate_keys(
             yt, dict(), active_options, paths_table
         )  # Get all the keys to add to the table
+        if "children" in keys:  # We just walked every one of them
+            keys["last_full_update"] = time.time()
         url_to_add[url] = keys  # Mark the url for adding
         paths_to_add.update({keys["path"]: {"parent": url}})  # Mark the path for adding
         logging.info(f"Adding {url} with keys {keys}")
@@ -208,10 +260,13 @@ class YouMirror:
                 "path": keys["path"],
             }  # passing in parent info
 
-            for child_url in children:
-                yt = self.get_pytube(child_url, self.cache)  # Get the pytube object
+            paths = ChainMap(paths_to_add, paths_table)  # Check both for collisions
+            resolved = self.resolve_children(children, active_options)
+            for child_url, yt, metadata in resolved:  # Same order as the children
+                if not metadata:  # Couldn't load it, already logged
+                    continue
                 child_keys = self.generate_keys(
-                    yt, parent_keys, active_options, paths_table
+                    yt, parent_keys, active_options, paths, metadata
                 )  # Get the keys for the db
                 name = child_keys["name"]  # Get the name of the pytube object
                 print(f"Adding '{name}'")
@@ -252,30 +307,16 @@ class YouMirror:
         # Update config file
         configurer.save_config(self.config_path, self.config)
 
-        # Save changes to database
-        if yt_string in ["channel", "playlist"]:  # If it's a channel or playlist
-            table = databaser.open_table(
-                self.db_path, yt_string
-            )  # Get the appropriate database
-            table[url] = keys  # Add it to the database
-            databaser.commit_table(table)  # Commit and close
-            databaser.close_table(table)
-        else:
-            singles_to_add[url] = keys  # Else, add it to the singles pile
-        singles_table = databaser.open_table(
-            self.db_path, "single"
-        )  # Where yt videos go
-        files_table = databaser.open_table(self.db_path, "files")  # Where files go
-
-        # Add local changes
-        files_table.update(files_to_add)  # Record the files in the database
-        paths_table.update(paths_to_add)  # Record the paths in the database
-        singles_table.update(singles_to_add)  # Record the singles in the database
-
-        # Commit changes and close
-        for table in [files_table, paths_table, singles_table]:
-            databaser.commit_table(table)
-            databaser.close_table(table)
+        # Save changes to database, all in one transaction
+        if yt_string not in ["channel", "playlist"]:
+            singles_to_add[url] = keys  # Singles go in the singles pile
+        self.save_indexes(singles_to_add)  # Keep any stream indexes we built
+        with self.db.transaction():
+            if yt_string in ["channel", "playlist"]:  # If it's a channel or playlist
+                self.db[yt_string][url] = keys  # It gets a row of its own
+            self.db["files"].update(files_to_add)  # Record the files
+            paths_table.update(paths_to_add)  # Record the paths
+            self.db["single"].update(singles_to_add)  # Record the singles
 
         # Check if downloading is skipped
         if kwargs.get("no_dl", False):
@@ -288,6 +329,7 @@ class YouMirror:
 
         print("Done!")
 
+    @databased
     def remove(self, url: str, **kwargs) -> None:
         """
         Removes the given url from the mirror and deletes the video(s)
@@ -295,45 +337,22 @@ class YouMirror:
 
         # Localize our paths so we don't have to type self a bunch of times
         config_path = self.config_path
-        db_path = self.db_path
         # Verify and load config
         print("Loading config...")
         if not self.verify_config():
             return
         self.load_config()
-        try:
-            if not (
-                yt_string := tuber.link_type(url)
-            ):  # Get the url type (channel, playlist, single)
-                return False
-            if not (id := tuber.link_id(url)):  # Get the id from the link
-                return False
-            if not (
-                yt := self.get_pytube(url, self.cache)
-            ):  # Get the proper pytube object
-                return False
-            if not (
-                url := tuber.get_url(yt)
-            ):  # Need to get url from pytube in case user passed a dirty one
-                return False
-            if not (name := tuber.get_name(yt)):
-                return False
-        except Exception as e:
-            logging.exception("Could not get info for url '%s' due to %s", url, e)
-            return False
-        # Check if the id is already in the config
-        if configurer.yt_exists(yt_string, url, self.config):
-            print(f"Removing {yt_string} '{name}'")
-        else:
+        # Find it in the mirror, this never goes online so private videos work too
+        if not (found := self.find_url(url)):
             print(f"{url} is not in the mirror")
             return
+        yt_string, url, entry = found  # The url the mirror knows it by
+        if not configurer.yt_exists(yt_string, url, self.config):
+            print(f"{url} is not in the mirror")  # Only tracked as a child
+            return
+        name = entry["name"]  # Get the name for pretty printing
+        print(f"Removing {yt_string} '{name}'")
 
-        # Get info from the db
-        table = databaser.open_table(
-            self.db_path, yt_string, autocommit=False
-        )  # Open database
-        entry = databaser.get_entry(url, table)  # Get the keys for the db entry
-        databaser.close_table(table)  # Close for now
         remove_path = entry["path"]  # Get the path
         remove_path = str(self.path / Path(remove_path))  # Add the root to the path
 
@@ -360,9 +379,7 @@ class YouMirror:
         paths_to_remove = set()  # Track stuff to remove
         files_to_remove = set()
         singles_to_remove = set()
-        singles_table = databaser.open_table(
-            db_path, "single", autocommit=True
-        )  # Open singles table
+        singles_table = self.db["single"]  # Open singles table
 
         paths_to_remove.add(remove_path)  # Mark the path for removal
         if files := get_files(entry):  # Mark any files for removal
@@ -373,40 +390,29 @@ class YouMirror:
         else:
             singles_to_remove.add(url)  # Else, mark it for removal
 
-        for single in singles_to_remove:
-            entry = databaser.get_entry(single, singles_table)
-            path = entry["path"]
-            paths_to_remove.add(path)
-            files = entry["files"]
-            files_to_remove.update(files)
+        files_table = self.db["files"]  # Get the files table
+        singles = databaser.get_many(singles_to_remove, singles_table)  # All at once
+        paths_to_remove.update(entry["path"] for entry in singles.values())
+        files = files_table.find_in("parent", singles_to_remove)  # Point back at them
+        files_to_remove.update(files)
 
         print(f"removing {len(singles_to_remove)} singles")
         print(f"removing {len(paths_to_remove)} paths")
         print(f"removing {len(files_to_remove)} files")
 
         print("Saving changes...", end="")
-        # Open databases
-        db_path = self.db_path
-        files_table = databaser.open_table(
-            db_path, "files", autocommit=True
-        )  # Get the files table
-        paths_table = databaser.open_table(
-            db_path, "paths", autocommit=True
-        )  # Get the paths table
-
-        # Make changes to the database
-        if (
-            yt_string != "single"
-        ):  # If it's a channel or playlist, make sure to remove from its table
-            table = databaser.open_table(db_path, yt_string, autocommit=True)
-            databaser.remove_entry(url, table)
-
-        for path in paths_to_remove:  # Remove paths
-            databaser.remove_entry(path, paths_table)
-        for file in files_to_remove:  # Remove files
-            databaser.remove_entry(file, files_table)
-        for single in singles_to_remove:  # Remove singles
-            databaser.remove_entry(single, singles_table)
+        paths_table = self.db["paths"]  # Get the paths table
+
+        # Make changes to the database, all in one transaction
+        with self.db.transaction():
+            if yt_string != "single":  # A channel or playlist has its own row too
+                databaser.remove_entry(url, self.db[yt_string])
+            for path in paths_to_remove:  # Remove paths
+                databaser.remove_entry(path, paths_table)
+            for file in files_to_remove:  # Remove files
+                databaser.remove_entry(file, files_table)
+            for single in singles_to_remove:  # Remove singles
+                databaser.remove_entry(single, singles_table)
 
         # Update config file
         self.config = configurer.remove_yt(
@@ -416,14 +422,13 @@ class YouMirror:
 
         print("Done!")
 
+    @tracker.tracked
+    @databased
     def sync(self, url: str = None, **kwargs: dict) -> None:
         """
         Syncs the mirror against the database
         """
 
-        # Localize our paths so we don't have to type self a bunch of times
-        db_path = self.db_path
-
         # Load the config
         if not self.verify_config():
             return
@@ -433,80 +438,94 @@ class YouMirror:
         active_options = self.load_options(**kwargs)
 
         # Open databases
-        files_table = databaser.open_table(db_path, "files")  # Get the files table
-        singles_table = databaser.open_table(db_path, "single")  # Get the singles table
+        files_table = self.db["files"]  # Get the files table
+        singles_table = self.db["single"]  # Get the singles table
 
         if url:  # If a url is specified, just sync that
-            # Get some url info and verify it
-            if not (yt_string := tuber.link_type(url)):  # Get the type of link
-                return False
-            if not (yt := self.get_pytube(url, self.cache)):  # Get the yt object
-                return False
-            if not (url := tuber.get_url(yt)):  # Sanitize the url
-                return False
-            if not configurer.yt_exists(
-                yt_string, url, self.config
+            # Find it in the mirror, this never goes online
+            if not (found := self.find_url(url)) or not configurer.yt_exists(
+                found[0], found[1], self.config
             ):  # Verify url is in the mirror
                 logging.error("Could not find url %s in the mirror", url)
                 return False
+            yt_string, url, entry = found  # The url the mirror knows it by
             if kwargs.get("update"):  # Update if specified
                 self.update(url=url, **kwargs)
-            name = tuber.get_name(yt)  # Get name for pretty printing
+            name = entry["name"]  # Get name for pretty printing
 
             print(f"Syncing with {yt_string} '{name}'")
 
-            files_to_sync = dict()
-
-            # Gather files for downloading
-            if yt_string in ["channel", "playlist"]:  # Handling a channel or playlist
-                table = databaser.open_table(db_path, yt_string)  # Open a table
-                entry = databaser.get_entry(url, table)  # Get the entry
-                children = entry["children"]  # Get the children from the db
-                for child_url in children:
-                    files = singles_table[child_url]["files"]  # Get the children files
-                    for filepath in files:  # Get the files from the files table
-                        info = files_table[filepath]  # File dictionary
-                        if not info["downloaded"]:  # If not downloaded
-                            files_to_sync[filepath] = info  # Mark for syncing
-
-            elif yt_string == "single":  # Handling a single
-                files = singles_table[url]["files"]  # Get the files from the db
-                for filepath in files:  # Get the files from the files table
-                    info = files_table[filepath]  # File dictionary
-                    if not info["downloaded"]:  # If not downloaded
-                        files_to_sync[filepath] = info  # Mark for syncing
+            # Gather files for downloading, one query for all of a channel's files
+            # Ones that failed recently are left alone until it's time, unless --retry
+            now = None if kwargs.get("retry") else time.time()
+            files_to_sync = databaser.pending_files(files_table, url, yt_string, now)
+            skipped = (  # How many of this sync's files are cooling down
+                databaser.cooling_files(files_table, url, yt_string, now) if now else 0
+            )
 
             # Update options for this url
             active_options.update(configurer.get_yt(yt_string, url, self.config))
 
             # Download the files
             print(f"Syncing {len(files_to_sync)} files")
-            for filepath in files_to_sync:
-                file = files_to_sync[filepath]  # Get the file info
-                filename = str(
-                    Path(filepath).name
-                )  # Get just the filename for pretty printing
-                parent = file["parent"]  # Get the parent url
-                file_type = file["type"]  # Get the file type "video", "audio", etc.
-                yt = self.get_pytube(parent, self.cache)  # Get the pytube object
-                print(f"Downloading {file_type} {filepath}")
-                if (
-                    file["type"] == "caption"
-                ):  # If it's a caption record the language to use
-                    active_options["language"] = file["language"]
-                filepath = str(
-                    self.path / Path(filepath)
-                )  # Add the root to the filepath
-                if specs := downloader.download_single(
-                    yt, file_type, filepath, active_options
-                ):
-                    file.update(specs)  # Update the file info with the specs
-                    files_table.update(
-                        {filepath: file}
-                    )  # Save the file info to the database
-                    files_table.commit()  # Commit the changes to the database
+            if skipped:
+                print(f"Skipping {skipped} failed files until they're due a retry")
+
+            def resolve(url: str) -> YouTube:
+                """
+                Gets the pytube object and hands it the stream index we saved for it
+                It stays checked out of the cache until sync is done with it
+                """
+                self.cache.checkout(url)  # Before it's made, so it's never shrunk
+                if not (yt := self.get_pytube(url, self.cache)):
+                    return None
+                downloader.load_index(yt, singles_table[url].get("streams"))
+                yt.register_on_progress_callback(tracker.metrics.on_progress)
+                yt.register_on_complete_callback(tracker.metrics.on_complete)
+                return yt
+
+            batch = databaser.Batcher(  # Group commits, not one per file
+                files_table,
+                size=active_options["db_batch_files"],
+                seconds=active_options["db_batch_seconds"],
+            )
+
+            def record(filepath: str, file: dict) -> None:
+                """
+                Saves a file to the database, only the writer thread calls this
+                Failed files go on cooldown so the next syncs leave them alone
+                """
+                if file["downloaded"]:
+                    retrier.clear(file)  # Forget about any old failures
                 else:
-                    print(f"Could not download {file_type} {filename}")
+                    retrier.record(file)  # Count the attempt and pick a retry time
+                batch[filepath] = file  # Same relative path sync reads it from
+
+            throttler.configure(active_options)  # Set up the bandwidth limit
+            try:
+                with scheduler.Scheduler(
+                    self.path,
+                    resolve=resolve,
+                    record=record,
+                    jobs=active_options["jobs"],
+                    per_host=active_options["jobs_per_host"],
+                    flush=batch.flush,
+                    flush_seconds=min(1, active_options["db_batch_seconds"]),
+                ) as running:
+                    for filepath in files_to_sync:
+                        file = files_to_sync[filepath]  # Get the file info
+                        options = dict(active_options)  # Each download gets its own
+                        if (
+                            file["type"] == "caption"
+                        ):  # If it's a caption record the language to use
+                            options["language"] = file["language"]
+                        running.submit(filepath, file, options)
+            finally:  # Hand the checkouts back even if sync was cut short
+                for parent in {file["parent"] for file in files_to_sync.values()}:
+                    self.cache.shrink(parent)  # Done with its streams
+            tracker.metrics.note("object_cache", self.cache.stats())
+            tracker.metrics.note("single_flight", flights.stats())
+            tracker.metrics.note("database", batch.stats())
 
             print(f"Synced with '{name}'!")
             return
@@ -525,14 +544,12 @@ class YouMirror:
         print("All done!")
         return
 
+    @databased
     def update(self, url: str = None, **kwargs: dict) -> None:
         """
         Updates the database without downloading anything
         """
 
-        # Localize our paths so we don't have to type self a bunch of times
-        db_path = self.db_path
-
         # Verify and load config and load options
         if not self.verify_config():
             return
@@ -547,10 +564,6 @@ class YouMirror:
                 return False
             if tuber.link_type(url) == "single":  # Singles dont get updated
                 return False
-            if not (
-                new_children := set(tuber.get_children(yt))
-            ):  # Get the children urls
-                return False
             if not (yt_string := tuber.link_type(url)):  # Get the type of link
                 return False
             name = tuber.get_name(yt)  # Get the name for pretty printing
@@ -560,18 +573,26 @@ class YouMirror:
             )  # Load the settings for this yt
 
             # Calculate new children
-            table = databaser.open_table(
-                db_path, yt_string
-            )  # Open the appropriate table
+            table = self.db[yt_string]  # Open the appropriate table
             entry = databaser.get_entry(url, table)  # Get the entry from the table
-            old_children = set(entry["children"])  # Get the children from the entry
-            difference = new_children.difference(
-                old_children
-            )  # Get the difference between the two sets
+            old_children = packer.pack(entry["children"])  # `in` is a binary search
+            if full := self.needs_full_update(yt_string, entry, active_options, kwargs):
+                children = tuber.get_children(yt)  # Walk every page
+            else:  # Only walk until we're back among videos we know
+                children = tuber.get_new_children(
+                    yt, old_children, active_options["update_stop_after"]
+                )
+            if children is None:  # Couldn't get the children
+                return False
+            difference = [
+                child for child in children if child not in old_children
+            ]  # The new children, in the order youtube lists them
             print(f"Found {len(difference)} new items for {yt_string} {name}")
-            entry["children"] = new_children.union(
-                old_children
+            entry["children"] = old_children.union(
+                difference
             )  # Update the entry with the new children
+            if full:
+                entry["last_full_update"] = time.time()  # Next one is due from here
 
             # Record parent's info
             parent_keys = {
@@ -585,15 +606,16 @@ class YouMirror:
             singles_to_add = dict()
             files_to_add = dict()
             paths_to_add = dict()
-            paths_table = databaser.open_table(
-                db_path, "paths"
-            )  # Open the paths table (to resolve collisions)
+            paths_table = self.db["paths"]  # Open the paths table (for collisions)
 
             # Calculate info for the new singles
-            for child_url in difference:
-                yt = self.get_pytube(child_url, self.cache)  # Get the pytube object
+            paths = ChainMap(paths_to_add, paths_table)  # Check both for collisions
+            resolved = self.resolve_children(difference, active_options)
+            for child_url, yt, metadata in resolved:  # Same order as the children
+                if not metadata:  # Couldn't load it, already logged
+                    continue
                 child_keys = self.generate_keys(
-                    yt, parent_keys, active_options, paths_table
+                    yt, parent_keys, active_options, paths, metadata
                 )  # Get the keys for the db
                 name = child_keys["name"]  # Get the name of the pytube object
                 print(f"Adding '{name}'")
@@ -610,22 +632,12 @@ class YouMirror:
                     {new_path: {"parent": child_url}}
                 )  # Mark it for adding
 
-            # Open tables
-            singles_table = databaser.open_table(
-                self.db_path, "single"
-            )  # Where yt videos go
-            files_table = databaser.open_table(self.db_path, "files")  # Where files go
-
-            # Add local changes
-            databaser.set_entry(url, entry, table)  # Add the new children
-            files_table.update(files_to_add)  # Record the files in the database
-            paths_table.update(paths_to_add)  # Record the paths in the database
-            singles_table.update(singles_to_add)  # Record the singles in the database
-
-            # Commit changes and close
-            for t in [table, files_table, paths_table, singles_table]:
-                databaser.commit_table(t)
-                databaser.close_table(t)
+            # Add local changes, all in one transaction
+            with self.db.transaction():
+                databaser.set_entry(url, entry, table)  # Add the new children
+                self.db["files"].update(files_to_add)  # Record the files
+                paths_table.update(paths_to_add)  # Record the paths
+                self.db["single"].update(singles_to_add)  # Record the singles
 
             print(f"Updated '{name}'!")
             return
@@ -646,6 +658,83 @@ class YouMirror:
         print("All set!")
         return
 
+    def invalidate(self, url: str = None, fields: list[str] = None) -> None:
+        """
+        Clears the metadata cache for the url, or for everything if no url is given
+        """
+        if not self.verify_config():
+            return
+        self.load_config()
+        if not self.load_options():  # Opens the cache
+            return
+        key = None  # Everything
+        if url:
+            if not (yt := tuber.new_pytube(url)) or not (key := tuber.get_id(yt)):
+                print(f"Invalid url '{url}'")
+                return False
+        if invalid := set(fields or []) - set(cacher.ttl_options):
+            print(f"Unknown fields {', '.join(sorted(invalid))}")
+            return False
+        changed = cacher.cache.invalidate(key, fields)
+        print(f"Cleared {changed} cached entries")
+
+    @databased
+    def check(self, **kwargs) -> None:
+        """
+        Checks every video in the mirror to see if it's still on youtube
+        Records available, last_checked and unavailable_reason on each single and
+        reports the ones that went private or were removed since the last check
+        """
+        if not self.verify_config():
+            return
+        self.load_config()
+        if not (active_options := self.load_options(**kwargs)):
+            return
+        singles_table = self.db["single"]
+        batch = databaser.Batcher(singles_table, size=500, seconds=60)  # Group commits
+        urls = list(singles_table.keys())  # Just the keys, entries load as we go
+        print(f"Checking {len(urls)} videos")
+        scan = checker.Checker(
+            active_options["check_jobs"], active_options["check_rate"]
+        )
+
+        went_away = list()  # Videos that were up last time and aren't now
+        counts = {"available": 0, "unavailable": 0, "unknown": 0}
+        for done, (url, result) in enumerate(scan.run(urls), start=1):
+            if result["available"] is None:  # Couldn't tell, leave it as it was
+                counts["unknown"] += 1
+                logging.info(f"Could not check {url} ({result['reason']})")
+                continue
+            entry = singles_table[url]
+            was_available = entry.get("available", True)
+            entry["available"] = result["available"]
+            entry["last_checked"] = result["last_checked"]
+            entry["unavailable_reason"] = result["reason"]
+            batch[url] = entry  # Only this thread writes
+            if result["available"]:
+                counts["available"] += 1
+            else:
+                counts["unavailable"] += 1
+                if was_available:
+                    went_away.append(
+                        {"url": url, "name": entry["name"], "reason": result["reason"]}
+                    )
+            if done % 500 == 0:
+                print(f"Checked {done} of {len(urls)}")
+        batch.flush()
+
+        print(
+            f"{counts['available']} available, {counts['unavailable']} unavailable, "
+            f"{counts['unknown']} could not be checked"
+        )
+        if went_away:
+            print(f"{len(went_away)} videos went away since the last check:")
+            print("REASON --- NAME --- URL")
+            print("-" * 30)
+            for video in went_away:
+                print(f"{video['reason']} - {video['name']} - {video['url']}")
+            checker.write_report(self.path / "youmirror.check.json", went_away)
+
     def verify(self) -> None:
         """
         Verifies the integrity of the mirror (compare database to config? Walk down or walk up?)
@@ -717,32 +806,46 @@ class YouMirror:
         Returns a new pytube object or one from the cache
         """
         try:
-            if url in cache:  # If the url is already cached, return its object
-                return cache[url]
-            else:
-                pytube = tuber.new_pytube(url)  # Get new pytube object
-                cache[url] = pytube  # Cache it
+            if (pytube := cache.get(url)) is not None:  # Already cached
                 return pytube
+            else:
+                return flights.do(
+                    ("object", url), lambda: self.new_pytube(url, cache)
+                )  # Workers after the same video wait for one object
         except Exception as e:
-            logging.exception("Could not get pytube object for %s due to", url, e)
+            logging.exception("Could not get pytube object for %s due to %s", url, e)
             return None
 
+    def new_pytube(self, url: str, cache: dict):
+        """
+        Makes the pytube object and caches it, one worker at a time per url
+        """
+        if url in cache:  # Landed just before we took off
+            return cache[url]
+        pytube = tuber.new_pytube(url)  # Get new pytube object
+        if pytube is not None:
+            cache[url] = pytube  # Cache it
+        return pytube
+
     def generate_keys(
         self,
         yt: Union[Channel, Playlist, YouTube],
         keys: dict,
         options: dict,
         paths: dict,
+        metadata: dict = None,
     ) -> dict:
         """
         Generates the keys that we want to put into the database and returns as a dictionary.
         You can pass in a dict if you want to inject some values from above
+        Pass in the metadata too if it was already fetched (see resolve_children)
         """
         keys = deepcopy(
             keys
         )  # Make a copy of the injected keys so they don't get altered
         yt_string = tuber.yt_to_type_string(yt)  # Get the type as a string
-        metadata = tuber.get_metadata(yt)  # Strip the useful data off the pytube object
+        if metadata is None:
+            metadata = tuber.get_metadata(yt)  # Strip the useful data off the object
         keys.update(metadata)  # Add to our keys
         yt_id = tuber.get_id(yt)  # We use this to resolve collisions
 
@@ -775,7 +878,7 @@ class YouMirror:
                 temp = filer.calculate_path(yt_string, "", keys["name"])
                 keys["path"] = filer.resolve_collision(temp, paths, yt_id)
             else:  # Take the path and add the name
-                name = safe_filename(keys["name"]).replace(" ", "_")
+                name = helpers.safe_filename(keys["name"]).replace(" ", "_")
                 temp = str(Path(keys["path"]) / Path(name))
                 keys["path"] = filer.resolve_collision(temp, paths, yt_id)
 
@@ -787,6 +890,61 @@ class YouMirror:
             logging.error(f"Failed to get keys for {yt_string} {yt}")
             return None
 
+    @databased
+    def find_url(self, url: str) -> tuple:
+        """
+        Looks the url up in the database without going online
+        Returns (type, the url the mirror stores it under, its entry) or None
+        """
+        if not (yt_string := tuber.link_type(url)):  # Get the type of link
+            return None
+        if not (canonical := tuber.canonical_url(url, yt_string)):
+            return None
+        table = self.db[yt_string]
+        for key in (url, canonical):
+            if key in table:
+                return yt_string, key, table[key]
+        if yt_string == "channel":  # Stored under its vanity url, match the id
+            uri = tuber.link_id(url, yt_string)
+            for key, entry in table.find(id=uri).items():
+                return yt_string, key, entry
+        return None
+
+    def needs_full_update(
+        self, yt_string: str, entry: dict, options: dict, kwargs: dict
+    ) -> bool:
+        """
+        Decides whether update walks every video or stops once it reaches known ones
+        Only channels list their newest videos first, so playlists always get a
+        full walk. Channels get one when asked, or every full_update_days
+        """
+        if yt_string != "channel" or kwargs.get("full"):
+            return True
+        if options["update_stop_after"] <= 0:  # Incremental updates are off
+            return True
+        if not (days := options["full_update_days"]):  # Never reconcile on a timer
+            return False
+        last = entry.get("last_full_update", 0)  # Entries from before never had one
+        return time.time() - last > days * 86400
+
+    def resolve_children(self, urls: list[str], options: dict) -> list[tuple]:
+        """
+        Gets the pytube object and metadata for every child concurrently
+        Returns (url, yt, metadata) in the same order as the urls, so paths are
+        handed out in the same order no matter which child loaded first
+        """
+
+        def resolve(url: str) -> tuple:
+            try:
+                yt = self.get_pytube(url, self.cache)  # Get the pytube object
+                return url, yt, tuber.get_metadata(yt)  # Makes the network calls
+            except Exception as e:
+                logging.exception(f"Could not load {url} due to {e}")
+                return url, None, None
+
+        with ThreadPoolExecutor(max_workers=options["jobs"]) as pool:
+            return list(pool.map(resolve, urls))
+
     def init_files(self, files: dict, url: str, options: dict) -> dict:
         """
         Takes files and fills in some default values
@@ -798,12 +956,23 @@ class YouMirror:
             logging.debug((f"Updating file {filepath} with keys {file}"))
         return files
 
+    def save_indexes(self, singles: dict) -> None:
+        """
+        Saves the stream indexes we've built into the singles' database entries
+        """
+        for url in singles:
+            yt = self.cache.peek(url)  # Only videos we've already looked at
+            if index := getattr(yt, "stream_index", None):
+                singles[url]["streams"] = index.to_dict()
+
     def calculate_download_size(self, files: dict, options: dict) -> int:
         """
         Calculates the total size of the files to be downloaded
+        Files are checked concurrently and anything that already knows its
+        filesize is skipped. The sizes are recorded in the files so they get saved
         """
-        download_size = 0
-        for filepath in files:
+
+        def calculate(filepath: str) -> int:
             file = files[filepath]  # Get the file info
             parent = file["parent"]  # Get the parent url
             yt = self.get_pytube(parent, self.cache)  # Get the pytube object
@@ -813,8 +982,12 @@ class YouMirror:
                 yt, file_type, options
             )  # Get the filesize
             file["filesize"] = filesize  # Record the filesize while we're here
-            download_size += filesize  # Add the filesize to the total download size
-        return download_size
+            return filesize
+
+        known = sum(files[f]["filesize"] for f in files if "filesize" in files[f])
+        unknown = [f for f in files if "filesize" not in files[f]]
+        with ThreadPoolExecutor(max_workers=options["jobs"]) as pool:
+            return known + sum(pool.map(calculate, unknown))
 
     def calculate_path_size(self, path):
         """
@@ -867,6 +1040,12 @@ class YouMirror:
         active_options["has_ffmpeg"] = (
             shutil.which("ffmpeg") is not None
         )  # Record whether they have ffmpeg
+        cacher.configure(self.path, active_options)  # Open the metadata cache
+        extractor.configure(active_options)  # pytube or yt-dlp
+        encoder.configure(active_options)  # How new database values are packed
+        self.cache.resize(
+            active_options["cache_max_objects"], active_options["cache_max_bytes"]
+        )  # Bound the pytube objects we keep around
         if active_options["resolution"] not in downloader.resolutions:
             logging.error(
                 f"Invalid resolution '{active_options['resolution']}', valid resolutions = {downloader.resolutions}"
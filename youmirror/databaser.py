@@ -5,37 +5,34 @@ I've realized that the database is the most important thing in this whole projec
 With the database, you should be able to rebuild the whole filetree.
 This means it should contain data from both the config file and filetree
 ----
-db
+db (sqlite, every table has typed columns and an `extra` column for anything else)
 | -- channels
         | -- url        primary key
         | -- id:        extracted from url
+        | -- name:      name of the channel
         | -- children:  urls (primary key for singles)
-        | -- config:    options dict from config (examples: "resolution" "locked")
         | -- path:      path "channels/channel_name"
+        | -- last_full_update: when update last walked every video
 
 | -- playlists
         | -- url        primary key
         | -- id:        extracted from url
+        | -- name:      title of the playlist
         | -- children:  url (primary key for singles)
-        | -- config:    options dict from config (examples: "resolution" "locked")
         | -- path:      path "playlists/playlist_name"
 | -- singles
-        | -- url:       url for the single
-        | -- id:        primary key
-        | -- type:      ("channel", "playlist" or "single")
+        | -- url:       primary key
+        | -- id:        video id
         | -- parent:    url for parent (primary key for either a channel or playlist or none)
         | -- parent_name: name of the parent
-        | -- config:    options dict from config (this will match whatever the parent has if there is one)
-        | -- files
-                | --    filepath:        primary key
-                            | -- type:          "video", "audio", "caption", "thumbnail"
-                            | -- caption_type:  "en", "a.en"            # TODO this should probably be language
-                            | -- resolution:    "480p", "720p", "1080p" Just for videos
+        | -- parent_type: ("channel", "playlist" or "single")
+        | -- path:      path "channels/channel_name/single_name"
+        | -- available, last_checked, unavailable_reason: what `youmirror check` found
+        | -- streams:   the stream index, so sync doesn't have to scan the streams again
 | --- paths
-        | -- name:      path name "singles/single_name/", "channels/channel_name"
+        | -- path:      primary key, "singles/single_name/", "channels/channel_name"
         | -- parent     url of parent channel or playlist or single
-        | -- size:      total size of files inside
-| --- files:            dictionary that tracks all the files we have
+| --- files:            every file we have or want
         | -- filepath:  primary key, Ex: "singles/single_name/single_name.mp4"
         | -- parent:    url of parent single
         | -- type:      file type: "video", "audio", "caption", "thumbnail"
@@ -43,33 +40,522 @@ db
         | -- resolution:"1080p", "720p" etc
         | -- bitrate    Audio bitrate
         | -- downloaded: True/False
-        | -- size:      file size
+        | -- filesize:  file size
+        | -- failure:   why the last attempt failed: "transient", "throttled", "unavailable", "extractor"
+        | -- attempts:  how many times in a row it has failed
+        | -- retry_after: timestamp before which sync won't try it again
+        | -- error:     the error from the last attempt
+
+files(parent, downloaded), files(downloaded) and singles(parent) are indexed, so
+the files sync needs for a channel, leaving out the ones whose retry_after hasn't
+come yet, are one query instead of reading every child and every file. A single's files are the files whose parent it is.
+----
+Rows go in and come out as dicts, so the rest of youmirror uses a table like the
+dict sqlitedict used to give us. Keys with a column go in it, anything else is
+packed into `extra`, and columns that are NULL are left out of the dict.
+BLOB columns and `extra` are packed by encoder, which reads either codec.
+Mirrors from before this schema kept every table as pickled sqlitedict rows,
+they're moved over the first time the database is opened (see migrate)
+
+A command opens one Session and gets every table from it, so they all share one
+connection and can be written together in session.transaction().
+open_table still opens a table on its own connection for anything standalone.
+
+The database runs in WAL mode, so `show` or `check` can read it while a sync is
+writing. sync saves finished files through a Batcher, which commits them in
+groups rather than paying for a transaction per thumbnail or caption.
 
 I need to abstract the database management as much as possible so it's easy to swap out.
-If a better databasing system comes along I will use that instead, but for now sqlitedict is fine.
 """
 
-from copy import deepcopy
-from sqlitedict import SqliteDict
+from __future__ import annotations
+
 import logging
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
+
+import youmirror.encoder as encoder  # Packs the BLOB columns
+import youmirror.packer as packer  # Packs children into video ids
 
 db_file = "youmirror.db"
-valid_tables = {"channel", "playlist", "single", "paths", "files"}
+schema_version = 1  # PRAGMA user_version of a database that's up to date
+entry_columns = {"id": "TEXT", "name": "TEXT", "path": "TEXT"}
+tables = {  # Table name: (sql table, key column, columns and their types)
+    "channel": (
+        "channels",
+        "url",
+        {**entry_columns, "children": "BLOB", "last_full_update": "REAL"},
+    ),
+    "playlist": (
+        "playlists",
+        "url",
+        {**entry_columns, "children": "BLOB", "last_full_update": "REAL"},
+    ),
+    "single": (
+        "singles",
+        "url",
+        {
+            **entry_columns,
+            "parent": "TEXT",
+            "parent_name": "TEXT",
+            "parent_type": "TEXT",
+            "available": "BOOLEAN",
+            "last_checked": "REAL",
+            "unavailable_reason": "TEXT",
+            "streams": "BLOB",
+        },
+    ),
+    "paths": ("paths", "path", {"parent": "TEXT"}),
+    "files": (
+        "files",
+        "filepath",
+        {
+            "parent": "TEXT",
+            "type": "TEXT",
+            "language": "TEXT",
+            "resolution": "TEXT",
+            "bitrate": "TEXT",
+            "filesize": "INTEGER",
+            "length": "INTEGER",
+            "downloaded": "BOOLEAN",
+            "failure": "TEXT",
+            "attempts": "INTEGER",
+            "retry_after": "REAL",
+            "error": "TEXT",
+        },
+    ),
+}
+valid_tables = set(tables)
+chunk_size = 500  # Keys per `IN (...)`, well under sqlite's variable limit
+derived_keys = {"single": {"files"}}  # Kept elsewhere, so not saved with the row
+packed_columns = {"children"}  # Saved as packed video ids, not through encoder
+indexes = {  # Index name: what it covers
+    "files_parent": "files(parent, downloaded)",  # Also answers parent on its own
+    "files_downloaded": "files(downloaded)",
+    "singles_parent": "singles(parent)",
+}
+journal_mode = "WAL"  # Readers never block on the writer, or it on them
+synchronous = "NORMAL"  # Safe with WAL, a crash can only lose the last commits
+sqlitedict_tables = {  # Table names from before the schema: where they went
+    "channel": "channel",
+    "playlist": "playlist",
+    "single": "single",
+    "paths": "paths",
+    "files": "files",
+    "cooldown": None,  # retry_after lives on the files now
+}
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """
+    Opens the database, creating the tables (or moving old ones over) if needed
+    """
+    connection = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute(f"PRAGMA journal_mode = {journal_mode}")  # Readers don't wait
+    connection.execute(f"PRAGMA synchronous = {synchronous}")  # fsync at checkpoints
+    if connection.execute("PRAGMA user_version").fetchone()[0] < schema_version:
+        with connection:  # All or nothing
+            connection.execute("BEGIN IMMEDIATE")  # Keep other processes out
+            if connection.execute("PRAGMA user_version").fetchone()[0] < schema_version:
+                migrate(connection)
+    return connection
+
+
+def create_schema(connection: sqlite3.Connection) -> None:
+    """
+    Creates the tables and indexes, the caller owns the transaction
+    """
+    for sql_table, key, columns in tables.values():
+        definitions = ", ".join(f"{name} {kind}" for name, kind in columns.items())
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {sql_table} "
+            f"({key} TEXT PRIMARY KEY, {definitions}, extra BLOB)"
+        )
+    for name, covers in indexes.items():
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {covers}")
+    connection.execute(f"PRAGMA user_version = {schema_version}")
+
+
+def old_tables(connection: sqlite3.Connection) -> list[str]:
+    """
+    Returns the sqlitedict tables in the database, they're all (key, value)
+    """
+    names = [
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+        )
+    ]
+    return [
+        name
+        for name in names
+        if name in sqlitedict_tables
+        and {row[1] for row in connection.execute(f'PRAGMA table_info("{name}")')}
+        == {"key", "value"}
+    ]
+
+
+def migrate(connection: sqlite3.Connection) -> int:
+    """
+    Moves the rows of a database from before the schema into their tables
+    One shot, in the caller's transaction, so it either all happens or none of it
+    Returns how many rows were moved
+    """
+    old = old_tables(connection)
+    for name in old:  # Out of the way of the new tables, some names are the same
+        connection.execute(f'ALTER TABLE "{name}" RENAME TO "sqlitedict_{name}"')
+    create_schema(connection)
+    moved = 0
+    for name in old:
+        if target := sqlitedict_tables[name]:
+            table = Table(connection, target, autocommit=False)
+            rows = connection.execute(f'SELECT key, value FROM "sqlitedict_{name}"')
+            table.update({key: pickle.loads(bytes(value)) for key, value in rows})
+            moved += len(table)
+        connection.execute(f'DROP TABLE "sqlitedict_{name}"')
+    if old:
+        logging.info(f"Moved {moved} rows from {len(old)} sqlitedict tables")
+        print(f"Upgraded the database to the new schema ({moved} rows)")
+    return moved
+
+
+class Table:
+    """
+    One of the database's tables, used like a dict of entries
+    """
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        table_name: str,
+        autocommit: bool = True,
+        session: Session = None,
+    ) -> None:
+        self.connection = connection
+        self.tablename: str = table_name
+        self.sql_table, self.key, self.columns = tables[table_name]
+        self.skip: set = derived_keys.get(table_name, set())  # Never saved
+        self.autocommit: bool = autocommit  # Commit after every change
+        self.session: Session = session  # Holds commits back during its transactions
+        # The writer thread shares the connection, and so do the session's tables
+        self.lock = session.lock if session else threading.RLock()
+        names = ", ".join([self.key, *self.columns, "extra"])
+        marks = ", ".join("?" * (len(self.columns) + 2))
+        self.insert = (
+            f"INSERT OR REPLACE INTO {self.sql_table} ({names}) VALUES ({marks})"
+        )
+
+    def encode(self, key: str, entry: dict) -> tuple:
+        """
+        Turns an entry into the values for a row
+        """
+        values = [key]
+        for name, kind in self.columns.items():
+            value = entry.get(name)
+            if value is not None and name in packed_columns:
+                value = pack_children(value)
+            elif value is not None and kind == "BLOB":
+                value = encoder.encode(value)
+            elif value is not None and kind == "BOOLEAN":
+                value = int(bool(value))
+            values.append(value)
+        extra = {
+            k: v
+            for k, v in entry.items()
+            if k not in self.columns and k not in self.skip
+        }
+        values.append(encoder.encode(extra) if extra else None)
+        return tuple(values)
+
+    def decode(self, row: sqlite3.Row) -> dict:
+        """
+        Turns a row back into the entry it was made from
+        """
+        entry = dict()
+        for name, kind in self.columns.items():
+            if (value := row[name]) is None:
+                continue
+            if name in packed_columns:
+                value = unpack_children(value)
+            elif kind == "BLOB":
+                value = encoder.decode(value)
+            elif kind == "BOOLEAN":
+                value = bool(value)
+            entry[name] = value
+        if row["extra"] is not None:
+            entry.update(encoder.decode(row["extra"]))
+        return entry
+
+    def _changed(self) -> None:
+        if self.autocommit and not (self.session and self.session.depth):
+            self.connection.commit()
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            query = f"SELECT 1 FROM {self.sql_table} WHERE {self.key} = ?"
+            return self.connection.execute(query, (key,)).fetchone() is not None
+
+    def __getitem__(self, key: str) -> dict:
+        if (entry := self.get(key)) is None:
+            raise KeyError(key)
+        return entry
+
+    def __setitem__(self, key: str, entry: dict) -> None:
+        with self.lock:
+            self.connection.execute(self.insert, self.encode(key, entry))
+            self._changed()
+
+    def __delitem__(self, key: str) -> None:
+        with self.lock:
+            query = f"DELETE FROM {self.sql_table} WHERE {self.key} = ?"
+            if not self.connection.execute(query, (key,)).rowcount:
+                raise KeyError(key)
+            self._changed()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        with self.lock:
+            query = f"SELECT COUNT(*) FROM {self.sql_table}"
+            return self.connection.execute(query).fetchone()[0]
+
+    def get(self, key: str, default=None) -> dict:
+        with self.lock:
+            query = f"SELECT * FROM {self.sql_table} WHERE {self.key} = ?"
+            row = self.connection.execute(query, (key,)).fetchone()
+        return default if row is None else self.decode(row)
+
+    def keys(self) -> list[str]:
+        with self.lock:
+            query = f"SELECT {self.key} FROM {self.sql_table}"
+            return [row[0] for row in self.connection.execute(query)]
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        with self.lock:
+            rows = self.connection.execute(f"SELECT * FROM {self.sql_table}").fetchall()
+        return ((row[self.key], self.decode(row)) for row in rows)
+
+    def update(self, entries: dict) -> None:
+        """
+        Writes all the entries at once
+        """
+        with self.lock:
+            self.connection.executemany(
+                self.insert, (self.encode(k, v) for k, v in entries.items())
+            )
+            self._changed()
+
+    def find(self, **where) -> dict[str, dict]:
+        """
+        Returns the entries whose columns match, like find(parent=url)
+        """
+        if unknown := set(where) - set(self.columns):
+            raise KeyError(f"No columns {unknown} in table {self.tablename}")
+        condition = " AND ".join(f"{name} = ?" for name in where)
+        query = f"SELECT * FROM {self.sql_table} WHERE {condition}"
+        with self.lock:
+            rows = self.connection.execute(query, tuple(where.values())).fetchall()
+        return {row[self.key]: self.decode(row) for row in rows}
+
+    def get_many(self, keys) -> dict[str, dict]:
+        """
+        Returns the entries for the keys that are in the table, a query per chunk
+        """
+        return self.find_in(self.key, keys)
+
+    def find_in(self, column: str, values) -> dict[str, dict]:
+        """
+        Returns the entries whose column is any of the values, like
+        find_in("parent", singles) for every file of those singles
+        """
+        if column != self.key and column not in self.columns:
+            raise KeyError(f"No column {column} in table {self.tablename}")
+        values = list(values)
+        found = dict()
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start : start + chunk_size]
+            marks = ", ".join("?" * len(chunk))
+            query = f"SELECT * FROM {self.sql_table} WHERE {column} IN ({marks})"
+            with self.lock:
+                rows = self.connection.execute(query, chunk).fetchall()
+            found.update((row[self.key], self.decode(row)) for row in rows)
+        return found
+
+    def commit(self) -> None:
+        with self.lock:
+            self.connection.commit()
 
+    def close(self) -> None:
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
 
-def open_table(path: Path, table_name: str, autocommit=True) -> SqliteDict:
+
+def pack_children(children) -> bytes:
+    """
+    Returns the bytes to save for a channel's or playlist's children, their
+    packed ids, or if they don't all pack what encoder makes of them
+    """
+    packed = packer.pack(children)
+    if isinstance(packed, packer.VideoIds):
+        return packed.data
+    return encoder.encode(children)
+
+
+def unpack_children(data: bytes):
+    """
+    Returns saved children as VideoIds, or as a set if they didn't pack
+    Rows from before packing are encoder's, they start with \x80 or \x01 and
+    get packed the next time they're saved
+    """
+    if data[:1] in (b"\x80", b"\x01"):
+        return packer.pack(encoder.decode(data))
+    return packer.VideoIds(data)
+
+
+class Session:
+    """
+    One connection to the database with all of its tables, for a whole command
+    Connects the first time a table is used, so making one costs nothing
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path  # Where the database is
+        self.connection: sqlite3.Connection = None  # Opened when it's first needed
+        self.tables: dict[str, Table] = dict()  # Tables handed out so far
+        self.lock = threading.RLock()  # Every table on the connection shares it
+        self.depth: int = 0  # How many transactions deep we are
+
+    def __enter__(self) -> Session:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __getitem__(self, table_name: str) -> Table:
+        """
+        Returns the table, they all share the session's connection
+        """
+        if table_name not in valid_tables:
+            raise KeyError(f"Invalid table {table_name}")
+        with self.lock:
+            if table_name not in self.tables:
+                if self.connection is None:
+                    self.connection = connect(self.path)
+                self.tables[table_name] = Table(
+                    self.connection, table_name, session=self
+                )
+            return self.tables[table_name]
+
+    @contextmanager
+    def transaction(self):
+        """
+        Everything written inside is committed together, or not at all if it raises
+        Nested transactions are part of the outermost one
+        """
+        with self.lock:  # Other threads wait until it's done
+            self.depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.depth -= 1
+                if not self.depth and self.connection is not None:
+                    self.connection.rollback()
+                raise
+            self.depth -= 1
+            if not self.depth:
+                self.commit()
+
+    def commit(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self.connection.commit()
+
+    def close(self) -> None:
+        """
+        Commits and closes the connection, tables from it can't be used after
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.commit()
+                self.connection.close()
+            self.connection = None
+            self.tables = dict()
+
+
+class Batcher:
+    """
+    Saves entries to a table in group commits instead of one transaction each
+    Commits once it holds `size` entries or its oldest is `seconds` old, and on flush
+    """
+
+    def __init__(self, table: Table, size: int = 50, seconds: float = 5) -> None:
+        self.table: Table = table  # Where the entries go
+        self.size: int = max(1, int(size))  # Entries to hold before committing
+        self.seconds: float = seconds  # Longest an entry waits to be committed
+        self.pending: dict[str, dict] = dict()  # Entries not committed yet
+        self.since: float = 0  # When the oldest pending entry came in
+        self.commits: int = 0  # How many group commits we've made
+        self.saved: int = 0  # And how many entries went in with them
+
+    def __setitem__(self, key: str, entry: dict) -> None:
+        if not self.pending:
+            self.since = time.monotonic()
+        self.pending[key] = entry  # A newer entry for the same key replaces it
+        if len(self.pending) >= self.size or self.due():
+            self.flush()
+
+    def due(self) -> bool:
+        """
+        Returns if the oldest pending entry has waited long enough
+        """
+        return bool(self.pending) and time.monotonic() - self.since >= self.seconds
+
+    def flush(self, due: bool = False) -> int:
+        """
+        Commits everything pending in one transaction and returns how many
+        With due, only if the oldest entry has waited long enough
+        """
+        if not (count := len(self.pending)) or (due and not self.due()):
+            return 0
+        with self.table.lock:
+            autocommit, self.table.autocommit = self.table.autocommit, False
+            try:
+                self.table.update(self.pending)
+                self.table.commit()
+            finally:
+                self.table.autocommit = autocommit
+        self.pending = dict()
+        self.commits += 1
+        self.saved += count
+        return count
+
+    def stats(self) -> dict:
+        """
+        Returns how many commits it took to save how many entries
+        """
+        return {"commits": self.commits, "saved": self.saved}
+
+
+def open_table(path: Path, table_name: str, autocommit=True) -> Table:
     """
     Returns a table from the database that matches the string
     """
     if table_name in valid_tables:
-        return SqliteDict(path, tablename=table_name, autocommit=autocommit)
+        return Table(connect(path), table_name, autocommit=autocommit)
     else:
         logging.error(f"Invalid table {table_name} given")
         return None
 
 
-def close_table(table: SqliteDict) -> bool:
+def close_table(table: Table) -> bool:
     """
     Closes the table and returns if successful
     """
@@ -80,7 +566,7 @@ def close_table(table: SqliteDict) -> bool:
         logging.exception("Could not close table %s due to %s", table.tablename, e)
 
 
-def commit_table(table: SqliteDict) -> bool:
+def commit_table(table: Table) -> bool:
     """
     Commits the table and returns if successful
     """
@@ -91,7 +577,7 @@ def commit_table(table: SqliteDict) -> bool:
         logging.exception("Could not commit table %s due to %s", table.tablename, e)
 
 
-def set_entry(id: str, keys: dict, table: SqliteDict) -> str:
+def set_entry(id: str, keys: dict, table: Table) -> str:
     """
     Sets an item in the given database table
     """
@@ -102,18 +588,29 @@ def set_entry(id: str, keys: dict, table: SqliteDict) -> str:
         logging.error("Could not add id %s to table %s", id, table.tablename)
 
 
-def get_entry(id: str, table: SqliteDict) -> dict:
+def get_entry(id: str, table: Table) -> dict:
     """
     If the id exists in the table, returns the matching entry as a dict
+    One query, and the dict is decoded fresh so it's the caller's to change
     """
-    if id in table:
-        entry = deepcopy(table[id])
+    if (entry := table.get(id)) is not None:
         return entry
     else:
         logging.error("Could not find entry for %s in table %s", id, table.tablename)
 
 
-def remove_entry(id: str, table: SqliteDict) -> bool:
+def get_many(ids, table: Table) -> dict[str, dict]:
+    """
+    Returns {id: entry} for the ids that exist in the table, in chunked queries
+    """
+    try:
+        return table.get_many(ids)
+    except Exception as e:
+        logging.exception("Could not get entries from %s due to %s", table.tablename, e)
+        return dict()
+
+
+def remove_entry(id: str, table: Table) -> bool:
     """
     Removes the entry from the table if it exists and returns if successful
     """
@@ -128,6 +625,53 @@ def remove_entry(id: str, table: SqliteDict) -> bool:
         return False
 
 
+def pending_query(yt_string: str, select: str, condition: str) -> str:
+    """
+    Returns the query for the undownloaded files of a channel, playlist or single
+    that also meet the condition
+    """
+    files = tables["files"][0]
+    if yt_string == "single":
+        return (
+            f"SELECT {select} FROM {files}"
+            f" WHERE parent = ? AND downloaded = 0 AND {condition}"
+        )
+    return (  # Its singles' files, singles first so both parent indexes get used
+        f"SELECT {select} FROM singles CROSS JOIN {files}"
+        f" ON {files}.parent = singles.url"
+        f" WHERE singles.parent = ? AND {files}.downloaded = 0 AND {condition}"
+    )
+
+
+def pending_files(
+    table: Table, url: str, yt_string: str, due: float = None
+) -> dict[str, dict]:
+    """
+    Returns the files of a channel, playlist or single that aren't downloaded yet
+    With due, only the ones whose retry_after has come by then
+    One indexed query, the files table has to be the one passed in
+    """
+    files = tables["files"][0]
+    if due is None:
+        query, args = pending_query(yt_string, f"{files}.*", "1"), (url,)
+    else:
+        condition = f"({files}.retry_after IS NULL OR {files}.retry_after <= ?)"
+        query, args = pending_query(yt_string, f"{files}.*", condition), (url, due)
+    with table.lock:
+        rows = table.connection.execute(query, args).fetchall()
+    return {row[table.key]: table.decode(row) for row in rows}
+
+
+def cooling_files(table: Table, url: str, yt_string: str, now: float) -> int:
+    """
+    Returns how many of the pending files failed recently and aren't due a retry
+    """
+    files = tables["files"][0]
+    query = pending_query(yt_string, "COUNT(*)", f"{files}.retry_after > ?")
+    with table.lock:
+        return table.connection.execute(query, (url, now)).fetchone()[0]
+
+
 # def add_yt(table: SqliteDict, filetree: SqliteDict, yt_string: str, id: str, keys: dict, ) -> None:
 #     '''
 #     Adds the yt and its info to the database
@@ -9,10 +9,28 @@ I could maybe make other types of downloads available. I think a possible one is
 """
 
 from pytube import YouTube, Stream, Caption
+from pytube import request  # For the sequenced streams pytube knows how to fetch
 import logging
+import os  # For fsync and atomic renames
+import shutil  # For cleaning up scratch directories
 from pathlib import Path
 import subprocess
-from urllib.request import urlretrieve, urlopen  # Using this to download thumbnails
+import threading
+import time  # For timing transfers
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen  # For thumbnails and ranges
+from urllib.parse import urlparse  # For finding which host a file comes from
+from youmirror.indexer import StreamIndex  # Finds streams without filtering
+import youmirror.requester as requester  # Pooled connections for size checks
+import youmirror.throttler as throttler  # Keeps downloads under the bandwidth limit
+import youmirror.retrier as retrier  # Classifies failed downloads
+import youmirror.cacher as cacher  # Stream indexes from earlier runs
+import youmirror.processor as processor  # Post-processing, like muxing
+import youmirror.extractor as extractor  # Where the streams come from
+from youmirror.tracker import metrics  # Download progress and throughput
+from youmirror.coalescer import flights  # One fetch per video at a time
 
 file_types = {
     "video",
@@ -32,6 +50,9 @@ resolutions = [
     "144p",
 ]  # Stored as a list because order is important
 sub_types = ["mp4", "webm"]  # Prefer mp4 over webm
+range_size = 9437184  # Ask for 9MB at a time, youtube throttles bigger requests
+chunk_size = 1048576  # Read 1MB at a time from the response
+timeout = 30  # Seconds to wait on a stalled connection
 
 
 def get_stream(yt: YouTube, file_type: str, options: dict) -> Stream:
@@ -49,35 +70,117 @@ def get_stream(yt: YouTube, file_type: str, options: dict) -> Stream:
     return stream
 
 
+def get_index(yt: YouTube) -> StreamIndex:
+    """
+    Returns the stream index for the video, building it the first time it's needed
+    A fresh enough index from an earlier run is taken from the metadata cache
+    """
+    if getattr(yt, "stream_index", None) is None:
+        load_index(yt, cacher.cache.get(yt.video_id, "streams"))
+    if (index := getattr(yt, "stream_index", None)) is None:
+        index = flights.do(
+            ("index", yt.video_id), lambda: build_index(yt)
+        )  # Workers after the same video share one scan
+        yt.stream_index = index  # Lives as long as the pytube object does
+        yt.stream_index_saved = False  # Built from what youtube is serving right now
+    return index
+
+
+def build_index(yt: YouTube) -> StreamIndex:
+    """
+    Scans the streams youtube is serving right now and saves the index for next time
+    """
+    index = StreamIndex.from_streams(
+        resolve_streams(yt)
+    )  # The only scan of the manifest
+    cacher.cache.put(yt.video_id, "streams", index.to_dict())
+    return index
+
+
+def resolve_streams(yt: YouTube):
+    """
+    Returns the video's streams, loading them only once however many workers ask
+    """
+    return flights.do(
+        ("streams", yt.video_id), lambda: extractor.backend.get_streams(yt)
+    )
+
+
+def load_index(yt: YouTube, data: dict) -> None:
+    """
+    Gives the video an index that was saved in the database
+    """
+    if data and getattr(yt, "stream_index", None) is None:
+        yt.stream_index = StreamIndex.from_dict(data)
+        yt.stream_index_saved = True  # Might be out of date
+
+
+def pick_video(index: StreamIndex, options: dict) -> int:
+    """
+    Picks the itag of the video stream that best matches the options
+    """
+    if options["has_ffmpeg"]:  # If resolution is specified
+        resolution = options["resolution"]  # Get the resolution from the options
+        return index.get_video(
+            resolutions[resolutions.index(resolution) :]
+        )  # Try the resolution and then everything below it
+    return index.get_progressive()  # Else, the highest res progressive (usually 720p)
+
+
+def pick_audio(index: StreamIndex, options: dict) -> int:
+    """
+    Picks the itag of the highest bitrate audio stream (mp4)
+    """
+    return index.get_audio()
+
+
+def pick_stream(yt: YouTube, pick: Callable, options: dict) -> Stream:
+    """
+    Uses the pick function to choose an itag from the index and returns its stream
+    If a saved index points at a stream youtube no longer serves, rebuild and pick again
+    """
+    itag = pick(get_index(yt), options)
+    stream = get_stream_by_itag(yt, itag) if itag else None
+    if stream is None and yt.stream_index_saved:
+        yt.stream_index = None  # Out of date, build a fresh one
+        itag = pick(get_index(yt), options)
+        stream = get_stream_by_itag(yt, itag) if itag else None
+    return stream
+
+
+def get_stream_by_itag(yt: YouTube, itag: int) -> Stream:
+    """
+    Returns the stream with the itag, once the video's streams have been resolved
+    """
+    resolve_streams(yt)  # Only one worker goes to youtube for them
+    return extractor.backend.get_stream(yt, itag)
+
+
+def pick_filesize(yt: YouTube, pick: Callable, options: dict) -> int:
+    """
+    Returns the filesize of the stream the pick function chooses
+    Answered from the index when it knows the size, so no streams have to be resolved
+    """
+    specs = get_index(yt).get(pick(get_index(yt), options))
+    if specs and specs["filesize"]:
+        return specs["filesize"]
+    stream = pick_stream(yt, pick, options)
+    stream._filesize = flights.do(
+        ("filesize", yt.video_id, stream.itag),
+        lambda: requester.content_length(stream.url),
+    )  # Ask the server, once
+    return stream._filesize
+
+
 def get_video_stream(yt: YouTube, options: dict) -> Stream:
     """
     Gets the video stream from the video
     """
     try:
-        if options["has_ffmpeg"]:  # If resolution is specified
-            resolution = options["resolution"]  # Get the resolution from the options
-        else:
-            return (
-                yt.streams.filter(progressive=True, subtype="mp4")
-                .order_by("resolution")
-                .last()
-            )  # Else, get the highest res progressive stream (usually 720p)
-        stream = None  # Initialize the stream
-        find_res = iter(
-            resolutions[resolutions.index(resolution) :]
-        )  # Iterate through the resolutions
-        while not stream:  # Until we find a good one
-            streams = yt.streams.filter(
-                subtype="mp4", resolution=resolution
-            )  # Filter streams by resolution
-            stream = next(
-                iter(streams), None
-            )  # Get the first stream or none if there is no stream
-            resolution = next(find_res)  # Get the next resolution
+        return pick_stream(yt, pick_video, options)
     except KeyError:
         logging.exception("Could not find stream")
         return None
-    return stream
 
 
 def get_audio_stream(yt: YouTube, options: dict) -> Stream:
@@ -85,42 +188,100 @@ def get_audio_stream(yt: YouTube, options: dict) -> Stream:
     Gets the audio stream from the video
     """
     try:
-        stream = (
-            yt.streams.get_audio_only()
-        )  # This returns the highest bitrate audio stream by default (mp4)
-        return stream
+        return pick_stream(yt, pick_audio, options)
     except Exception as e:
         logging.exception(e)
         return None
 
 
-def combine_video_audio(video_file: str, audio_file: str) -> str:
-    """
-    Combines the video and audio files
-    """
-    temp = Path(f"{video_file}.temp")  # Create temp file
-    temp.touch()  # Create the file
-    Path(video_file).rename(temp)  # Rename the video file to the temp file
-    temp = str(temp)  # Convert to string
-    subprocess.run(
-        [
-            "ffmpeg",
-            "-y",
-            "-i",
-            f"{temp}",
-            "-i",
-            f"{audio_file}",
-            "-c:v",
-            "copy",
-            "-c:a",
-            "copy",
-            f"{video_file}",
-        ],
-        capture_output=True,
-    )  # Use ffmpeg to combine the video and audio
-    Path(audio_file).unlink()  # Delete the temp audio file
-    Path(temp).unlink()  # Delete the temp video file
-    return video_file
+def scratch_path(filepath: Path) -> Path:
+    """
+    Returns the scratch directory for the pieces of a muxed file
+    """
+    return filepath.with_name(f"{filepath.name}.parts")
+
+
+def mux_files(
+    video_stream: Stream,
+    audio_stream: Stream,
+    scratch: Path,
+    output: str,
+    options: dict,
+) -> list[tuple]:
+    """
+    Downloads the video and audio side by side into the scratch directory
+    Both pieces are normal .part downloads, so they resume if we get interrupted
+    Returns the remux step, which the processor runs once we've moved on
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        video = pool.submit(
+            download_stream, video_stream, str(scratch), "video.mp4", options
+        )
+        audio = pool.submit(
+            download_stream, audio_stream, str(scratch), "audio.mp4", options
+        )
+        video.result(), audio.result()  # Raises if either one failed
+    video_file, audio_file = str(scratch / "video.mp4"), str(scratch / "audio.mp4")
+    return [("remux", (video_file, audio_file, output, str(scratch)))]
+
+
+def mux_pipe(video_stream: Stream, audio_stream: Stream, scratch: Path, output: str):
+    """
+    Streams the video and audio into ffmpeg through named pipes, so the only thing
+    written to disk is the finished file
+    """
+    streams = [video_stream, audio_stream]
+    fifos = [scratch / "video.fifo", scratch / "audio.fifo"]
+    for fifo in fifos:
+        fifo.unlink(missing_ok=True)
+        os.mkfifo(fifo)
+
+    def feed(stream: Stream, fifo: Path) -> None:
+        with metrics.transfer(stream), open(fifo, "wb") as fh:  # Blocks on ffmpeg
+            write_ranges(stream, fh)
+        stream.on_complete(str(fifo))
+
+    part = part_path(Path(output))
+    process = subprocess.Popen(
+        processor.mux_command(str(fifos[0]), str(fifos[1]), str(part)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        feeders = [pool.submit(feed, *pair) for pair in zip(streams, fifos)]
+        stderr = process.communicate()[1]
+        for fifo in fifos:  # If ffmpeg quit early, unstick anyone still opening a pipe
+            os.close(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+        errors = [f.exception() for f in feeders]
+    if process.returncode or any(errors):
+        part.unlink(missing_ok=True)
+        if error := next((e for e in errors if e), None):
+            raise error
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')}")
+    os.replace(part, output)  # Atomic rename into place
+
+
+def download_muxed(
+    video_stream: Stream, audio_stream: Stream, path: str, filename: str, options: dict
+) -> list[tuple]:
+    """
+    Downloads the video and audio streams at the same time and muxes them into one file
+    options["mux"] picks how: "files" downloads both into a scratch directory next to
+    the file and returns the remux step for the processor, "pipe" feeds them to
+    ffmpeg through named pipes right away
+    Returns the post-processing steps still to run
+    """
+    filepath = Path(path) / Path(filename)  # Where the finished file goes
+    if filepath.is_file():  # Muxed files only get their real name when finished
+        logging.debug(f"File {filepath} already exists, skipping")
+        return []
+    scratch = scratch_path(filepath)  # Unique to this file
+    scratch.mkdir(parents=True, exist_ok=True)
+    if options.get("mux") == "pipe" and hasattr(os, "mkfifo"):
+        mux_pipe(video_stream, audio_stream, scratch, str(filepath))
+        shutil.rmtree(scratch, ignore_errors=True)  # Clean up the pipes
+        return []
+    return mux_files(video_stream, audio_stream, scratch, str(filepath), options)
 
 
 def calculate_video_filesize(yt: YouTube, options: dict) -> int:
@@ -128,9 +289,10 @@ def calculate_video_filesize(yt: YouTube, options: dict) -> int:
     Calculates the size of a video file
     """
     try:
-        video_stream = get_video_stream(yt, options)  # Get the video stream
-        filesize = video_stream.filesize  # Add the filesize
-        if not video_stream.includes_audio_track:  # If there is no audio
+        index = get_index(yt)  # Everything we need is in the index
+        filesize = pick_filesize(yt, pick_video, options)  # Add the filesize
+        specs = index.get(pick_video(index, options))
+        if not specs["includes_audio_track"]:  # If there is no audio
             filesize += calculate_audio_filesize(yt, options)  # Add the audio filesize
     except Exception:
         return 0  # Skip it if error
@@ -141,7 +303,7 @@ def calculate_audio_filesize(yt: YouTube, options: dict) -> int:
     """
     Calculates the size of an audio file
     """
-    return get_audio_stream(yt, options).filesize
+    return pick_filesize(yt, pick_audio, options)
 
 
 def calculate_caption_filesize(yt: YouTube, options: dict) -> int:
@@ -156,8 +318,7 @@ def calculate_thumbnail_filesize(yt: YouTube, options: dict):
     Calculates the size of a thumbnail file
     """
     url = yt.thumbnail_url  # Get the thumbnail url
-    file = urlopen(url)  # Use pytube's request module to get the filesize
-    return file.length
+    return requester.content_length(url)  # HEAD over a pooled connection
 
 
 def calculate_filesize(yt: YouTube, file_type: str, options: dict) -> int:
@@ -179,52 +340,242 @@ def calculate_filesize(yt: YouTube, file_type: str, options: dict) -> int:
     return filesize
 
 
+def get_host(yt: YouTube, file_type: str, options: dict) -> str:
+    """
+    Returns the host that the file will be downloaded from
+    """
+    try:
+        if file_type == "video":
+            url = get_video_stream(yt, options).url
+        elif file_type == "audio":
+            url = get_audio_stream(yt, options).url
+        elif file_type == "thumbnail":
+            url = yt.thumbnail_url
+        else:
+            url = yt.watch_url  # Captions come from youtube itself
+        return urlparse(url).netloc
+    except Exception:
+        logging.debug(f"Could not find host for {file_type}")
+        return ""  # Unknown hosts all share one slot
+
+
+def part_path(filepath: Path) -> Path:
+    """
+    Returns the path a file is downloaded to before it is complete
+    """
+    return filepath.with_name(f"{filepath.name}.part")
+
+
+def open_range(url: str, start: int, end: int = None):
+    """
+    Opens a response for the given byte range of a url (end is inclusive)
+    """
+    byte_range = f"bytes={start}-{end if end is not None else ''}"
+    headers = {"User-Agent": "Mozilla/5.0", "Range": byte_range}
+    started = time.monotonic()
+    response = urlopen(Request(url, headers=headers), timeout=timeout)
+    metrics.first_byte(urlparse(url).netloc, time.monotonic() - started)
+    return response
+
+
+def read_chunks(response) -> Iterator[bytes]:
+    """
+    Yields the body of a response in chunks, at whatever rate the throttler allows
+    """
+    while chunk := response.read(chunk_size):
+        throttler.consume(len(chunk))
+        yield chunk
+
+
+class PositionalWriter:
+    """
+    File-like object that writes each chunk at its own offset with pwrite,
+    so several threads can fill in different parts of the same file
+    """
+
+    def __init__(self, fd: int, offset: int) -> None:
+        self.fd = fd  # Shared file descriptor
+        self.offset = offset  # Where the next chunk goes
+
+    def write(self, chunk: bytes) -> int:
+        view = memoryview(chunk)
+        while view:  # pwrite can come up short
+            written = os.pwrite(self.fd, view, self.offset)
+            self.offset += written
+            view = view[written:]
+        return len(chunk)
+
+
+def split_ranges(filesize: int, segments: int) -> list[tuple[int, int]]:
+    """
+    Splits a filesize into inclusive (start, end) byte ranges of about the same size
+    """
+    size = -(-filesize // segments)  # Round up so we don't leave a sliver at the end
+    return [
+        (start, min(start + size, filesize) - 1) for start in range(0, filesize, size)
+    ]
+
+
+def download_segmented(stream: Stream, filepath: Path, segments: int) -> None:
+    """
+    Downloads the stream over several connections at once
+    The file is preallocated to its full size and every connection writes its
+    own byte range straight to the right offset
+    """
+    filesize = stream.filesize
+    remaining = [filesize]  # Shared count for the progress callback
+    lock = threading.Lock()
+
+    def fetch(start: int, end: int) -> int:
+        writer = PositionalWriter(fd, start)
+        while writer.offset <= end:
+            stop = min(writer.offset + range_size - 1, end)  # Stay under the throttle
+            with open_range(stream.url, writer.offset, stop) as response:
+                if response.status != 206:
+                    raise IOError(f"Server does not support ranges for {filepath.name}")
+                for chunk in read_chunks(response):
+                    with lock:
+                        remaining[0] -= len(chunk)
+                        left = remaining[0]
+                    stream.on_progress(chunk, writer, left)  # Writes the chunk
+            if writer.offset != stop + 1:
+                raise IOError(f"Range {start}-{end} of {filepath.name} came up short")
+        return writer.offset - start  # Bytes written
+
+    fd = os.open(filepath, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, filesize)  # Reserve the space up front
+        else:
+            os.ftruncate(fd, filesize)
+        ranges = split_ranges(filesize, segments)
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            written = sum(pool.map(lambda r: fetch(*r), ranges))
+        if written != filesize:
+            raise IOError(
+                f"Downloaded {written} of {filesize} bytes for {filepath.name}"
+            )
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_ranges(stream: Stream, fh, offset: int = 0) -> int:
+    """
+    Writes the stream to the file handle starting at the offset, one range at a
+    time, and returns the offset it finished at
+    """
+    filesize = stream.filesize
+    try:
+        while offset < filesize:
+            end = min(offset + range_size, filesize) - 1  # Next range to request
+            with open_range(stream.url, offset, end) as response:
+                if response.status != 206 and offset:  # Server ignored the range
+                    fh.seek(0)  # So the response is the whole file
+                    fh.truncate()
+                    offset = 0
+                for chunk in read_chunks(response):
+                    offset += len(chunk)
+                    stream.on_progress(chunk, fh, filesize - offset)  # Writes it
+                if response.status != 206:
+                    break
+    except HTTPError as e:
+        if e.code != 404 or offset:
+            raise
+        # Some adaptive streams have to be requested by sequence number
+        for chunk in request.seq_stream(stream.url, timeout=timeout):
+            throttler.consume(len(chunk))
+            offset += len(chunk)
+            stream.on_progress(chunk, fh, filesize - offset)
+    return offset
+
+
 def download_stream(stream: Stream, path: str, filename: str, options: dict) -> bool:
     """
     Downloads to the given filepath and returns if a new file was downloaded or not
-    TODO would be nice if the download only wrote to file on complete (maybe suggest to pytube)
+    The stream is written to '<filename>.part' and only renamed once it matches the
+    stream's filesize, so an interrupted download never looks like a finished file.
+    If a .part file is already there we pick up from its last byte
     """
-    stream.download(
-        output_path=path, filename=filename
-    )  # Download to the appropriate path and name
-    return True
+    Path(path).mkdir(parents=True, exist_ok=True)  # Make sure the directory is there
+    filepath = Path(path) / Path(filename)  # Where the finished file goes
+    part = part_path(filepath)  # Where the download goes until it's finished
+    filesize = stream.filesize  # How big the finished file should be
+    if filepath.is_file() and filepath.stat().st_size == filesize:
+        logging.debug(f"File {filepath} already exists, skipping")
+        return False
+
+    with metrics.transfer(stream):  # Forgets the stream if it fails
+        segments = options.get("segments", 1)  # Connections to use for big streams
+        if (
+            segments > 1
+            and filesize >= options.get("segment_size", 0)
+            and hasattr(os, "pwrite")
+        ):
+            # Segmented downloads fill the file out of order, so they can't be resumed
+            # and get their own temp file that a normal resume won't pick up
+            temp = filepath.with_name(f"{filepath.name}.segments")
+            try:
+                download_segmented(stream, temp, segments)
+            except Exception:
+                temp.unlink(missing_ok=True)
+                raise
+            os.replace(temp, filepath)  # Atomic rename into place
+            part.unlink(missing_ok=True)  # Anything left from an older attempt
+            stream.on_complete(str(filepath))
+            return True
+
+        offset = part.stat().st_size if part.is_file() else 0  # Resume from here
+        if offset > filesize:  # Something went wrong last time, start over
+            offset = 0
+        if offset:
+            logging.info(f"Resuming {filename} at {offset} of {filesize} bytes")
+        with open(part, "r+b" if offset else "wb") as fh:
+            fh.truncate(offset)  # Drop anything past the resume point
+            fh.seek(offset)
+            write_ranges(stream, fh, offset)
+            fh.flush()
+            os.fsync(fh.fileno())  # Make sure it's on disk before it gets its real name
+
+        if (size := part.stat().st_size) != filesize:
+            raise IOError(f"Downloaded {size} of {filesize} bytes for {filename}")
+        os.replace(part, filepath)  # Atomic rename into place
+        stream.on_complete(str(filepath))
+        return True
 
 
 def download_video(yt: YouTube, path: str, filename: str, options: dict) -> dict:
     """
     Gets the proper stream for video and downloads it
     """
-    try:
-        video_stream = get_video_stream(yt, options)  # Get the video stream
-        length = yt.length
-        filesize = video_stream.filesize  # Get the filesize
-        bitrate = video_stream.abr  # Get the bitrate
+    video_stream = get_video_stream(yt, options)  # Get the video stream
+    if not video_stream:
+        raise retrier.Unavailable(f"No video stream for {filename}")
+    length = yt.length
+    filesize = video_stream.filesize  # Get the filesize
+    bitrate = video_stream.abr  # Get the bitrate
+    steps = []  # Post-processing still to do
+    if video_stream.includes_audio_track:  # Progressive streams are ready to go
         download_stream(
             video_stream, path, filename, options
         )  # Download the video stream
-        if not video_stream.includes_audio_track:  # If no audio track
-            filepath = str(Path(path) / Path(filename))  # Get the filepath
-            audio_stream = get_audio_stream(yt, options)  # Get the audio stream
-            filesize += audio_stream.filesize  # Add the filesize
-            bitrate = audio_stream.abr  # Get the bitrate
-            download_stream(
-                audio_stream, path, "temp_audio.mp4", options
-            )  # Download the audio stream
-            audio_filepath = str(
-                Path(path) / Path("temp_audio.mp4")
-            )  # Get the audio filepath
-            combine_video_audio(filepath, audio_filepath)  # Combine the video and audio
-        specs = {
-            "resolution": video_stream.resolution,
-            "bitrate": bitrate,
-            "filesize": filesize,
-            "length": length,
-            "downloaded": True,
-        }
-        return specs
-    except Exception as e:
-        logging.exception(f"Could not download video {filename}")
-        return None
+    else:  # Otherwise we need to mux in the audio
+        audio_stream = get_audio_stream(yt, options)  # Get the audio stream
+        filesize += audio_stream.filesize  # Add the filesize
+        bitrate = audio_stream.abr  # Get the bitrate
+        steps = download_muxed(
+            video_stream, audio_stream, path, filename, options
+        )  # Download both streams, combining them may be left to the processor
+    specs = {
+        "resolution": video_stream.resolution,
+        "bitrate": bitrate,
+        "filesize": filesize,
+        "length": length,
+        "downloaded": True,
+    }
+    if steps:
+        specs["postprocess"] = steps  # The scheduler hands these to the processor
+    return specs
 
 
 def download_caption(yt: YouTube, path: str, filename: str, options: dict) -> dict:
@@ -234,21 +585,23 @@ def download_caption(yt: YouTube, path: str, filename: str, options: dict) -> di
     Probably should just implement it in this library until pytube is updated
     """
     # TODO handle for different languages
-    try:
-        caption_type = options["language"]  # Language was injected from above
-        captions = yt.captions  # Get the captions
-        for caption in captions:  # Iterate through the captions
-            if caption.code == caption_type:  # If the caption is the language we want
-                caption.download(
-                    output_path=path, title=filename
-                )  # Download the caption
-                specs = {"name": caption.name, "url": caption.url, "downloaded": True}
-                return specs
-        print("Could not find caption for language: " + caption_type)
-        return None
-    except Exception as e:
-        logging.exception(f"Could not download caption {filename}")
-        return None
+    caption_type = options["language"]  # Language was injected from above
+    captions = yt.captions  # Get the captions
+    for caption in captions:  # Iterate through the captions
+        if caption.code == caption_type:  # If the caption is the language we want
+            started = time.monotonic()
+            caption_path = caption.download(
+                output_path=path, title=filename
+            )  # Download the caption
+            size = os.path.getsize(caption_path)
+            metrics.transferred(
+                f"caption/{caption_type}", size, time.monotonic() - started
+            )
+            throttler.consume(size)  # pytube fetched it, so count it afterwards
+            specs = {"name": caption.name, "url": caption.url, "downloaded": True}
+            return specs
+    print("Could not find caption for language: " + caption_type)
+    raise retrier.Unavailable(f"No captions for language {caption_type}")
 
 
 def download_audio(yt: YouTube, path: str, filename: str, options: dict) -> str:
@@ -258,50 +611,57 @@ def download_audio(yt: YouTube, path: str, filename: str, options: dict) -> str:
     Stream looks like yt.streams.filter(only_audio=True, subtype="mp4").desc()
     Audio files are coming out too long, so we want to trim it to the reported length if it is longer
     """
-    try:
-        length = yt.length  # Get the length of the video
-        stream = get_audio_stream(yt, options)  # Get the audio stream
-        stream.download(
-            output_path=path, filename=filename
-        )  # Download the audio stream
-        specs = {
-            "length": length,
-            "filesize": stream.filesize,
-            "bitrate": stream.abr,
-            "downloaded": True,
-        }
-        if options["has_ffmpeg"]:  # TODO If they have ffmpeg, trim the audio
-            pass
-            # subprocess.run(["ffmpeg", "-y", "-i", f"{path}{filename}", "-ss", "00:00:00", "-t", f"{length}", f"{path}{filename}"])
-        return specs
-    except Exception as e:
-        logging.exception(f"Could not download audio {filename}")
-        return None
+    length = yt.length  # Get the length of the video
+    stream = get_audio_stream(yt, options)  # Get the audio stream
+    if not stream:
+        raise retrier.Unavailable(f"No audio stream for {filename}")
+    download_stream(stream, path, filename, options)  # Download the audio stream
+    specs = {
+        "length": length,
+        "filesize": stream.filesize,
+        "bitrate": stream.abr,
+        "downloaded": True,
+    }
+    if options["has_ffmpeg"] and length:  # Trim it once we've moved on
+        specs["postprocess"] = [("trim", (str(Path(path) / Path(filename)), length))]
+    return specs
+
+
+def fetch_thumbnail(url: str) -> bytes:
+    """
+    Downloads a thumbnail into memory, they're only a few KB
+    """
+    started = time.monotonic()
+    with urlopen(url, timeout=timeout) as response:
+        data = b"".join(read_chunks(response))
+    metrics.transferred("thumbnail", len(data), time.monotonic() - started)
+    return data
 
 
 def download_thumbnail(yt: YouTube, path: str, filename: str, options: dict) -> str:
     """
     Gets the thumbnail from the video and downloads it
     """
-    try:
-        path = Path(path)  # Wrap the path
-        path.mkdir(
-            parents=True, exist_ok=True
-        )  # Create the directory if it doesn't exist
-        filepath = path / Path(filename)  # Build the filepath
-        filepath.touch()  # Create the file
-        url = yt.thumbnail_url  # For now, pytube can only get the url for a thumbnail
-        urlretrieve(url, filepath)  # Download the thumbnail
-        specs = {"url": url, "downloaded": True}  # TODO figure out the filesize
-        return specs
-    except Exception as e:
-        logging.exception(f"Could not download thumbnail at {filepath}")
-        return None
+    path = Path(path)  # Wrap the path
+    path.mkdir(parents=True, exist_ok=True)  # Create the directory if it doesn't exist
+    filepath = path / Path(filename)  # Build the filepath
+    part = part_path(filepath)  # Only gets its real name once it's complete
+    url = yt.thumbnail_url  # For now, pytube can only get the url for a thumbnail
+    data = flights.do(
+        ("thumbnail", yt.video_id), lambda: fetch_thumbnail(url)
+    )  # The same video in two playlists only downloads it once
+    with open(part, "wb") as fh:
+        fh.write(data)
+    os.replace(part, filepath)
+    filesize = filepath.stat().st_size
+    specs = {"url": url, "filesize": filesize, "downloaded": True}
+    return specs
 
 
 def download_single(yt: YouTube, file_type: str, filepath: str, options: dict) -> dict:
     """
     Takes a single YouTube object and handles the downloading based on configs
+    Returns the file's specs, which say why it failed if it did (see retrier)
     """
 
     file_type_to_do = {  # Translation from file type to func
@@ -318,4 +678,4 @@ def download_single(yt: YouTube, file_type: str, filepath: str, options: dict) -
         return func(yt, path, filename, options)  # Call the function
     except Exception as e:
         logging.exception(f"Could not download {file_type} {filepath}")
-        return None
+        return retrier.failure(e)
@@ -0,0 +1,265 @@
+"""
+This module turns the values databaser keeps in BLOB columns into bytes and back
+----
+Most of an entry lives in typed columns and children are packed ids (see
+packer), what's left is stream indexes and the odd extra key. Pickling those
+spells out every string in full.
+----
+The compact codec packs plain values with struct and varints instead. Every
+value starts with a one byte tag, strings that come up again in the same value
+are written once and referenced by number after that, and youtube urls keep
+only what comes after one of the known prefixes.
+Pickles always start with \\x80 and compact values with \\x01, so decode can
+tell which codec wrote a value. A database can have both, switching `db_codec`
+only changes how new writes are saved. Anything compact can't pack (a class
+instance, say) is pickled instead.
+----
+pickle stays the default. With the typed columns there isn't much left to pack,
+so on benchmarker's 100k file mirror compact only saves ~4% of the database
+while taking ~15x as long, in Python, to pack and unpack the stream indexes.
+"""
+
+import logging
+import pickle
+import struct
+
+double = struct.Struct("<d")  # Floats are 8 bytes, little endian
+url_prefixes = (
+    "https://www.youtube.com/watch?v=",
+    "https://www.youtube.com/playlist?list=",
+    "https://www.youtube.com/",
+)  # Longest first, matched in order
+
+# Tags for the compact format
+NONE, TRUE, FALSE, INT, FLOAT, STR, REF, URL, BYTES = range(9)
+LIST, TUPLE, SET, FROZENSET, DICT, STRINGS = range(9, 15)
+
+
+class PickleCodec:
+    """
+    Pickles values, slower to read than it is to write but anything goes
+    """
+
+    name = "pickle"
+
+    def encode(self, value) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data: bytes):
+        return pickle.loads(data)
+
+
+class CompactCodec:
+    """
+    Packs None, bools, ints, floats, strings, bytes and lists, tuples, sets and
+    dicts of those. Raises TypeError on anything else
+    """
+
+    name = "compact"
+    magic = 1  # First byte of everything it writes
+
+    def encode(self, value) -> bytes:
+        out = bytearray((self.magic,))
+        self._pack(value, out, dict())
+        return bytes(out)
+
+    def decode(self, data: bytes):
+        value, _ = self._unpack(memoryview(data), 1, list())
+        return value
+
+    def _pack(self, value, out: bytearray, strings: dict) -> None:
+        kind = type(value)  # Exact types, subclasses get pickled
+        if kind is str:
+            if (number := strings.get(value)) is not None:  # Seen it already
+                out.append(REF)
+                varint(number, out)
+                return
+            for number, prefix in enumerate(url_prefixes):
+                if value.startswith(prefix):
+                    out.append(URL)
+                    out.append(number)
+                    self._pack(value[len(prefix) :], out, strings)  # Then the rest
+                    return
+            strings[value] = len(strings)
+            data = value.encode()
+            out.append(STR)
+            varint(len(data), out)
+            out += data
+        elif value is None:
+            out.append(NONE)
+        elif kind is bool:
+            out.append(TRUE if value else FALSE)
+        elif kind is int:
+            out.append(INT)
+            varint(value << 1 if value >= 0 else (-value << 1) - 1, out)  # Zigzag
+        elif kind is float:
+            out.append(FLOAT)
+            out += double.pack(value)
+        elif kind is bytes:
+            out.append(BYTES)
+            varint(len(value), out)
+            out += value
+        elif kind is dict:
+            out.append(DICT)
+            varint(len(value), out)
+            for key, item in value.items():
+                self._pack(key, out, strings)
+                self._pack(item, out, strings)
+        elif kind in containers and self._pack_strings(value, out):
+            return  # All strings, packed in one go
+        elif kind in containers:
+            out.append(containers[kind])
+            varint(len(value), out)
+            for item in value:
+                self._pack(item, out, strings)
+        else:
+            raise TypeError(f"Can't pack {kind.__name__}")
+
+    def _pack_strings(self, value, out: bytearray) -> bool:
+        """
+        Packs a list, tuple or set of nothing but strings, like a channel's children,
+        as its kind, a shared url prefix and the rest joined with NULs.
+        Splitting them back up happens in C, unlike going item by item.
+        Returns False, without writing anything, if it isn't one
+        """
+        if len(value) < 2 or not all(type(item) is str for item in value):
+            return False
+        first = next(iter(value))
+        number = next(
+            (
+                n
+                for n, prefix in enumerate(url_prefixes)
+                if first.startswith(prefix)
+                and all(item.startswith(prefix) for item in value)
+            ),
+            len(url_prefixes),  # No prefix they all share
+        )
+        cut = len(url_prefixes[number]) if number < len(url_prefixes) else 0
+        joined = "\0".join([item[cut:] for item in value])
+        if joined.count("\0") != len(value) - 1:  # Some have NULs of their own
+            return False
+        data = joined.encode()
+        out += bytes((STRINGS, containers[type(value)], number))
+        varint(len(data), out)
+        out += data
+        return True
+
+    def _unpack(self, data: memoryview, at: int, strings: list) -> tuple:
+        """
+        Returns the value starting at `at` and where the next one starts
+        """
+        tag = data[at]
+        at += 1
+        if tag == STR:
+            size, at = read_varint(data, at)
+            value = str(data[at : at + size], "utf-8")
+            strings.append(value)
+            return value, at + size
+        if tag == REF:
+            number, at = read_varint(data, at)
+            return strings[number], at
+        if tag == URL:
+            prefix = url_prefixes[data[at]]
+            rest, at = self._unpack(data, at + 1, strings)
+            return prefix + rest, at
+        if tag == NONE:
+            return None, at
+        if tag == TRUE:
+            return True, at
+        if tag == FALSE:
+            return False, at
+        if tag == INT:
+            number, at = read_varint(data, at)
+            return (number >> 1) ^ -(number & 1), at
+        if tag == FLOAT:
+            return double.unpack_from(data, at)[0], at + 8
+        if tag == BYTES:
+            size, at = read_varint(data, at)
+            return bytes(data[at : at + size]), at + size
+        if tag == STRINGS:
+            kind, number = data[at], data[at + 1]
+            size, at = read_varint(data, at + 2)
+            items = str(data[at : at + size], "utf-8").split("\0")
+            if number < len(url_prefixes):
+                prefix = url_prefixes[number]
+                items = [prefix + item for item in items]
+            return (items if kind == LIST else builders[kind](items)), at + size
+        size, at = read_varint(data, at)
+        if tag == DICT:
+            value = dict()
+            for _ in range(size):
+                key, at = self._unpack(data, at, strings)
+                value[key], at = self._unpack(data, at, strings)
+            return value, at
+        items = list()
+        for _ in range(size):
+            item, at = self._unpack(data, at, strings)
+            items.append(item)
+        return (items if tag == LIST else builders[tag](items)), at
+
+
+containers = {list: LIST, tuple: TUPLE, set: SET, frozenset: FROZENSET}
+builders = {TUPLE: tuple, SET: set, FROZENSET: frozenset}
+
+
+def varint(number: int, out: bytearray) -> None:
+    """
+    Appends a non negative int 7 bits a byte, the high bit says more follow
+    """
+    while number > 0x7F:
+        out.append(number & 0x7F | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def read_varint(data: memoryview, at: int) -> tuple[int, int]:
+    """
+    Returns the varint starting at `at` and where the next value starts
+    """
+    number = shift = 0
+    while True:
+        byte = data[at]
+        at += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, at
+        shift += 7
+
+
+codecs = {
+    "pickle": PickleCodec(),
+    "compact": CompactCodec(),
+}  # What `db_codec` can be set to
+codec = codecs["pickle"]  # What new values are written with
+
+
+def configure(options: dict):
+    """
+    Picks the codec new values are written with from the options
+    """
+    global codec
+    name = options.get("db_codec", "pickle")
+    if name not in codecs:
+        logging.error(f"Unknown db_codec '{name}', valid codecs = {list(codecs)}")
+    else:
+        codec = codecs[name]
+    return codec
+
+
+def encode(value) -> bytes:
+    """
+    Encodes a value with the configured codec, or pickles it if that can't
+    """
+    try:
+        return codec.encode(value)
+    except (TypeError, ValueError):  # Not a plain value, or a string utf-8 can't hold
+        return codecs["pickle"].encode(value)
+
+
+def decode(data: bytes):
+    """
+    Decodes a value written by either codec
+    """
+    if data[0] == CompactCodec.magic:
+        return codecs["compact"].decode(data)
+    return codecs["pickle"].decode(data)
@@ -0,0 +1,525 @@
+"""
+This module is where everything we learn from youtube comes from
+----
+tuber and downloader used to reach into pytube objects for names, children,
+availability and streams. They now ask an extractor, which turns urls into
+objects and answers those questions about them, so the library doing the work
+can be swapped out:
+    pytube  - pytube's objects, one watch page per video (the default)
+    yt-dlp  - one YoutubeDL per thread, they aren't thread safe. Channels and playlists
+              are listed with flat extraction, which only reads the listing
+              pages, and videos come back as objects that look enough like
+              pytube's (streams, captions, callbacks) for the downloader
+    fake    - answers from dicts, for tests
+The backend is picked with the `extractor` option. Ids come out the same from
+every backend, so a mirror can switch without its database noticing
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from pytube import Channel, Playlist, YouTube, exceptions, extract
+from pytube.helpers import safe_filename, target_directory
+
+import youmirror.requester as requester  # For sizes youtube didn't tell us
+
+watch_url = "https://www.youtube.com/watch?v={}"  # How pytube spells children
+ydl_options = {  # For every thread's YoutubeDL
+    "quiet": True,
+    "no_warnings": True,
+    "noprogress": True,
+    "skip_download": True,  # We do our own downloading
+    "extract_flat": "in_playlist",  # Children come back as ids, not watch pages
+    "logger": logging.getLogger("youmirror.yt_dlp"),
+}
+unavailable_messages = (  # What yt-dlp says: the pytube exception it means
+    ("private video", exceptions.VideoPrivate),
+    ("members", exceptions.MembersOnly),
+    ("your country", exceptions.VideoRegionBlocked),
+    ("confirm your age", exceptions.AgeRestrictedError),
+    ("live event", exceptions.LiveStreamError),
+    ("unavailable", exceptions.VideoUnavailable),
+    ("removed", exceptions.VideoUnavailable),
+)
+
+
+class Extractor(ABC):
+    """
+    What tuber and downloader need to know about youtube objects
+    A backend that leaves one of these out fails when it's made, not mid sync
+    """
+
+    name = ""  # What the extractor option calls it
+
+    @abstractmethod
+    def load(self, url: str, yt_string: str):
+        """
+        Returns the object for the url, without going online if it can help it
+        """
+
+    @abstractmethod
+    def type_string(self, yt) -> str:
+        """
+        Returns "channel", "playlist" or "single"
+        """
+
+    @abstractmethod
+    def get_id(self, yt) -> str:
+        """
+        Returns the id the mirror knows the object by
+        """
+
+    @abstractmethod
+    def get_name(self, yt) -> str:
+        """
+        Returns the title of a video or playlist, or the name of a channel
+        """
+
+    @abstractmethod
+    def get_url(self, yt) -> str:
+        """
+        Returns the url the mirror stores for the object
+        """
+
+    @abstractmethod
+    def get_children(self, yt) -> list[str]:
+        """
+        Returns the video urls of a channel or playlist
+        """
+
+    @abstractmethod
+    def iter_children(self, yt) -> Iterator[str]:
+        """
+        Yields the video urls newest first, loading pages only as they're reached
+        """
+
+    @abstractmethod
+    def check_availability(self, yt) -> None:
+        """
+        Raises a pytube VideoUnavailable if the video can't be watched
+        """
+
+    @abstractmethod
+    def get_streams(self, yt) -> Iterable:
+        """
+        Returns the video's streams, which look like pytube's
+        """
+
+    def get_stream(self, yt, itag):
+        """
+        Returns the stream with the itag, or None if youtube isn't serving it
+        """
+        return next((s for s in self.get_streams(yt) if s.itag == itag), None)
+
+
+class PytubeExtractor(Extractor):
+    """
+    Everything comes from pytube's objects
+    """
+
+    name = "pytube"
+    objects = {"channel": Channel, "playlist": Playlist, "single": YouTube}
+    type_to_id = {YouTube: "video_id", Channel: "channel_uri", Playlist: "playlist_id"}
+    type_to_name = {YouTube: "title", Channel: "channel_name", Playlist: "title"}
+    type_to_url = {
+        YouTube: "watch_url",
+        Channel: "vanity_url",
+        Playlist: "playlist_url",
+    }
+
+    def load(self, url: str, yt_string: str):
+        return self.objects[yt_string](url)
+
+    def type_string(self, yt) -> str:
+        return {v: k for k, v in self.objects.items()}.get(type(yt))
+
+    def get_id(self, yt) -> str:
+        return getattr(yt, self.type_to_id[type(yt)])
+
+    def get_name(self, yt) -> str:
+        return getattr(yt, self.type_to_name[type(yt)])
+
+    def get_url(self, yt) -> str:
+        return getattr(yt, self.type_to_url[type(yt)])
+
+    def get_children(self, yt) -> list[str]:
+        return [url for url in yt.video_urls]
+
+    def iter_children(self, yt) -> Iterator[str]:
+        return yt.url_generator()
+
+    def check_availability(self, yt) -> None:
+        yt.check_availability()
+
+    def get_streams(self, yt) -> Iterable:
+        return yt.streams
+
+    def get_stream(self, yt, itag):
+        return yt.streams.get_by_itag(itag)
+
+
+class StreamList(list):
+    """
+    The bit of pytube's StreamQuery the downloader uses
+    """
+
+    def get_by_itag(self, itag):
+        return next((s for s in self if s.itag == itag), None)
+
+
+class YtDlpStream:
+    """
+    One of yt-dlp's formats, with the attributes and callbacks of a pytube Stream
+    """
+
+    def __init__(self, fmt: dict, video: "YtDlpVideo") -> None:
+        format_id = fmt["format_id"]
+        self.itag = int(format_id) if format_id.isdigit() else format_id
+        self.url: str = fmt["url"]
+        has_video = fmt.get("vcodec") not in (None, "none")
+        self.includes_audio_track: bool = fmt.get("acodec") not in (None, "none")
+        self.is_progressive: bool = has_video and self.includes_audio_track
+        self.type: str = "video" if has_video else "audio"
+        ext = fmt.get("ext")
+        self.subtype: str = "mp4" if ext == "m4a" else ext  # pytube calls m4a mp4
+        height = fmt.get("height")
+        self.resolution: str = f"{height}p" if has_video and height else None
+        abr = fmt.get("abr")
+        self.abr: str = (
+            f"{round(abr)}kbps" if self.includes_audio_track and abr else None
+        )
+        self._filesize: int = fmt.get("filesize") or 0  # Approximate sizes won't do
+        self.video = video  # For the callbacks
+
+    @property
+    def filesize(self) -> int:
+        if not self._filesize:
+            self._filesize = requester.content_length(self.url)
+        return self._filesize
+
+    def on_progress(self, chunk: bytes, file_handler, bytes_remaining: int) -> None:
+        file_handler.write(chunk)
+        if self.video.on_progress:
+            self.video.on_progress(self, chunk, bytes_remaining)
+
+    def on_complete(self, file_path: str) -> None:
+        if self.video.on_complete:
+            self.video.on_complete(self, file_path)
+
+
+def vtt_to_srt(vtt: str) -> str:
+    """
+    Turns WebVTT captions into srt, which is what pytube writes
+    """
+    cues = list()
+    for block in vtt.replace("\r\n", "\n").split("\n\n"):
+        lines = [line for line in block.split("\n") if line.strip()]
+        timing = next((i for i, line in enumerate(lines) if "-->" in line), None)
+        if timing is None:  # The header, or a note
+            continue
+        start, end = (t.strip().split(" ")[0] for t in lines[timing].split("-->"))
+        start, end = (t if t.count(":") == 2 else f"00:{t}" for t in (start, end))
+        text = "\n".join(lines[timing + 1 :])
+        cues.append(
+            f"{len(cues) + 1}\n{start.replace('.', ',')} --> {end.replace('.', ',')}"
+            f"\n{text}\n"
+        )
+    return "\n".join(cues)
+
+
+class YtDlpCaption:
+    """
+    A caption track from yt-dlp, downloaded like a pytube Caption
+    """
+
+    def __init__(self, code: str, tracks: list[dict]) -> None:
+        self.code: str = code  # Automatic captions get "a." in front, like pytube
+        track = next((t for t in tracks if t.get("ext") == "vtt"), tracks[0])
+        self.name: str = track.get("name") or code
+        self.url: str = track["url"]
+
+    def download(self, title: str, output_path: str = None) -> str:
+        """
+        Writes the captions as srt and returns the path, named like pytube names them
+        """
+        if title.endswith(".srt"):
+            title = title[: -len(".srt")]
+        filename = f"{safe_filename(title)} ({self.code}).srt"
+        file_path = Path(target_directory(output_path)) / filename
+        status, _, body = requester.pool.request("GET", self.url)
+        if status >= 400:
+            raise IOError(f"Could not get captions {self.code}, status {status}")
+        file_path.write_text(vtt_to_srt(body.decode("utf-8")), encoding="utf-8")
+        return str(file_path)
+
+
+class YtDlpVideo:
+    """
+    A video whose details come from yt-dlp, loaded the first time they're needed
+    """
+
+    yt_string = "single"
+
+    def __init__(self, extractor: "YtDlpExtractor", url: str) -> None:
+        self.extractor = extractor
+        self.video_id: str = extract.video_id(url)
+        self.id: str = self.video_id
+        self.watch_url: str = f"https://youtube.com/watch?v={self.video_id}"
+        self._info: dict = None  # Dropped when the object cache shrinks us
+        self._title: str = None  # Pinned so shrinking doesn't lose it
+        self.on_progress = None  # Called like pytube's callbacks
+        self.on_complete = None
+
+    @property
+    def info(self) -> dict:
+        if self._info is None:
+            self._info = self.extractor.extract(self.watch_url, self.video_id)
+            self._title = self._info.get("title")
+        return self._info
+
+    @property
+    def title(self) -> str:
+        return self._title or self.info.get("title")
+
+    @property
+    def length(self) -> int:
+        return self.info.get("duration")
+
+    @property
+    def thumbnail_url(self) -> str:
+        return self.info.get("thumbnail")
+
+    @property
+    def streams(self) -> StreamList:
+        return StreamList(
+            YtDlpStream(fmt, self)
+            for fmt in self.info.get("formats", [])
+            if fmt.get("protocol") in ("http", "https")  # Not manifests
+            and (fmt.get("vcodec"), fmt.get("acodec"))
+            != ("none", "none")  # Storyboards
+        )
+
+    @property
+    def captions(self) -> list[YtDlpCaption]:
+        captions = [
+            YtDlpCaption(code, tracks)
+            for code, tracks in self.info.get("subtitles", {}).items()
+            if tracks
+        ]
+        return captions + [
+            YtDlpCaption(f"a.{code}", tracks)
+            for code, tracks in self.info.get("automatic_captions", {}).items()
+            if tracks
+        ]
+
+    def check_availability(self) -> None:
+        _ = self.info  # Loading it raises the pytube exception if it's unavailable
+
+    def register_on_progress_callback(self, func) -> None:
+        self.on_progress = func
+
+    def register_on_complete_callback(self, func) -> None:
+        self.on_complete = func
+
+
+class YtDlpList:
+    """
+    A channel or playlist listed by yt-dlp
+    """
+
+    def __init__(self, extractor: "YtDlpExtractor", url: str, yt_string: str) -> None:
+        self.extractor = extractor
+        self.yt_string: str = yt_string
+        if yt_string == "channel":
+            self.id: str = extract.channel_name(url)  # Same as pytube's channel_uri
+            self.list_url = f"https://www.youtube.com{self.id}/videos"  # Uploads tab
+        else:
+            self.id: str = extract.playlist_id(url)
+            self.list_url = f"https://www.youtube.com/playlist?list={self.id}"
+        self._info: dict = None  # Flat, so just ids and titles
+
+    @property
+    def info(self) -> dict:
+        if self._info is None:
+            self._info = self.extractor.extract(self.list_url, self.id)
+        return self._info
+
+
+class YtDlpExtractor(Extractor):
+    """
+    Everything comes from YoutubeDL, each thread gets its own the first time it
+    needs one, because YoutubeDL keeps state for the call it's in the middle of
+    """
+
+    name = "yt-dlp"
+
+    def __init__(self) -> None:
+        self.local = threading.local()  # This thread's YoutubeDL
+
+    @property
+    def youtube_dl(self):
+        if (ydl := getattr(self.local, "ydl", None)) is None:
+            from yt_dlp import YoutubeDL  # Only paid for if it's used
+
+            ydl = self.local.ydl = YoutubeDL(dict(ydl_options))
+        return ydl
+
+    def extract(self, url: str, key: str, process: bool = True) -> dict:
+        """
+        Returns yt-dlp's info for the url, unavailable videos raise like pytube
+        """
+        from yt_dlp.utils import DownloadError
+
+        try:
+            return self.youtube_dl.extract_info(url, download=False, process=process)
+        except DownloadError as e:
+            message = str(e).lower()
+            for words, error in unavailable_messages:
+                if words in message:
+                    raise error(key) from e
+            raise
+
+    def load(self, url: str, yt_string: str):
+        if yt_string == "single":
+            return YtDlpVideo(self, url)
+        return YtDlpList(self, url, yt_string)
+
+    def type_string(self, yt) -> str:
+        return yt.yt_string
+
+    def get_id(self, yt) -> str:
+        return yt.id
+
+    def get_name(self, yt) -> str:
+        if yt.yt_string == "single":
+            return yt.title
+        if yt.yt_string == "channel":
+            return yt.info.get("channel") or yt.info.get("uploader")
+        return yt.info.get("title")
+
+    def get_url(self, yt) -> str:
+        if yt.yt_string == "single":
+            return yt.watch_url
+        if yt.yt_string == "channel":
+            return yt.info.get("uploader_url") or yt.info.get("channel_url")
+        return yt.list_url
+
+    def get_children(self, yt) -> list[str]:
+        return [watch_url.format(entry["id"]) for entry in yt.info["entries"]]
+
+    def iter_children(self, yt) -> Iterator[str]:
+        info = self.extract(yt.list_url, yt.id, process=False)  # Entries page lazily
+        for entry in info.get("entries") or []:
+            yield watch_url.format(entry["id"])
+
+    def check_availability(self, yt) -> None:
+        yt.check_availability()
+
+    def get_streams(self, yt) -> Iterable:
+        return yt.streams
+
+    def get_stream(self, yt, itag):
+        return yt.streams.get_by_itag(itag)
+
+
+class FakeItem:
+    """
+    Something the fake extractor knows about
+    """
+
+    def __init__(self, yt_string: str, id: str, details: dict) -> None:
+        self.yt_string: str = yt_string
+        self.id: str = id
+        self.video_id: str = id
+        self.details: dict = details
+
+    def register_on_progress_callback(self, func) -> None:
+        pass
+
+    def register_on_complete_callback(self, func) -> None:
+        pass
+
+
+class FakeExtractor(Extractor):
+    """
+    Answers from dicts instead of youtube, so tests never go online
+    items = {id: {"name", "url", "children", "available", "streams"}}
+    """
+
+    name = "fake"
+
+    def __init__(self, items: dict = None) -> None:
+        self.items: dict[str, dict] = items or dict()
+        self.loads: int = 0  # How many objects were asked for
+
+    def load(self, url: str, yt_string: str):
+        self.loads += 1
+        id = {
+            "channel": extract.channel_name,
+            "playlist": extract.playlist_id,
+            "single": extract.video_id,
+        }[yt_string](url)
+        if id not in self.items:
+            raise exceptions.VideoUnavailable(id)
+        return FakeItem(yt_string, id, self.items[id])
+
+    def type_string(self, yt) -> str:
+        return yt.yt_string
+
+    def get_id(self, yt) -> str:
+        return yt.id
+
+    def get_name(self, yt) -> str:
+        return yt.details.get("name")
+
+    def get_url(self, yt) -> str:
+        return yt.details.get("url")
+
+    def get_children(self, yt) -> list[str]:
+        return list(yt.details.get("children", []))
+
+    def iter_children(self, yt) -> Iterator[str]:
+        return iter(self.get_children(yt))
+
+    def check_availability(self, yt) -> None:
+        if not yt.details.get("available", True):
+            raise exceptions.VideoPrivate(yt.id)
+
+    def get_streams(self, yt) -> Iterable:
+        return StreamList(yt.details.get("streams", []))
+
+
+backends = {  # Extractor option: class
+    "pytube": PytubeExtractor,
+    "yt-dlp": YtDlpExtractor,
+    "fake": FakeExtractor,
+}
+backend: Extractor = PytubeExtractor()  # What tuber and downloader ask
+
+
+def configure(options: dict) -> Extractor:
+    """
+    Switches to the extractor the options ask for, keeping it if it's the same one
+    """
+    global backend
+    name = options.get("extractor", "pytube")
+    if name not in backends:
+        logging.error(
+            f"Unknown extractor '{name}', valid extractors = {list(backends)}"
+        )
+    elif backend.name != name:
+        backend = backends[name]()
+    return backend
+
+
+def use(extractor: Extractor) -> Extractor:
+    """
+    Switches to the given extractor, like a fake one in tests
+    Returns the one that was in use so it can be put back
+    """
+    global backend
+    previous, backend = backend, extractor
+    return previous
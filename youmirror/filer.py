@@ -23,8 +23,10 @@ This is what the filetree looks like:
 """
 
 from pathlib import Path
-from pytube.helpers import safe_filename
 import logging
+from youmirror.importer import lazy  # pytube takes a while to import
+
+helpers = lazy("pytube.helpers")  # For safe_filename
 
 valid_file_types = {"video", "caption", "audio", "thumbnail"}  # Valid file types
 
@@ -69,10 +71,10 @@ def calculate_path(yt_string: str, parent_name: str, single_name) -> str:
     This is gonna be refactored cause I'm not using it the intended way in get_keys()
     """
     valid_yt_strings = {"channel", "playlist", "single"}  # Valid yt strings
-    parent_name = safe_filename(parent_name).replace(
+    parent_name = helpers.safe_filename(parent_name).replace(
         " ", "_"
     )  # Sanitize the parent name (using pytube)
-    single_name = safe_filename(single_name).replace(
+    single_name = helpers.safe_filename(single_name).replace(
         " ", "_"
     )  # Sanitize the single name (using pytube)
     if yt_string in valid_yt_strings:  # Check the yt_string is valid
@@ -97,7 +99,9 @@ def calculate_filename(file_type: str, yt_name: str) -> str:
         "thumbnail": "jpg",
     }
     if file_type in valid_file_types:  # Verify the file type is valid
-        filename = safe_filename(yt_name).replace(" ", "_")  # Sanitize the filename
+        filename = helpers.safe_filename(yt_name).replace(
+            " ", "_"
+        )  # Sanitize the filename
         extension = file_type_to_extension[
             file_type
         ]  # Convert the file type to an extension
@@ -0,0 +1,53 @@
+"""
+This module puts off importing the heavy dependencies until they're used
+----
+pytube, yt-dlp, sqlitedict and tomlkit take a few hundred ms to import between
+them, and `youmirror --help` needs none of them while `youmirror show` only
+needs the config. Every command used to pay for all of them anyway, because
+core imported everything up front.
+----
+lazy() returns a stand in for a module that imports the real one the first time
+one of its attributes is looked up, so a module can still say
+    tuber = lazy("youmirror.tuber")  # Manages pytube objects
+at the top and call tuber.get_id() like before. Anything only needed for type
+hints goes under `if TYPE_CHECKING`
+"""
+
+import importlib
+import threading
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    Imports the module it stands for on first use, from whichever thread gets there
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name: str = name  # What to import
+        self._module: ModuleType = None  # The real module once it's imported
+        self._lock = threading.Lock()  # Download workers can get there together
+
+    def _load(self) -> ModuleType:
+        """
+        Returns the real module, importing it the first time
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self) -> str:
+        state = "imported" if self._module is not None else "not imported yet"
+        return f"<lazy module '{self._name}', {state}>"
+
+
+def lazy(name: str) -> LazyModule:
+    """
+    Returns a stand in for the module that only imports it when it's used
+    """
+    return LazyModule(name)
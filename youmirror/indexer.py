@@ -0,0 +1,129 @@
+"""
+This module builds an index of the streams youtube serves for a video
+----
+pytube only lets us find a stream by filtering the whole stream list, and we used
+to filter it several times per video (once per resolution while looking for one,
+then again for the audio and again for the filesize). The index is built once from
+the stream manifest and answers all of those questions with dictionary lookups.
+----
+It only holds plain values (itags and specs, no urls because those expire) so it
+can be saved with the video's entry in the database and loaded back later
+"""
+
+from typing import Iterable, Optional
+
+fields = (
+    "itag",
+    "type",
+    "subtype",
+    "resolution",
+    "abr",
+    "progressive",
+    "includes_audio_track",
+    "filesize",
+)  # What we keep from every stream
+
+
+def rank(value: Optional[str]) -> int:
+    """
+    Turns a resolution or bitrate like "720p" or "128kbps" into a number for sorting
+    """
+    digits = "".join(c for c in value or "" if c.isdigit())
+    return int(digits) if digits else 0
+
+
+class StreamIndex:
+    """
+    Lookup tables over a video's streams, keyed by resolution, subtype,
+    progressive/adaptive and audio bitrate
+    """
+
+    def __init__(self, streams: list[dict]) -> None:
+        self.streams: dict[int, dict] = dict()  # itag -> specs
+        self.video: dict[tuple[str, str], list[int]] = dict()  # (res, subtype)
+        self.progressive: dict[str, list[int]] = dict()  # subtype, low to high res
+        self.audio: dict[str, list[int]] = dict()  # subtype, low to high abr
+        for specs in streams:  # Keep manifest order, the filters relied on it
+            itag = specs["itag"]
+            self.streams[itag] = specs
+            subtype = specs["subtype"]
+            if specs["type"] == "video":
+                key = (specs["resolution"], subtype)
+                self.video.setdefault(key, []).append(itag)
+                if specs["progressive"]:
+                    self.progressive.setdefault(subtype, []).append(itag)
+            elif specs["includes_audio_track"]:  # Audio only
+                self.audio.setdefault(subtype, []).append(itag)
+        for itags in self.progressive.values():
+            itags.sort(key=lambda i: rank(self.streams[i]["resolution"]))
+        for itags in self.audio.values():
+            itags.sort(key=lambda i: rank(self.streams[i]["abr"]))
+
+    @classmethod
+    def from_streams(cls, streams: Iterable) -> "StreamIndex":
+        """
+        Builds the index from pytube Stream objects
+        """
+        return cls(
+            [
+                {
+                    "itag": stream.itag,
+                    "type": stream.type,
+                    "subtype": stream.subtype,
+                    "resolution": stream.resolution,
+                    "abr": stream.abr,
+                    "progressive": stream.is_progressive,
+                    "includes_audio_track": stream.includes_audio_track,
+                    "filesize": stream._filesize,  # Don't make pytube ask the server
+                }
+                for stream in streams
+            ]
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StreamIndex":
+        """
+        Loads an index that was saved with to_dict
+        """
+        return cls([dict(zip(fields, values)) for values in data["streams"]])
+
+    def to_dict(self) -> dict:
+        """
+        Returns the index as plain values that can be saved to the database
+        """
+        return {
+            "streams": [
+                [specs[field] for field in fields] for specs in self.streams.values()
+            ]
+        }
+
+    def get_video(
+        self, resolutions: Iterable[str], subtype: str = "mp4"
+    ) -> Optional[int]:
+        """
+        Returns the itag of the first video stream found, trying each resolution in order
+        """
+        for resolution in resolutions:
+            if itags := self.video.get((resolution, subtype)):
+                return itags[0]
+        return None
+
+    def get_progressive(self, subtype: str = "mp4") -> Optional[int]:
+        """
+        Returns the itag of the highest resolution progressive stream
+        """
+        itags = self.progressive.get(subtype)
+        return itags[-1] if itags else None
+
+    def get_audio(self, subtype: str = "mp4") -> Optional[int]:
+        """
+        Returns the itag of the highest bitrate audio stream
+        """
+        itags = self.audio.get(subtype)
+        return itags[-1] if itags else None
+
+    def get(self, itag: int) -> Optional[dict]:
+        """
+        Returns the specs for the itag
+        """
+        return self.streams.get(itag)
@@ -0,0 +1,143 @@
+"""
+This module packs a channel's or playlist's children into a sorted array of ids
+----
+Children are watch urls, "https://www.youtube.com/watch?v=" and an 11 character
+video id. Kept as a list or set of those, a 20k video channel is a few MB of
+Python strings, all of which get pickled again every time update adds a video.
+VideoIds keeps just the ids, sorted and back to back in one bytes object, which
+is what databaser saves for the children column.
+----
+`url in children` is a binary search and iterating gives the urls back one at a
+time, so neither makes the whole list of strings. union() merges new videos in
+without unpacking the ids it already has.
+Only children that are all spelled exactly like watch_url pack, so the urls
+come back exactly as they went in. Anything else is kept as a plain set.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+watch_url = "https://www.youtube.com/watch?v={}"  # How pytube spells children
+prefix = watch_url.format("")  # What every child starts with
+id_size = 11  # Bytes in a video id
+id_characters = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+)  # All a video id is made of
+
+
+class VideoIds:
+    """
+    A sorted, packed set of video ids that looks like a collection of watch urls
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes = b"") -> None:
+        if len(data) % id_size:
+            raise ValueError(f"Packed ids are {id_size} bytes each, got {len(data)}")
+        self.data: bytes = bytes(data)  # Sorted ids, back to back, no duplicates
+
+    @classmethod
+    def from_urls(cls, urls: Iterable[str]) -> VideoIds:
+        """
+        Packs watch urls, raises ValueError if one isn't spelled like watch_url
+        """
+        return cls(b"".join(sorted({video_id(url) for url in urls})))
+
+    def __len__(self) -> int:
+        return len(self.data) // id_size
+
+    def __bool__(self) -> bool:
+        return bool(self.data)
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Yields the watch urls in id order, one at a time
+        """
+        data = self.data
+        for start in range(0, len(data), id_size):
+            yield prefix + data[start : start + id_size].decode("ascii")
+
+    def __contains__(self, url: str) -> bool:
+        try:
+            target = video_id(url)
+        except (TypeError, ValueError):
+            return False  # Not a watch url, so it can't be one of ours
+        start = self.position(target) * id_size
+        return self.data[start : start + id_size] == target
+
+    def position(self, target: bytes) -> int:
+        """
+        Returns where the id is, or would go, binary searching the packed ids
+        """
+        data, low, high = self.data, 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if data[middle * id_size : (middle + 1) * id_size] < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def union(self, urls: Iterable[str]):
+        """
+        Returns a new VideoIds with the urls added
+        Only the new ids get sorted, then each is spliced in where it goes
+        A url that doesn't pack turns the result into a plain set, like pack()
+        """
+        urls = [url for url in urls if url not in self]
+        try:
+            new = sorted({video_id(url) for url in urls})
+        except (TypeError, ValueError):
+            return set(self).union(urls)
+        if not new:
+            return self
+        data, pieces, start = self.data, list(), 0
+        for new_id in new:
+            at = self.position(new_id) * id_size
+            pieces += [data[start:at], new_id]
+            start = at
+        pieces.append(data[start:])
+        return VideoIds(b"".join(pieces))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, VideoIds):
+            return self.data == other.data
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.data)
+
+    def __repr__(self) -> str:
+        return f"<VideoIds, {len(self)} videos>"
+
+    def __reduce__(self):
+        return VideoIds, (self.data,)  # Pickles as its bytes
+
+
+def video_id(url: str) -> bytes:
+    """
+    Returns the packed id of a watch url, raises ValueError if it isn't one
+    """
+    if (
+        len(url) != len(prefix) + id_size
+        or not url.startswith(prefix)
+        or not id_characters.issuperset(url[len(prefix) :])
+    ):
+        raise ValueError(f"Not a watch url: {url}")
+    return url[len(prefix) :].encode("ascii")
+
+
+def pack(children: Iterable[str]):
+    """
+    Returns the children as VideoIds, or as a set if they don't all pack
+    Either way `in` and union() work on what comes back
+    """
+    if isinstance(children, VideoIds):
+        return children
+    children = list(children)
+    try:
+        return VideoIds.from_urls(children)
+    except (TypeError, ValueError):
+        return set(children)
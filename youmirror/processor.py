@@ -0,0 +1,145 @@
+"""
+This module runs the cpu heavy steps that come after a download, like muxing
+----
+Downloading is waiting on the network and ffmpeg is work for the cpu, so running
+ffmpeg from inside the download loop meant one was always waiting on the other.
+Download workers now hand a file's post-processing steps to a small pool of
+threads, one per core, and go straight back to downloading.
+----
+The steps only wait on ffmpeg, which runs in its own process through subprocess,
+so threads are all the pool needs. A process pool would have to fork a process
+that's holding the download threads' locks, which can deadlock.
+Steps are (name, args) pairs, the name picks the function from the steps table
+at the bottom. New transforms only need a function and an entry in that table.
+"""
+
+import os
+import shutil
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+
+def mux_command(video_file: str, audio_file: str, output: str) -> list[str]:
+    """
+    Returns the ffmpeg command that copies the video and audio into one mp4
+    """
+    return [
+        "ffmpeg",
+        "-y",
+        "-i",
+        f"{video_file}",
+        "-i",
+        f"{audio_file}",
+        "-c:v",
+        "copy",
+        "-c:a",
+        "copy",
+        "-f",
+        "mp4",  # Output goes to a .part file, so ffmpeg can't guess the format
+        f"{output}",
+    ]
+
+
+def trim_command(input_file: str, length: int, output: str) -> list[str]:
+    """
+    Returns the ffmpeg command that cuts the audio off at the given length
+    """
+    return [
+        "ffmpeg",
+        "-y",
+        "-i",
+        f"{input_file}",
+        "-t",
+        f"{length}",
+        "-c",
+        "copy",
+        "-f",
+        "mp4",
+        f"{output}",
+    ]
+
+
+def run_ffmpeg(command: list[str], part: Path, output: str) -> str:
+    """
+    Runs an ffmpeg command writing to the part file, then moves it to the output
+    """
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode:
+        part.unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace')}")
+    os.replace(part, output)  # Atomic rename into place
+    return output
+
+
+def combine_video_audio(video_file: str, audio_file: str, output: str) -> str:
+    """
+    Combines the video and audio files into the output file
+    """
+    part = Path(f"{output}.part")  # Only rename to the output when ffmpeg is done
+    return run_ffmpeg(mux_command(video_file, audio_file, str(part)), part, output)
+
+
+def remux(video_file: str, audio_file: str, output: str, scratch: str) -> str:
+    """
+    Combines the downloaded pieces and cleans up the scratch directory after
+    """
+    combine_video_audio(video_file, audio_file, output)
+    shutil.rmtree(scratch, ignore_errors=True)
+    return output
+
+
+def trim_audio(filepath: str, length: int) -> str:
+    """
+    Trims the audio to the length youtube reports, the streams often run long
+    """
+    if not length:  # Nothing to trim to
+        return filepath
+    part = Path(f"{filepath}.trim.part")  # Can't write over the file we're reading
+    return run_ffmpeg(trim_command(filepath, length, str(part)), part, filepath)
+
+
+def run(steps: list[tuple[str, tuple]]) -> None:
+    """
+    Runs a file's post-processing steps in order, this is what the pool runs
+    """
+    for name, args in steps:
+        steps_table[name](*args)
+
+
+class Processor:
+    """
+    A pool of threads that runs post-processing steps, sized to the core count
+    """
+
+    def __init__(self, workers: int = None) -> None:
+        self.workers: int = (
+            workers or os.cpu_count() or 1
+        )  # ffmpegs at once, one a core
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="youmirror-process"
+        )
+
+    def __enter__(self) -> "Processor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+
+    def submit(self, steps: list[tuple[str, tuple]]) -> Future:
+        """
+        Queues a file's steps, the future finishes when they have all run
+        """
+        return self.pool.submit(run, steps)
+
+    def shutdown(self) -> None:
+        """
+        Waits for everything queued to finish
+        """
+        self.pool.shutdown(wait=True)
+
+
+steps_table = {  # Step name: function
+    "remux": remux,
+    "trim": trim_audio,
+}
@@ -0,0 +1,144 @@
+"""
+This module keeps a pool of keep-alive connections for small requests
+----
+Checking the size of thousands of files with urlopen means a new TCP and TLS
+handshake for every file, and a full GET when all we wanted was the headers.
+The pool here hands out persistent http.client connections per host, so the
+thousandth HEAD request reuses a connection that is already open.
+----
+"""
+
+import http.client
+import logging
+import threading
+from urllib.parse import urljoin, urlsplit
+
+user_agent = "Mozilla/5.0"  # Same as pytube uses
+max_redirects = 5
+max_drain = 65536  # Bigger bodies close the connection instead of being read
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive connections, grouped by scheme and host
+    """
+
+    def __init__(self, per_host: int = 8, timeout: float = 30) -> None:
+        self.per_host: int = per_host  # Most idle connections kept for one host
+        self.timeout: float = timeout  # Seconds to wait on a stalled connection
+        self.idle: dict[tuple[str, str], list] = dict()  # Connections ready for reuse
+        self.lock = threading.Lock()
+
+    def acquire(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        """
+        Returns an idle connection to the host or opens a new one
+        """
+        with self.lock:
+            if connections := self.idle.get((scheme, host)):
+                return connections.pop()
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, timeout=self.timeout)
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    def release(self, scheme: str, host: str, conn: http.client.HTTPConnection):
+        """
+        Puts the connection back so someone else can use it
+        """
+        with self.lock:
+            connections = self.idle.setdefault((scheme, host), [])
+            if len(connections) < self.per_host:
+                connections.append(conn)
+                return
+        conn.close()  # We have enough for this host
+
+    def request(self, method: str, url: str, headers: dict = None) -> tuple:
+        """
+        Makes a request and returns the status, the headers (lowercased) and the body
+        Redirects are followed
+        """
+        for _ in range(max_redirects + 1):
+            parts = urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path = f"{path}?{parts.query}"
+            status, response_headers, body = self._send(
+                parts.scheme, parts.netloc, method, path, headers or {}
+            )
+            if status in (301, 302, 303, 307, 308) and "location" in response_headers:
+                url = urljoin(url, response_headers["location"])
+                continue
+            return status, response_headers, body
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+    def close(self) -> None:
+        """
+        Closes every idle connection
+        """
+        with self.lock:
+            idle, self.idle = self.idle, dict()
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def _send(self, scheme, host, method, path, headers) -> tuple:
+        """
+        Sends one request, retrying once if a reused connection went stale
+        A connection that failed or timed out is closed and never goes back in the pool
+        """
+        headers = {"User-Agent": user_agent, **headers}
+        for attempt in range(2):
+            conn = self.acquire(scheme, host)
+            try:
+                conn.request(method, path, headers=headers)
+                response = conn.getresponse()
+                if (response.length or 0) > max_drain:  # Not worth reading, drop it
+                    conn.close()
+                    return response.status, self._headers(response), b""
+                body = response.read()  # Drain it so the connection can be reused
+            except (http.client.HTTPException, OSError) as e:  # Timeouts too
+                conn.close()
+                if attempt:  # A fresh connection failed too
+                    raise
+                logging.debug(f"Retrying {host} on a new connection due to {e}")
+                continue
+            if response.will_close:
+                conn.close()
+            else:
+                self.release(scheme, host, conn)
+            return response.status, self._headers(response), body
+
+    @staticmethod
+    def _headers(response: http.client.HTTPResponse) -> dict:
+        """
+        Returns the response headers with lowercased names
+        """
+        return {k.lower(): v for k, v in response.getheaders()}
+
+
+pool = ConnectionPool()  # Shared by the whole process
+
+
+def head(url: str) -> dict:
+    """
+    Returns the headers of a HEAD request for the url
+    """
+    status, headers, _ = pool.request("HEAD", url)
+    if status >= 400:
+        raise http.client.HTTPException(f"HEAD {url} returned {status}")
+    return headers
+
+
+def content_length(url: str) -> int:
+    """
+    Returns the size of the file at the url without downloading it
+    Servers that won't answer a HEAD get a zero-length range request instead
+    """
+    status, headers, _ = pool.request("HEAD", url)
+    if status < 400 and "content-length" in headers:
+        return int(headers["content-length"])
+    status, headers, _ = pool.request("GET", url, {"Range": "bytes=0-0"})
+    if status == 206 and "content-range" in headers:  # "bytes 0-0/12345"
+        return int(headers["content-range"].rsplit("/", 1)[1])
+    if status < 400 and "content-length" in headers:  # Range was ignored
+        return int(headers["content-length"])
+    raise http.client.HTTPException(f"Could not get the size of {url} ({status})")
@@ -0,0 +1,138 @@
+"""
+This module decides what a failed download means and when to try it again
+----
+Failures fall into four kinds:
+    transient   - timeouts, dropped connections, 5xx errors. Try again soon
+    throttled   - youtube told us to slow down (429/403). Back off harder
+    unavailable - private, removed, region locked, no caption in that language.
+                  These rarely come back, so wait a long time between tries
+    extractor   - pytube couldn't make sense of the page. Usually fixed by a pytube
+                  update, so there's no point retrying every night
+Every failed attempt doubles the wait for that file, up to a cap for its kind
+"""
+
+import http.client
+import time
+from email.utils import parsedate_to_datetime  # Retry-After can be an http date
+from urllib.error import HTTPError, URLError
+
+from pytube import exceptions
+
+fields = ("failure", "attempts", "retry_after", "error")  # Kept on the file entry
+
+minute = 60
+hour = 60 * minute
+day = 24 * hour
+backoff = {  # kind: (first wait, longest wait) in seconds
+    "transient": (5 * minute, day),
+    "throttled": (30 * minute, day),
+    "unavailable": (day, 30 * day),
+    "extractor": (6 * hour, 7 * day),
+}
+
+
+class Unavailable(Exception):
+    """
+    Raised when youtube has nothing for us to download
+    """
+
+
+def classify(e: Exception) -> str:
+    """
+    Returns what kind of failure the exception is
+    """
+    if isinstance(e, (exceptions.VideoUnavailable, Unavailable)):
+        return "unavailable"  # Private, members only, age or region locked, etc.
+    if isinstance(e, (exceptions.ExtractError, exceptions.HTMLParseError)):
+        return "extractor"
+    if isinstance(e, HTTPError):
+        if e.code in (403, 429):
+            return "throttled"
+        if e.code in (404, 410):
+            return "unavailable"
+        return "transient"
+    if isinstance(
+        e,
+        (
+            URLError,
+            TimeoutError,
+            ConnectionError,
+            http.client.HTTPException,
+            exceptions.MaxRetriesExceeded,
+        ),
+    ):
+        return "transient"
+    if isinstance(e, (KeyError, IndexError, TypeError, AttributeError)):
+        return "extractor"  # pytube choked on something youtube changed
+    return "transient"
+
+
+def retry_delay(kind: str, attempts: int) -> float:
+    """
+    Returns how many seconds to wait before trying again
+    """
+    first, longest = backoff.get(kind, backoff["transient"])
+    return min(longest, first * 2 ** max(0, attempts - 1))
+
+
+def retry_after(value: str, now: float = None) -> float:
+    """
+    Returns the seconds a Retry-After value asks for, it's seconds or an http date
+    """
+    if not value:
+        return 0
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return 0  # Neither, ignore it
+    now = time.time() if now is None else now
+    return max(0, when - now)
+
+
+def retry_hint(e: Exception) -> float:
+    """
+    Returns how long the server asked us to wait with Retry-After, or 0
+    """
+    try:
+        return retry_after(e.headers["Retry-After"])
+    except (AttributeError, KeyError, TypeError):
+        return 0  # Not an http error or no header
+
+
+def failure(e: Exception) -> dict:
+    """
+    Returns the specs for a failed download
+    """
+    specs = {
+        "downloaded": False,
+        "failure": classify(e),
+        "error": f"{type(e).__name__}: {e}",
+    }
+    if hint := retry_hint(e):
+        specs["retry_hint"] = hint
+    return specs
+
+
+def record(file: dict, now: float = None) -> dict:
+    """
+    Records a failed attempt on the file entry and schedules the next one
+    """
+    now = time.time() if now is None else now
+    file["attempts"] = file.get("attempts", 0) + 1
+    delay = retry_delay(file["failure"], file["attempts"])
+    delay = max(delay, file.pop("retry_hint", 0))  # Respect the server if it asked
+    file["retry_after"] = now + delay
+    return file
+
+
+def clear(file: dict) -> dict:
+    """
+    Drops the failure bookkeeping from a file that downloaded
+    """
+    for field in fields:
+        file.pop(field, None)
+    return file
@@ -0,0 +1,183 @@
+"""
+This module schedules downloads across a pool of worker threads
+----
+Downloading is mostly waiting on the network, so threads are plenty here.
+Every worker figures out which host its file is coming from and holds a slot for
+that host while it downloads, so we never point the whole pool at one server.
+Files that still need post-processing (muxing, trimming) are handed to the
+processor, so the worker can start its next download while ffmpeg runs.
+Finished files, and failed ones along with why they failed, are handed to a single
+writer thread, which is the only thing that records results, so the database only
+ever has one writer. record can hold results back to commit them in groups, the
+writer calls flush when it's been idle for flush_seconds and once more at the end.
+----
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Callable
+
+import youmirror.downloader as downloader  # Does the downloading
+import youmirror.retrier as retrier  # Classifies failed downloads
+from youmirror.processor import Processor  # Runs ffmpeg off the download workers
+from youmirror.tracker import file_label, metrics  # Counts finished files
+
+_done = object()  # Tells the writer thread to stop
+
+
+class Scheduler:
+    """
+    Runs downloads concurrently and records the results from one thread
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        resolve: Callable,
+        record: Callable,
+        jobs: int = 1,
+        per_host: int = 1,
+        processor: Processor = None,
+        flush: Callable = None,
+        flush_seconds: float = 1,
+    ) -> None:
+        self.root: Path = root  # Mirror root, files are relative to this
+        self.resolve: Callable = resolve  # Turns a url into a pytube object
+        self.record: Callable = record  # Saves a finished file (writer only)
+        self.flush: Callable = flush  # Commits whatever record is holding back
+        self.flush_seconds: float = flush_seconds  # How often to check while idle
+        self.jobs: int = max(1, int(jobs))  # Number of download workers
+        self.per_host: int = max(1, int(per_host))  # Downloads allowed per host
+        self.hosts: dict[str, threading.BoundedSemaphore] = dict()  # Host slots
+        self.hosts_lock = threading.Lock()  # Guards the host slots
+        self.results: Queue = Queue()  # Finished downloads waiting to be recorded
+        self.failed: list[str] = list()  # Files that could not be downloaded
+        self.processor: Processor = processor or Processor()  # Post-processing
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="youmirror-download"
+        )
+        self.writer = threading.Thread(
+            target=self._write, name="youmirror-writer"
+        )  # Not a daemon, so exiting still waits for the last flush
+        self.writer.start()
+
+    def __enter__(self) -> "Scheduler":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.join(cancel=exc_type is not None)  # Like a Ctrl-C, stop what we can
+
+    def submit(self, filepath: str, file: dict, options: dict) -> None:
+        """
+        Queues a file for downloading
+        """
+        metrics.queued(file.get("filesize", 0))
+        self.pool.submit(self._download, filepath, file, options)
+
+    def join(self, cancel: bool = False) -> None:
+        """
+        Waits for every download to finish and be recorded
+        With cancel, queued downloads that haven't started are dropped instead
+        Whatever did finish is always recorded and flushed
+        """
+        try:
+            self.pool.shutdown(wait=True, cancel_futures=cancel)  # Wait on the workers
+            self.processor.shutdown()  # And on anything they left for the processor
+        finally:
+            self.results.put(_done)  # Then let the writer drain the queue
+            self.writer.join()
+
+    @contextmanager
+    def host_slot(self, host: str):
+        """
+        Holds one of the download slots for the given host
+        """
+        with self.hosts_lock:
+            if host not in self.hosts:
+                self.hosts[host] = threading.BoundedSemaphore(self.per_host)
+            slot = self.hosts[host]
+        with slot:
+            yield
+
+    def _download(self, filepath: str, file: dict, options: dict) -> None:
+        """
+        Downloads a single file, runs on a worker thread
+        """
+        file_type = file["type"]  # Get the file type "video", "audio", etc.
+        started = time.monotonic()  # Files are timed until they're recorded
+        try:
+            if not (yt := self.resolve(file["parent"])):  # Get the pytube object
+                raise ConnectionError(f"Could not load {file['parent']}")
+            host = downloader.get_host(yt, file_type, options)  # Where it comes from
+            print(f"Downloading {file_type} {filepath}")
+            with self.host_slot(host):
+                specs = downloader.download_single(
+                    yt, file_type, str(self.root / Path(filepath)), options
+                )
+        except Exception as e:
+            logging.exception(f"Could not download {file_type} {filepath} due to {e}")
+            specs = retrier.failure(e)  # Record why, so we know when to try again
+        steps = specs.pop("postprocess", None)
+        if steps and specs["downloaded"]:  # Let the processor finish it off
+            future = self.processor.submit(steps)
+            future.add_done_callback(
+                partial(self._processed, filepath, file, specs, started)
+            )
+            return
+        self.results.put((filepath, file, specs, started))
+
+    def _processed(self, filepath, file, specs, started, future) -> None:
+        """
+        Passes a post-processed file on to the writer
+        """
+        try:
+            future.result()  # Raises whatever the step raised
+        except Exception as e:
+            logging.exception(f"Could not process {file['type']} {filepath} due to {e}")
+            specs = retrier.failure(e)
+        self.results.put((filepath, file, specs, started))
+
+    def _write(self) -> None:
+        """
+        Records finished downloads, this is the only thread that calls record
+        """
+        while True:
+            try:
+                item = self.results.get(timeout=self.flush_seconds)
+            except Empty:  # Nothing finished lately, don't sit on what we have
+                self._flush(due=True)
+                continue
+            if item is _done:
+                break
+            filepath, file, specs, started = item
+            file.update(specs)  # Update the file info with the specs
+            label = file_label(file["type"], file)
+            metrics.finished(label, time.monotonic() - started, file["downloaded"])
+            if not file["downloaded"]:
+                filename = str(Path(filepath).name)  # Just the filename for printing
+                print(
+                    f"Could not download {file['type']} {filename} ({file['failure']})"
+                )
+                self.failed.append(filepath)
+            try:
+                self.record(filepath, file)  # Successes and failures both get saved
+            except Exception as e:
+                logging.exception(f"Could not record file {filepath} due to {e}")
+        self._flush()  # Everything left goes in before join returns
+
+    def _flush(self, due: bool = False) -> None:
+        """
+        Commits the results record is holding, with due only the ones that are due
+        """
+        if self.flush is None:
+            return
+        try:
+            self.flush(due)
+        except Exception as e:
+            logging.exception(f"Could not save finished files due to {e}")
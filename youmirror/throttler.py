@@ -0,0 +1,126 @@
+"""
+This module limits how fast youmirror downloads
+----
+Every download path takes tokens from one shared bucket before it writes a chunk,
+so the limit holds across all the download workers at once. The rate can change
+with the time of day, so a mirror can go full speed overnight and back off
+during the day.
+----
+Rates look like "500K", "20M" or "1.5G" (bytes per second), 0 means unlimited
+Schedules look like "00:00-07:00=0, 07:00-24:00=20M" or the same thing as a
+toml table {"00:00-07:00" = "0", "07:00-24:00" = "20M"}. Any time the schedule
+doesn't cover falls back to the regular rate
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+units = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}  # Rate suffixes
+
+
+def parse_rate(rate) -> float:
+    """
+    Turns a rate like "20M" into bytes per second, anything empty is unlimited (0)
+    """
+    if not rate:
+        return 0
+    if isinstance(rate, (int, float)):
+        return float(rate)
+    rate = str(rate).strip().upper().removesuffix("/S").removesuffix("B")
+    unit = rate[-1] if rate and rate[-1] in units else ""
+    return float(rate.removesuffix(unit) or 0) * units[unit]
+
+
+def parse_minutes(clock: str) -> int:
+    """
+    Turns a time like "07:30" into minutes past midnight
+    """
+    hours, minutes = clock.strip().split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_schedule(schedule) -> list[tuple[int, int, float]]:
+    """
+    Turns a schedule into a list of (start minute, end minute, rate)
+    """
+    if not schedule:
+        return []
+    if isinstance(schedule, str):  # "00:00-07:00=0, 07:00-24:00=20M"
+        schedule = dict(item.split("=") for item in schedule.split(",") if item.strip())
+    windows = []
+    for window, rate in schedule.items():
+        start, end = window.split("-")
+        windows.append((parse_minutes(start), parse_minutes(end), parse_rate(rate)))
+    return windows
+
+
+class TokenBucket:
+    """
+    A token bucket that holds up to a second's worth of bytes
+    Takers are allowed to go into debt and then sleep it off, so big chunks still
+    go through and the average rate stays where it should be
+    """
+
+    def __init__(self, rate=0, schedule=None) -> None:
+        self.rate: float = parse_rate(rate)  # Bytes per second, 0 is unlimited
+        self.schedule: list = parse_schedule(schedule)  # Time of day overrides
+        self.tokens: float = 0  # Bytes we're allowed to take right now
+        self.last: float = time.monotonic()  # When we last topped up
+        self.lock = threading.Lock()
+
+    def current_rate(self, now: datetime = None) -> float:
+        """
+        Returns the rate for the time of day
+        """
+        if self.schedule:
+            now = now or datetime.now()
+            minute = now.hour * 60 + now.minute
+            for start, end, rate in self.schedule:
+                if start <= minute < end or (end < start and not end <= minute < start):
+                    return rate  # The second check handles windows past midnight
+        return self.rate
+
+    def consume(self, n: int) -> float:
+        """
+        Takes n bytes worth of tokens, sleeping if we're over the rate
+        Returns how long we slept
+        """
+        with self.lock:
+            rate = self.current_rate()
+            now = time.monotonic()
+            if not rate:  # Unlimited
+                self.last = now
+                return 0
+            self.tokens = min(rate, self.tokens + (now - self.last) * rate)
+            self.last = now
+            self.tokens -= n
+            wait = -self.tokens / rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+bucket = TokenBucket()  # Shared by every download in the process
+
+
+def configure(options: dict) -> None:
+    """
+    Sets the shared bucket up from the active options
+    """
+    global bucket
+    try:
+        bucket = TokenBucket(
+            options.get("max_bandwidth"), options.get("bandwidth_schedule")
+        )
+    except (ValueError, KeyError) as e:
+        logging.error(f"Invalid bandwidth limit, downloading without one ({e})")
+        bucket = TokenBucket()
+
+
+def consume(n: int) -> float:
+    """
+    Takes n bytes from the shared bucket
+    """
+    return bucket.consume(n)
@@ -0,0 +1,348 @@
+"""
+This module keeps track of how downloads are going, down to the byte
+----
+Every chunk pytube writes goes through the on_progress callback, and every stream
+it finishes goes through on_complete, so both are pointed at the metrics here.
+Thumbnails, captions and range requests report in directly. Numbers are kept per
+file type and quality ("video/720p", "audio/128kbps", "caption/en") and time to
+first byte is kept per host, so a slow CDN node stands out.
+----
+While a sync is running a live progress line is shown on the terminal, and when it
+finishes a JSON summary is written next to the database (see summary_file)
+"""
+
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import youmirror.printer as printer
+
+summary_file = "youmirror.summary.json"  # Written in the mirror root
+refresh = 1.0  # Seconds between updates of the live progress line
+seconds_buckets = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+rate_buckets = tuple(2**i for i in range(16, 28, 2))  # 64KiB/s up to 64MiB/s
+
+
+class Histogram:
+    """
+    Counts observations into fixed buckets, and keeps the sum, min and max
+    """
+
+    def __init__(self, bounds: tuple) -> None:
+        self.bounds: tuple = bounds  # Upper bound of every bucket but the last
+        self.counts: list[int] = [0] * (len(bounds) + 1)  # Last one is overflow
+        self.count: int = 0
+        self.sum: float = 0
+        self.min: float = None
+        self.max: float = None
+
+    def observe(self, value: float) -> None:
+        """
+        Adds one observation
+        """
+        i = next((i for i, bound in enumerate(self.bounds) if value <= bound), -1)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the histogram as plain values for the summary
+        """
+        buckets = {f"<={bound}": n for bound, n in zip(self.bounds, self.counts)}
+        buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "buckets": buckets,
+        }
+
+
+class Stats:
+    """
+    Counters and histograms for one file type and quality
+    """
+
+    def __init__(self) -> None:
+        self.files: int = 0  # Files finished
+        self.failed: int = 0  # Files that didn't make it
+        self.bytes: int = 0  # Bytes received
+        self.duration = Histogram(seconds_buckets)  # Seconds per file
+        self.throughput = Histogram(rate_buckets)  # Bytes per second per transfer
+
+    def to_dict(self) -> dict:
+        """
+        Returns the stats as plain values for the summary
+        """
+        return {
+            "files": self.files,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "duration": self.duration.to_dict(),
+            "throughput": self.throughput.to_dict(),
+        }
+
+
+def stream_label(stream) -> str:
+    """
+    Returns the label bytes from a pytube stream are counted under
+    """
+    quality = stream.resolution if stream.type == "video" else stream.abr
+    return f"{stream.type}/{quality}" if quality else stream.type
+
+
+def file_label(file_type: str, specs: dict) -> str:
+    """
+    Returns the label a finished file is counted under
+    """
+    quality = {
+        "video": specs.get("resolution"),
+        "audio": specs.get("bitrate"),
+        "caption": specs.get("language"),
+    }.get(file_type)
+    return f"{file_type}/{quality}" if quality else file_type
+
+
+class Metrics:
+    """
+    Everything we measure during a sync, safe to update from any thread
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.depth: int = 0  # Nested sessions, only the outermost one reports
+        self.live: threading.Thread = None  # Draws the progress line
+        self.stopped = threading.Event()  # Tells the live line to stop
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears everything for a new session
+        """
+        with self.lock:
+            self.started: float = time.monotonic()
+            self.started_at: str = datetime.now().isoformat(timespec="seconds")
+            self.queued_files: int = 0  # Files handed to the scheduler
+            self.queued_bytes: int = 0  # Their expected size, if we know it
+            self.bytes: int = 0  # Bytes received
+            self.stats: dict[str, Stats] = dict()  # Label: stats
+            self.ttfb: dict[str, Histogram] = dict()  # Host: time to first byte
+            self.transfers: dict[int, list] = dict()  # Stream id: [label, first, bytes]
+            self.notes: dict[str, dict] = dict()  # Anything else for the summary
+
+    def _stats(self, label: str) -> Stats:
+        """
+        Returns the stats for the label, the lock must be held
+        """
+        if label not in self.stats:
+            self.stats[label] = Stats()
+        return self.stats[label]
+
+    def queued(self, filesize: int = 0) -> None:
+        """
+        Counts a file that is going to be downloaded
+        """
+        with self.lock:
+            self.queued_files += 1
+            self.queued_bytes += filesize or 0
+
+    def on_progress(self, stream, chunk: bytes, bytes_remaining: int) -> None:
+        """
+        pytube's on_progress callback, counts every chunk a stream writes
+        """
+        now = time.monotonic()
+        with self.lock:
+            key = id(stream)  # Segmented downloads report from several threads
+            if key not in self.transfers:
+                self.transfers[key] = [stream_label(stream), now, 0]
+            transfer = self.transfers[key]
+            transfer[2] += len(chunk)
+            self.bytes += len(chunk)
+            self._stats(transfer[0]).bytes += len(chunk)
+
+    def on_complete(self, stream, file_path: str) -> None:
+        """
+        pytube's on_complete callback, records how fast the stream came down
+        """
+        now = time.monotonic()
+        with self.lock:
+            if not (transfer := self.transfers.pop(id(stream), None)):
+                return  # Nothing came down, the file was already there
+            label, first, received = transfer
+            if now > first:
+                self._stats(label).throughput.observe(received / (now - first))
+
+    def abort(self, stream) -> None:
+        """
+        Forgets a stream that failed, so a later stream with its id starts fresh
+        """
+        with self.lock:
+            self.transfers.pop(id(stream), None)
+
+    @contextmanager
+    def transfer(self, stream):
+        """
+        Wraps a stream's download, failed ones never get to on_complete
+        """
+        try:
+            yield
+        except BaseException:
+            self.abort(stream)
+            raise
+
+    def transferred(self, label: str, received: int, seconds: float) -> None:
+        """
+        Records a whole transfer that didn't go through pytube, like a thumbnail
+        """
+        with self.lock:
+            self.bytes += received
+            stats = self._stats(label)
+            stats.bytes += received
+            if seconds > 0:
+                stats.throughput.observe(received / seconds)
+
+    def first_byte(self, host: str, seconds: float) -> None:
+        """
+        Records how long a host took to start answering
+        """
+        with self.lock:
+            if host not in self.ttfb:
+                self.ttfb[host] = Histogram(seconds_buckets)
+            self.ttfb[host].observe(seconds)
+
+    def finished(self, label: str, seconds: float, ok: bool) -> None:
+        """
+        Records a file that is done, one way or the other
+        """
+        with self.lock:
+            stats = self._stats(label)
+            if ok:
+                stats.files += 1
+                stats.duration.observe(seconds)
+            else:
+                stats.failed += 1
+
+    def note(self, name: str, value: dict) -> None:
+        """
+        Adds something else worth knowing to the summary, like cache stats
+        """
+        with self.lock:
+            self.notes[name] = value
+
+    def line(self) -> str:
+        """
+        Returns the live progress line
+        """
+        with self.lock:
+            done = sum(s.files + s.failed for s in self.stats.values())
+            failed = sum(s.failed for s in self.stats.values())
+            received, expected = self.bytes, self.queued_bytes
+            queued, elapsed = self.queued_files, time.monotonic() - self.started
+        line = f"{done}/{queued} files, {printer.human_readable(received)}"
+        if expected:
+            line += f" of {printer.human_readable(expected)}"
+        line += f", {printer.human_readable(received / max(elapsed, 1e-9))}/s"
+        if failed:
+            line += f", {failed} failed"
+        return line
+
+    def summary(self) -> dict:
+        """
+        Returns everything we measured as plain values
+        """
+        with self.lock:
+            seconds = time.monotonic() - self.started
+            return {
+                "started": self.started_at,
+                "seconds": round(seconds, 3),
+                "queued": {"files": self.queued_files, "bytes": self.queued_bytes},
+                "files": sum(s.files for s in self.stats.values()),
+                "failed": sum(s.failed for s in self.stats.values()),
+                "bytes": self.bytes,
+                "throughput": round(self.bytes / seconds, 1) if seconds else None,
+                "by_type": {k: v.to_dict() for k, v in sorted(self.stats.items())},
+                "by_host": {
+                    host: {"ttfb": h.to_dict()} for host, h in sorted(self.ttfb.items())
+                },
+                **self.notes,
+            }
+
+    def _draw(self) -> None:
+        """
+        Redraws the progress line until told to stop, runs on its own thread
+        """
+        while not self.stopped.wait(refresh):
+            sys.stdout.write(f"\r\033[K{self.line()}")
+            sys.stdout.flush()
+        sys.stdout.write("\r\033[K")
+
+    @contextmanager
+    def session(self, root: Path):
+        """
+        Measures everything inside, nested sessions just add to the outer one
+        The outermost session shows the live line and writes the summary
+        """
+        self.depth += 1
+        if self.depth == 1:
+            self.reset()
+            if sys.stdout.isatty():
+                self.stopped.clear()
+                self.live = threading.Thread(
+                    target=self._draw, name="youmirror-progress", daemon=True
+                )
+                self.live.start()
+        try:
+            yield self
+        finally:
+            self.depth -= 1
+            if not self.depth:
+                self.close(root)
+
+    def close(self, root: Path) -> None:
+        """
+        Stops the live line and writes the summary
+        """
+        if self.live:
+            self.stopped.set()
+            self.live.join()
+            self.live = None
+        summary = self.summary()
+        if not summary["queued"]["files"]:
+            return  # Nothing was downloaded, keep the last summary
+        print(
+            f"Downloaded {summary['files']} files "
+            f"({printer.human_readable(summary['bytes'])}) in {summary['seconds']}s"
+            + (f", {summary['failed']} failed" if summary["failed"] else "")
+        )
+        try:
+            path = Path(root) / summary_file
+            path.write_text(json.dumps(summary, indent=2))
+        except Exception as e:
+            logging.exception(f"Could not write the summary due to {e}")
+
+
+metrics = Metrics()  # Shared by every download in the process
+
+
+def tracked(func):
+    """
+    Wraps a YouMirror method in a metrics session for its mirror
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with metrics.session(self.path):
+            return func(self, *args, **kwargs)
+
+    return wrapper
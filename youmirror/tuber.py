@@ -1,14 +1,17 @@
 """
-This module parses youtube urls, wraps them in pytube objects and
-pulls information from pytube objects
+This module parses youtube urls, wraps them in objects and
+pulls information from those objects
 ---
+The objects come from whichever extractor is in use (see extractor), so nothing
+here should reach into pytube directly
 """
 
 from pytube import YouTube, Channel, Playlist, extract
-from pytube.exceptions import RegexMatchError
+from pytube.exceptions import RegexMatchError, VideoUnavailable
 from typing import Union
 import logging
-from yt_dlp import YoutubeDL
+import youmirror.extractor as extractor  # Where the objects come from
+import youmirror.cacher as cacher  # Remembers what youtube told us last time
 
 
 def link_type(url: str) -> str:
@@ -45,35 +48,50 @@ def link_id(url: str, yt_string=None) -> str:
     return func(url)
 
 
+def canonical_url(url: str, yt_string: str = None) -> str:
+    """
+    Returns the url the way the mirror stores it, without going online
+    Videos and playlists come out exactly like pytube's urls. Channels are only
+    known by their vanity url online, so they come out as the channel's path on
+    youtube.com and have to be matched against ids (see YouMirror.find_url)
+    """
+    try:
+        yt_string = yt_string or link_type(url)
+        if yt_string == "single":
+            return f"https://youtube.com/watch?v={extract.video_id(url)}"
+        if yt_string == "playlist":
+            return f"https://www.youtube.com/playlist?list={extract.playlist_id(url)}"
+        if yt_string == "channel":
+            return f"https://www.youtube.com{extract.channel_name(url)}"
+    except (RegexMatchError, KeyError):
+        logging.error(f"Could not find an id in url '{url}'")
+    return None
+
+
 def yt_to_type_string(yt: Union[Channel, Playlist, YouTube]) -> str:
     """
-    Gets the type of the given pytube object and returns a string
+    Gets the type of the given object and returns a string
     """
-    yt_type_to_string = {
-        Channel: "channel",
-        Playlist: "playlist",
-        YouTube: "single",
-    }  # Translation dict for convenience
-    yt_type = type(yt)  # Get type of pytube object
-    if yt_type in yt_type_to_string:  # If it is a valid type
-        return yt_type_to_string[yt_type]  # Return the translated string
-    else:
-        logging.error(f"Object {yt_type} is not a valid yt_type")
+    yt_string = extractor.backend.type_string(yt)  # Whichever backend made it
+    if yt_string is None:
+        logging.error(f"Object {type(yt)} is not a valid yt_type")
+    return yt_string
 
 
 def get_metadata(yt: Union[Channel, Playlist, YouTube]) -> dict:
     """
-    Returns the metadata of a given pytube object as a dict
+    Returns the metadata of a given object as a dict
     """
     meta = dict()
     meta["name"] = get_name(yt)  # Get the name
     meta["id"] = get_id(yt)  # Extract the id from the url
-    if type(yt) in [Channel, Playlist]:  # Check if we have a channel or playlist
-        children = get_children(yt)  # This will use pytube to get video_urls
+    yt_string = yt_to_type_string(yt)
+    if yt_string in ["channel", "playlist"]:  # Check if we have a channel or playlist
+        children = get_children(yt)  # This will ask the extractor for the video urls
         meta["children"] = children  # Add the children urls to the metadata
         meta["available"] = True  # We will add a check later to determine this
 
-    elif type(yt) == YouTube:
+    elif yt_string == "single":
         meta["available"] = is_available(
             yt
         )  # Individual videos can be checked if they are available
@@ -81,25 +99,29 @@ def get_metadata(yt: Union[Channel, Playlist, YouTube]) -> dict:
 
 
 def is_available(yt: YouTube) -> bool:
+    return cacher.cache.cached(get_id(yt), "available", lambda: check_available(yt))
+
+
+def check_available(yt: YouTube) -> bool:
     try:
-        yt.check_availability()
+        extractor.backend.check_availability(yt)
+    except VideoUnavailable as e:  # Private, removed, members only, etc.
+        logging.info(f"Video {yt.video_id} is not available due to {e}")
+        return False
     except Exception as e:
         logging.exception(
-            f"Video {yt.title} is not available due to {e}"
-        )  # Need to report the url or the title if we can
+            f"Could not check if {yt.video_id} is available due to {e}"
+        )  # Doesn't mean it's gone, so assume it's still there
     return True
 
 
 def new_pytube(url: str) -> Union[YouTube, Channel, Playlist]:
     """
-    This replaces get_pytube and returns a new pytube object from url
+    This replaces get_pytube and returns a new object from url, made by the extractor
     """
-    objects = {"channel": Channel, "playlist": Playlist, "single": YouTube}
     url_type = link_type(url)  # Returns what type of link it is (as string)
     try:
-        object = wrap_url(
-            url, objects[url_type]
-        )  # Wrap the url in the proper pytube object
+        object = wrap_url(url, url_type)  # Wrap the url in the proper object
         return object
     except RegexMatchError:
         logging.error("Regex Error: could not find matching video for url %s", url)
@@ -109,64 +131,46 @@ def new_pytube(url: str) -> Union[YouTube, Channel, Playlist]:
         return None  # This indicates something went wrong, but we will handle it above
 
 
-def wrap_url(
-    url: str, object: Union[YouTube, Channel, Playlist]
-) -> Union[YouTube, Channel, Playlist]:
+def wrap_url(url: str, yt_string: str) -> Union[YouTube, Channel, Playlist]:
     """
-    Wraps the url in the proper pytube object
+    Wraps the url in the proper object for the extractor in use
     """
-    return object(url)
+    return extractor.backend.load(url, yt_string)
 
 
 def get_id(yt: Union[YouTube, Channel, Playlist]) -> str:
     """
-    Returns the id of the pytube object
+    Returns the id of the object
     """
-    type_to_id = {
-        YouTube: "video_id",
-        Channel: "channel_uri",
-        Playlist: "playlist_id",
-    }  # Translation dict from type to attribute
-    t = type(yt)
-    if t in type_to_id:
-        return getattr(yt, type_to_id[t])
-    else:
+    try:
+        return extractor.backend.get_id(yt)
+    except Exception:
         logging.error(f"Failed to get id for {yt}")
         return None
 
 
 def get_name(yt: Union[YouTube, Channel, Playlist]) -> str:
     """
-    Returns the name of the pytube object
+    Returns the name of the object
     """
-    type_to_name = {
-        YouTube: "title",
-        Channel: "channel_name",
-        Playlist: "title",
-    }  # Translation dict from type to attribute
-    t = type(yt)  # Get the type of the object
-    if t in type_to_name:  # If it is a valid type
-        return getattr(yt, type_to_name[t])  # Return the attribute
-    else:
+    if not (key := get_id(yt)):
         logging.error(f"Failed to get name for {yt}")
         return None
+    return cacher.cache.cached(
+        key, "name", lambda: extractor.backend.get_name(yt)
+    )  # The cache saves us a page load
 
 
 def get_url(yt: Union[YouTube, Channel, Playlist]) -> str:
     """
-    Returns the url of the pytube object
+    Returns the url of the object
     """
-    type_to_url = {
-        YouTube: "watch_url",
-        Channel: "vanity_url",
-        Playlist: "playlist_url",
-    }  # Translation dict from type to property
-    t = type(yt)  # Get the type of the object
-    if t in type_to_url:  # If it is a valid type
-        return getattr(yt, type_to_url[t])  # Return the attribute
-    else:
+    if not (key := get_id(yt)):
         logging.error(f"Failed to get url for {yt}")
         return None
+    return cacher.cache.cached(
+        key, "url", lambda: extractor.backend.get_url(yt)
+    )  # Channels have to load a page for their url
 
 
 def get_children(yt: Union[Channel, Playlist]) -> list[str]:
@@ -174,14 +178,37 @@ def get_children(yt: Union[Channel, Playlist]) -> list[str]:
     Takes either a Channel or Playlist object and returns its video links as a list of strings
     """
     try:
-        if type(yt) in [Channel, Playlist]:
+        if yt_to_type_string(yt) in ["channel", "playlist"]:
             logging.debug(f"Getting children for {get_name(yt)}")
-            children = [
-                url for url in yt.video_urls
-            ]  # Maybe we can async get this in the future?
+            children = cacher.cache.cached(
+                get_id(yt), "children", lambda: extractor.backend.get_children(yt)
+            )  # yt-dlp lists them without loading any watch pages
             return children
         else:
             return None
     except Exception as e:
         logging.exception(f"Failed to get children for {get_name(yt)} due to {e}")
         return None
+
+
+def get_new_children(yt: Union[Channel, Playlist], known: set, stop_after: int):
+    """
+    Walks the videos newest first and returns the ones that aren't known yet
+    Stops after stop_after known videos in a row, everything past that is older
+    than what we've already seen, so the rest of the pages are never loaded
+    """
+    try:
+        children = list()
+        streak = 0  # Known videos in a row
+        for url in extractor.backend.iter_children(yt):  # Pages load as we get there
+            if url in known:
+                streak += 1
+                if streak >= stop_after:
+                    break
+            else:
+                streak = 0
+                children.append(url)
+        return children
+    except Exception as e:
+        logging.exception(f"Failed to get new children for {get_name(yt)} due to {e}")
+        return None